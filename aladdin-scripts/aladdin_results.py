@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+# Reading back the results of Aladdin simulations.
+
+import argparse
+import os
+import re
+import sqlite3
+
+try:
+  import numpy as np
+except ImportError:
+  # Only the analysis functions need NumPy; parsing and collecting do not.
+  np = None
+
+# Matches summary lines such as "Cycle : 1234 cycles" or "Avg Power: 1.5 mW".
+SUMMARY_LINE = re.compile(
+    r"^\s*([A-Za-z][A-Za-z ]*?)\s*:\s*([-+]?[0-9]*\.?[0-9]+(?:[eE][-+]?[0-9]+)?)")
+
+def summary_key(label):
+  """ Normalize a summary label, e.g. "Avg FU Power" -> "avg_fu_power". """
+  return re.sub(r"[^a-z0-9]+", "_", label.strip().lower()).strip("_")
+
+def parse_aladdin_summary(path):
+  """ Parse the numeric fields of an Aladdin summary.
+
+  Aladdin writes its summary both to <output_prefix>_summary and to stdout,
+  so either file can be parsed. Labels are normalized by summary_key(), so the
+  main fields are "cycle", "avg_power" (mW) and "total_area" (uM^2).
+
+  Returns:
+    A dict of field name to float, or None if the file does not exist or
+    holds no cycle count.
+  """
+  if not os.path.exists(path):
+    return None
+  fields = {}
+  with open(path) as f:
+    for line in f:
+      match = SUMMARY_LINE.match(line)
+      if match:
+        fields[summary_key(match.group(1))] = float(match.group(2))
+  if "cycle" not in fields:
+    return None
+  return fields
+
+def read_outputs(bmk_dir, config, benchmark_name, sampled=False):
+  """ Parse the results of one config directory, preferring the summary.
+
+  With sampled, read the simulation of the sampled trace instead, with its
+  cycles extrapolated to the full trace (see trace_sampler.py).
+  """
+  outputs = "outputs_sampled" if sampled else "outputs"
+  prefix = "%s/%s/%s/%s" % (bmk_dir, config, outputs, benchmark_name)
+  summary = (parse_aladdin_summary(prefix + "_summary") or
+             parse_aladdin_summary(prefix + "_stdout"))
+  if sampled:
+    from trace_sampler import extrapolate, read_metadata
+    return extrapolate(summary, read_metadata(
+        "%s/inputs/dynamic_sampled_trace.gz" % bmk_dir))
+  return summary
+
+def parse_aladdin_config(path):
+  """ Extract the design parameters of an Aladdin .cfg file.
+
+  Returns:
+    A dict with pipelining, cycle_time, and the largest unrolling and
+    partition factors that appear in the file. Missing settings are 0.
+  """
+  params = {"pipelining": 0, "cycle_time": 0, "unrolling": 0, "partition": 0}
+  with open(path) as f:
+    for line in f:
+      fields = line.strip().split(",")
+      if fields[0] in ("pipelining", "cycle_time"):
+        params[fields[0]] = int(fields[1])
+      elif fields[0] == "unrolling":
+        params["unrolling"] = max(params["unrolling"], int(fields[3]))
+      elif fields[0] == "partition" and fields[1] in ("cyclic", "block"):
+        params["partition"] = max(params["partition"], int(fields[5]))
+  return params
+
+# Columns of the results table, after the benchmark and config keys.
+METRICS = ["cycle", "avg_power", "total_area", "avg_fu_power", "avg_mem_power",
+           "fu_area", "mem_area"]
+PARAMS = ["pipelining", "cycle_time", "unrolling", "partition"]
+
+class ResultsStore(object):
+  """ A SQLite index of the results of a sweep output directory.
+
+  One row is kept per <benchmark>/<config>, holding the summary metrics and
+  the design parameters of the config. Rows remember the size and mtime of the
+  file they were parsed from, so collect() only re-reads outputs that are new
+  or changed.
+  """
+  def __init__(self, db_path):
+    self.db = sqlite3.connect(db_path)
+    columns = ", ".join("%s REAL" % c for c in METRICS + PARAMS)
+    self.db.execute(
+        "CREATE TABLE IF NOT EXISTS results ("
+        "benchmark TEXT, config TEXT, source TEXT, size INTEGER, mtime REAL, "
+        "%s, PRIMARY KEY (benchmark, config))" % columns)
+    self.db.execute("CREATE INDEX IF NOT EXISTS results_params ON results "
+                    "(benchmark, %s)" % ", ".join(PARAMS))
+    self.db.commit()
+
+  def collect(self, output_dir):
+    """ Index all simulation outputs under output_dir.
+
+    Returns:
+      A tuple (number of outputs parsed, number of unchanged outputs skipped).
+    """
+    known = {}
+    for benchmark, config, size, mtime in self.db.execute(
+        "SELECT benchmark, config, size, mtime FROM results"):
+      known[(benchmark, config)] = (size, mtime)
+    parsed = 0
+    skipped = 0
+    for benchmark in sorted(os.listdir(output_dir)):
+      bmk_dir = os.path.join(output_dir, benchmark)
+      if not os.path.isdir(bmk_dir):
+        continue
+      for config in os.listdir(bmk_dir):
+        outputs = os.path.join(bmk_dir, config, "outputs")
+        for suffix in ("_summary", "_stdout"):
+          source = os.path.join(outputs, benchmark + suffix)
+          try:
+            st = os.stat(source)
+          except OSError:
+            continue
+          break
+        else:
+          continue
+        if known.get((benchmark, config)) == (st.st_size, st.st_mtime):
+          skipped += 1
+          continue
+        summary = parse_aladdin_summary(source)
+        cfg_path = os.path.join(bmk_dir, config, benchmark + ".cfg")
+        if not summary or not os.path.exists(cfg_path):
+          continue
+        params = parse_aladdin_config(cfg_path)
+        row = ([benchmark, config, source, st.st_size, st.st_mtime] +
+               [summary.get(m) for m in METRICS] +
+               [params[p] for p in PARAMS])
+        self.db.execute("INSERT OR REPLACE INTO results VALUES (%s)" %
+                        ", ".join("?" * len(row)), row)
+        parsed += 1
+    self.db.commit()
+    return parsed, skipped
+
+  def benchmarks(self):
+    return [row[0] for row in self.db.execute(
+        "SELECT DISTINCT benchmark FROM results ORDER BY benchmark")]
+
+  def load(self, benchmark=None):
+    """ Load results as columns.
+
+    Returns:
+      A dict mapping "config" and every metric and parameter name to a NumPy
+      array, with one entry per config. Missing metrics are NaN.
+    """
+    query = "SELECT config, %s FROM results" % ", ".join(METRICS + PARAMS)
+    args = []
+    if benchmark:
+      query += " WHERE benchmark = ?"
+      args.append(benchmark)
+    rows = self.db.execute(query + " ORDER BY config", args).fetchall()
+    columns = {"config": np.array([r[0] for r in rows], dtype=object)}
+    values = np.array([r[1:] for r in rows], dtype=float).reshape(
+        len(rows), len(METRICS + PARAMS))
+    for i, name in enumerate(METRICS + PARAMS):
+      columns[name] = values[:, i]
+    return columns
+
+def execution_time(columns):
+  """ Execution time in ns: cycles times the cycle time. """
+  return columns["cycle"] * np.where(columns["cycle_time"] > 0,
+                                     columns["cycle_time"], 1)
+
+def pareto_mask(x, y):
+  """ Boolean mask of the points not dominated in (x, y), both minimized.
+
+  Sorting by x (then y) leaves a point on the frontier exactly when its y is
+  below the running minimum of all points before it. Of several identical
+  points, only one is marked.
+  """
+  order = np.lexsort((y, x))
+  y_sorted = y[order]
+  running_min = np.minimum.accumulate(y_sorted)
+  on_front = np.empty(len(y), dtype=bool)
+  if len(y):
+    on_front[0] = True
+    on_front[1:] = y_sorted[1:] < running_min[:-1]
+  mask = np.zeros(len(y), dtype=bool)
+  mask[order] = on_front
+  return mask
+
+def energy_delay_product(columns):
+  """ Energy-delay product in mW*ns^2: power times execution time squared. """
+  return columns["avg_power"] * execution_time(columns) ** 2
+
+def sensitivity(columns, param, metric):
+  """ Summarize how a metric varies with a parameter.
+
+  Returns:
+    A list of (parameter value, number of configs, mean, min) tuples, sorted
+    by parameter value.
+  """
+  values, inverse = np.unique(columns[param], return_inverse=True)
+  data = columns[metric]
+  counts = np.bincount(inverse, minlength=len(values))
+  means = np.bincount(inverse, weights=data, minlength=len(values)) / counts
+  mins = np.full(len(values), np.inf)
+  np.minimum.at(mins, inverse, data)
+  return list(zip(values, counts, means, mins))
+
+def main():
+  parser = argparse.ArgumentParser(
+      description="Index and analyze the results of an Aladdin sweep.",
+      formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument(
+      "mode", choices=["collect", "pareto", "edp", "sensitivity"], help=
+      "\"collect\" indexes new and changed outputs of the sweep. "
+      "\"pareto\" prints the time/power Pareto frontier of each benchmark. "
+      "\"edp\" prints the design with the lowest energy-delay product. "
+      "\"sensitivity\" summarizes a metric by the value of a parameter.")
+  parser.add_argument("--output_dir", required=True, help="Sweep output "
+                      "directory.")
+  parser.add_argument("--db", help="Path of the results database. Defaults "
+                      "to <output_dir>/results.db.")
+  parser.add_argument("--benchmark", help="Only analyze this benchmark.")
+  parser.add_argument("--param", choices=PARAMS, default="unrolling",
+                      help="Parameter for sensitivity mode.")
+  parser.add_argument("--metric", choices=METRICS, default="cycle",
+                      help="Metric for sensitivity mode.")
+  args = parser.parse_args()
+
+  store = ResultsStore(args.db or os.path.join(args.output_dir, "results.db"))
+  if args.mode == "collect":
+    parsed, skipped = store.collect(args.output_dir)
+    print("Indexed %d new or changed outputs, %d unchanged." %
+          (parsed, skipped))
+    return
+
+  benchmarks = [args.benchmark] if args.benchmark else store.benchmarks()
+  for benchmark in benchmarks:
+    columns = store.load(benchmark)
+    if not len(columns["config"]):
+      continue
+    print("%s (%d designs)" % (benchmark, len(columns["config"])))
+    time = execution_time(columns)
+    if args.mode == "pareto":
+      valid = np.isfinite(time) & np.isfinite(columns["avg_power"])
+      mask = valid.copy()
+      mask[valid] = pareto_mask(time[valid], columns["avg_power"][valid])
+      for i in sorted(mask.nonzero()[0], key=lambda i: time[i]):
+        print("  %s: time %g ns, power %g mW" %
+              (columns["config"][i], time[i], columns["avg_power"][i]))
+    elif args.mode == "edp":
+      edp = energy_delay_product(columns)
+      # Configs without power or timing data have a NaN EDP.
+      edp = np.where(np.isfinite(edp), edp, np.nan)
+      if np.isnan(edp).all():
+        print("  no design has both timing and power data")
+        continue
+      i = np.nanargmin(edp)
+      print("  %s: EDP %g, time %g ns, power %g mW" %
+            (columns["config"][i], edp[i], time[i], columns["avg_power"][i]))
+    elif args.mode == "sensitivity":
+      print("  %12s %8s %14s %14s" % (args.param, "configs", "mean", "min"))
+      for value, count, mean, minimum in sensitivity(columns, args.param,
+                                                     args.metric):
+        print("  %12g %8d %14g %14g" % (value, count, mean, minimum))
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# Adaptive design space search.
+#
+# Instead of simulating every point of the sweep, ParetoSearch starts from a
+# small random sample and repeatedly evaluates the unexplored grid neighbors of
+# the current Pareto frontier. When the neighborhood of the frontier is
+# exhausted it restarts from random unexplored points. The search stops once
+# the frontier has not changed for a number of rounds, or when it runs out of
+# budget.
+
+import random
+
+def dominates(a, b):
+  """ True if objective tuple a is no worse than b everywhere and better
+  somewhere. All objectives are minimized. """
+  return (all(x <= y for x, y in zip(a, b)) and
+          any(x < y for x, y in zip(a, b)))
+
+def grid_size(value_lists):
+  """ Number of points in the grid spanned by value_lists. """
+  size = 1
+  for values in value_lists:
+    size *= len(values)
+  return size
+
+def pareto_front(results):
+  """ Return the keys of the non-dominated entries of a {key: objectives}
+  dict. """
+  return set(k for k, obj in results.items()
+             if not any(dominates(other, obj) for other in results.values()))
+
+class ParetoSearch(object):
+  """ Pareto-guided local search with random restarts over a parameter grid.
+
+  Points are tuples of indices into value_lists, one per parameter.
+  """
+  def __init__(self, value_lists, evaluate, budget, batch_size=1,
+               patience=3, initial=4, seed=0, feasible=None):
+    """ Set up a search.
+
+    Args:
+      value_lists: For each parameter, the list of values it can take.
+      evaluate: Function that takes a list of points (tuples of values) and
+        returns a list of the same length holding a tuple of objectives to
+        minimize for each point, or None if the point could not be evaluated.
+      budget: Maximum number of points to evaluate.
+      batch_size: Number of points proposed per round, which is the amount of
+        parallelism available to evaluate.
+      patience: Stop after this many rounds without a change in the frontier.
+      initial: Number of random points evaluated in the first round, in
+        addition to the two corners of the grid.
+      seed: Seed of the random number generator.
+      feasible: Optional function that takes a point (tuple of values) and
+        returns False if it must not be evaluated. Such points are recorded
+        as failed without counting against the budget.
+    """
+    self.value_lists = value_lists
+    self.evaluate = evaluate
+    self.budget = budget
+    self.batch_size = batch_size
+    self.patience = patience
+    self.initial = initial
+    self.random = random.Random(seed)
+    self.feasible = feasible
+    # Maps points to objectives; None for points that failed.
+    self.results = {}
+    self.infeasible = 0
+    self.rounds = 0
+
+  def grid_size(self):
+    return grid_size(self.value_lists)
+
+  def evaluated(self):
+    """ Number of points evaluated, which excludes infeasible ones. """
+    return len(self.results) - self.infeasible
+
+  def values(self, point):
+    return tuple(values[i] for values, i in zip(self.value_lists, point))
+
+  def neighbors(self, point):
+    for dim, index in enumerate(point):
+      for step in (-1, 1):
+        if 0 <= index + step < len(self.value_lists[dim]):
+          yield point[:dim] + (index + step,) + point[dim+1:]
+
+  def random_unexplored(self, count):
+    """ Sample up to count points that have not been evaluated. """
+    remaining = self.grid_size() - len(self.results)
+    points = set()
+    # Rejection sampling is fine while the grid is mostly unexplored, which is
+    # the regime this search is meant for.
+    attempts = 0
+    while len(points) < min(count, remaining) and attempts < 100 * count:
+      attempts += 1
+      point = tuple(self.random.randrange(len(v)) for v in self.value_lists)
+      if point not in self.results:
+        points.add(point)
+    return sorted(points)
+
+  def frontier(self):
+    valid = dict((p, obj) for p, obj in self.results.items() if obj is not None)
+    return pareto_front(valid)
+
+  def propose(self):
+    """ Choose the next batch of points to evaluate. """
+    left = self.budget - self.evaluated()
+    if not self.results:
+      corners = [tuple(0 for _ in self.value_lists),
+                 tuple(len(v) - 1 for v in self.value_lists)]
+      batch = sorted(set(corners)) + self.random_unexplored(self.initial)
+      return sorted(set(batch))[:left]
+    candidates = set()
+    for point in self.frontier():
+      for neighbor in self.neighbors(point):
+        if neighbor not in self.results:
+          candidates.add(neighbor)
+    candidates = sorted(candidates)
+    self.random.shuffle(candidates)
+    batch = candidates[:min(self.batch_size, left)]
+    if not batch:
+      # Local search is stuck; restart from random unexplored points.
+      batch = self.random_unexplored(min(self.batch_size, left))
+    return batch
+
+  def run(self, verbose=True):
+    """ Run the search until the frontier stabilizes or the budget is spent.
+
+    Returns:
+      The points on the final frontier.
+    """
+    stale_rounds = 0
+    while self.evaluated() < self.budget and stale_rounds < self.patience:
+      batch = self.propose()
+      if not batch:
+        break
+      if self.feasible:
+        for point in batch:
+          if not self.feasible(self.values(point)):
+            self.results[point] = None
+            self.infeasible += 1
+        batch = [p for p in batch if p not in self.results]
+        if not batch:
+          continue
+      before = self.frontier()
+      objectives = self.evaluate([self.values(p) for p in batch])
+      for point, obj in zip(batch, objectives):
+        self.results[point] = obj
+      after = self.frontier()
+      self.rounds += 1
+      if after == before:
+        stale_rounds += 1
+      else:
+        stale_rounds = 0
+      if verbose:
+        print("  Round %d: evaluated %d points (%d total), frontier has %d "
+              "points%s" % (self.rounds, len(batch), self.evaluated(),
+                            len(after), "" if stale_rounds else ", changed"))
+    return self.frontier()
@@ -52,8 +52,90 @@ Loop = namedtuple("Loop", "name, line_num, trip_count")
 #   size is the total number of elements in this array.
 #   word_size is the size of each element (for ints it is 4).
 #   partition_type should be set to one of the PARTITION_* constants.
-Array = namedtuple(
-    "Array", "name, size, word_size, partition_type")
+#   kernel is the kernel that owns the array, or None if it is shared. Only
+#   owned arrays follow a kernel's value of a parameter swept per kernel.
+class Array(namedtuple(
+      "ArrayBase", "name, size, word_size, partition_type, kernel")):
+  def __new__(cls, name, size, word_size, partition_type, kernel=None):
+    return super(Array, cls).__new__(
+        cls, name, size, word_size, partition_type, kernel)
+
+# Design points map parameter names to values. A parameter swept per kernel
+# (see SweepParam) has one value per kernel instead, named by
+# kernel_param_name().
+def kernel_param_name(name, kernel):
+  """ The name of a kernel's own value of a parameter swept per kernel. """
+  return "%s:%s" % (name, kernel)
+
+def kernel_value(params, name, kernel):
+  """ A kernel's value of a parameter: its own value if the parameter is
+  swept per kernel, otherwise the global one. None if there is neither.
+  """
+  return params.get(kernel_param_name(name, kernel), params.get(name))
+
+def array_partition(params, array):
+  """ The partition factor of an array.
+
+  Arrays owned by a kernel follow that kernel's value. Shared arrays take the
+  largest value of any kernel, so that they can serve the most parallel one.
+  """
+  if array.kernel is not None:
+    value = kernel_value(params, "partition", array.kernel)
+    if value is not None:
+      return value
+  prefix = kernel_param_name("partition", "")
+  values = [v for k, v in params.items() if k.startswith(prefix)]
+  if values:
+    return max(values)
+  return params.get("partition")
+
+
+def point_kernels(params):
+  """ The kernels that have their own value of some parameter. """
+  return set(k.partition(":")[2] for k in params if ":" in k)
+
+def partitioned_arrays(benchmark):
+  """ The arrays of a benchmark that are partitioned into banks. """
+  return [a for a in benchmark.arrays
+          if a.partition_type in (PARTITION_CYCLIC, PARTITION_BLOCK)]
+
+class Constraint(namedtuple("ConstraintBase", "name, check")):
+  """ Constraint: A condition that the design points of a sweep must meet.
+
+  Points that fail a constraint are dropped while the sweep is enumerated, so
+  they are never written as configs or simulated.
+
+  Args:
+    name: Describes the constraint in the report of pruned points.
+    check: A function of (benchmark, point) that returns True if the point is
+      feasible. Use kernel_value() and array_partition() to read parameters
+      that may be swept per kernel.
+  """
+
+def at_most(name, other, factor=1):
+  """ name <= factor * other, for the global value and that of every kernel,
+  e.g. at_most("partition", "unrolling", 2). """
+  def check(benchmark, params):
+    pairs = [(params.get(name), params.get(other))]
+    pairs += [(kernel_value(params, name, kernel),
+               kernel_value(params, other, kernel))
+              for kernel in point_kernels(params)]
+    return all(a is None or b is None or a <= factor * b for a, b in pairs)
+  return Constraint("%s <= %s * %s" % (name, factor, other), check)
+
+def max_total_banks(limit):
+  """ The banks of all partitioned arrays add up to at most limit. """
+  def check(benchmark, params):
+    return sum(array_partition(params, a) or 1
+               for a in partitioned_arrays(benchmark)) <= limit
+  return Constraint("total banks <= %d" % limit, check)
+
+def partition_within_arrays():
+  """ No array is split into more banks than it has elements. """
+  def check(benchmark, params):
+    return all((array_partition(params, a) or 1) <= a.size
+               for a in partitioned_arrays(benchmark))
+  return Constraint("partition <= array size", check)
 
 class Benchmark(object):
   """ A benchmark description object. """
@@ -74,20 +156,39 @@ class Benchmark(object):
     self.loops = []
     self.arrays = []
     self.kernels = []
+    self.constraints = []
     self.test_harness = harness_file
 
+  def __getstate__(self):
+    # Constraints are only checked while a sweep is enumerated and may hold
+    # lambdas, which cannot be pickled for worker processes.
+    state = dict(self.__dict__)
+    state["constraints"] = []
+    return state
+
   def add_loop(self, loop_name, line_num, trip_count=ALWAYS_UNROLL):
     """ Add a loop, its line number, and its trip count to the benchmark. """
     self.loops.append(Loop(name=loop_name,
                            line_num=line_num,
                            trip_count=trip_count))
 
-  def add_array(self, name, size, word_size, partition_type=PARTITION_CYCLIC):
-    """ Define an array in the benchmark. Size is in words. """
+  def add_array(self, name, size, word_size, partition_type=PARTITION_CYCLIC,
+                kernel=None):
+    """ Define an array in the benchmark. Size is in words.
+
+    Set kernel to the name of the kernel that owns the array if its
+    partitioning should be swept with that kernel's other parameters.
+    """
     self.arrays.append(Array(name=name,
                              size=size,
                              word_size=word_size,
-                             partition_type=partition_type))
+                             partition_type=partition_type,
+                             kernel=kernel))
+
+  def add_constraint(self, constraint):
+    """ Add a Constraint that the design points of this benchmark must meet,
+    on top of those of sweep_config.py. """
+    self.constraints.append(constraint)
 
   def set_kernels(self, kernels):
     """ Names of the distinct functions/kernels in the benchmark. """
@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+# Analytical estimates of Aladdin design points.
+#
+# A design point's cycle count is estimated from a profile of its benchmark's
+# dynamic trace: the number of compute operations and the number of accesses
+# to each partitioned array. Computation is spread over the datapath lanes that
+# unrolling creates, and each array serves at most one access per bank per
+# cycle. The estimate is the larger of the two bounds. It is far too coarse to
+# replace simulation, but it is good enough to recognize designs that pay for
+# lanes or banks they cannot use, which can then be skipped in a sweep.
+
+import argparse
+import json
+import os
+from collections import namedtuple
+
+try:
+  import numpy as np
+except ImportError:
+  # Only the prefilter and the validation report need NumPy.
+  np = None
+
+from aladdin_results import ResultsStore, execution_time, pareto_mask
+from design_sweep_types import PARTITION_COMPLETE, ALWAYS_UNROLL
+from generate_configs import (array_partition, benchmark_sweep, config_name,
+                              kernel_value, sweep_parameters)
+from machsuite_config import MACH
+from trace_stats import OPCODES, analyze_trace
+
+# Opcodes that Aladdin does not schedule as datapath operations: control flow,
+# induction variables, address arithmetic and the memory accesses themselves,
+# which are accounted for separately.
+NON_COMPUTE_OPCODES = [
+    op for op, name in OPCODES.items()
+    if name in ("Ret", "Br", "Alloca", "Load", "Store", "GetElementPtr",
+                "BitCast", "PHI", "Call")]
+# Nanoseconds per chained compute operation. A longer cycle time chains more
+# operations into a cycle.
+OP_LATENCY = 2.0
+# Speedup from overlapping loop iterations when pipelining is enabled.
+PIPELINE_SPEEDUP = 1.5
+# Accesses each memory bank serves per cycle.
+PORTS_PER_BANK = 1
+
+Estimate = namedtuple("Estimate", "cycles, time, lanes, banks")
+
+def trace_profile(bmk_dir, benchmark):
+  """ Profile the dynamic trace of a benchmark for estimation.
+
+  The profile is cached in <bmk_dir>/inputs/trace_profile.json and recomputed
+  only when the trace changes.
+
+  Returns:
+    A dict with the number of compute operations ("compute_ops") and the
+    number of loads and stores to each configured array ("accesses"), or None
+    if there is no trace.
+  """
+  trace = os.path.join(bmk_dir, "inputs", "dynamic_trace.gz")
+  cache = os.path.join(bmk_dir, "inputs", "trace_profile.json")
+  if not os.path.exists(trace):
+    return None
+  st = os.stat(trace)
+  stamp = [st.st_size, st.st_mtime]
+  if os.path.exists(cache):
+    with open(cache) as f:
+      profile = json.load(f)
+    if profile["stamp"] == stamp:
+      return profile
+  stats = analyze_trace(trace)
+  accesses = {}
+  for array in benchmark.arrays:
+    accessed = stats.arrays.get(array.name.encode("utf-8"))
+    accesses[array.name] = accessed.loads + accessed.stores if accessed else 0
+  profile = {
+      "stamp": stamp,
+      "compute_ops": stats.instructions - sum(
+          stats.opcodes.get(op, 0) for op in NON_COMPUTE_OPCODES),
+      "accesses": accesses}
+  with open(cache, "w") as f:
+    json.dump(profile, f, indent=2, sort_keys=True)
+  return profile
+
+def effective_lanes(benchmark, params):
+  """ Parallel iterations that the unrolling factors of a design create.
+
+  Loops with a known trip count cannot be unrolled beyond it.
+  """
+  lanes = 1
+  for loop in benchmark.loops:
+    unrolling = max(1, int(kernel_value(params, "unrolling", loop.name) or 1))
+    if loop.trip_count == ALWAYS_UNROLL:
+      lanes = max(lanes, unrolling)
+    elif loop.trip_count > 1:
+      lanes = max(lanes, min(unrolling, loop.trip_count))
+  return lanes
+
+def estimate(benchmark, profile, params):
+  """ Estimate the cycles, execution time (ns) and resources of a design.
+
+  Args:
+    benchmark: A benchmark description object.
+    profile: The benchmark's trace_profile().
+    params: Dict of design parameters: pipelining, unrolling, partition and
+      cycle_time, with unrolling and partition possibly per kernel.
+
+  Returns:
+    An Estimate, where lanes is the number of parallel datapath lanes and
+    banks the total number of memory banks of the partitioned arrays.
+  """
+  lanes = effective_lanes(benchmark, params)
+  cycle_time = params.get("cycle_time") or 1
+  ops_per_cycle = lanes * max(1.0, cycle_time / OP_LATENCY)
+  if params.get("pipelining"):
+    ops_per_cycle *= PIPELINE_SPEEDUP
+  cycles = profile["compute_ops"] / ops_per_cycle
+  banks = 0
+  for array in benchmark.arrays:
+    if array.partition_type == PARTITION_COMPLETE:
+      continue
+    array_banks = min(max(1, int(array_partition(params, array) or 1)),
+                      array.size)
+    banks += array_banks
+    # Banks beyond the number of lanes have nobody to serve.
+    usable = min(array_banks, lanes) * PORTS_PER_BANK
+    cycles = max(cycles, profile["accesses"].get(array.name, 0) / float(usable))
+  cycles = max(cycles, 1.0)
+  return Estimate(cycles=cycles, time=cycles * cycle_time, lanes=lanes,
+                  banks=banks)
+
+def dominated_designs(designs, margin=0.0):
+  """ Find designs that an estimate shows to be wasteful.
+
+  A design is dominated if another design with the same pipelining and cycle
+  time is estimated to be at least as fast while using no more lanes and
+  banks, and fewer of one of them by a factor of at least (1 + margin).
+  Designs with a different cycle time or pipelining are never compared, since
+  the estimate does not capture their effect on power.
+
+  Rather than comparing every pair of designs, each group is sorted by time,
+  and for every number of lanes the fewest banks of the designs at least as
+  fast as each design are tracked. If any design dominates another, the one
+  with the fewest banks among those with its number of lanes does too, so the
+  cost is linear in the number of designs per distinct number of lanes, of
+  which there are few.
+
+  Args:
+    designs: Iterable of (name, params, Estimate) tuples, as estimate_sweep()
+      yields them.
+    margin: Safety margin on the resource savings. Larger values skip fewer
+      designs.
+
+  Returns:
+    The set of names of dominated designs.
+  """
+  groups = {}
+  for name, params, est in designs:
+    group = (params.get("pipelining"), params.get("cycle_time"))
+    names, rows = groups.setdefault(group, ([], []))
+    names.append(name)
+    rows.append((est.time, est.lanes, est.banks))
+  dominated = set()
+  for names, rows in groups.values():
+    time, lanes, banks = np.array(rows, dtype=float).T
+    order = np.argsort(time, kind="mergesort")
+    # The last design in time order that is at least as fast as each design.
+    last = np.searchsorted(time[order], time, side="right") - 1
+    mask = np.zeros(len(names), dtype=bool)
+    for a_lanes in np.unique(lanes):
+      fewest = np.minimum.accumulate(np.where(
+          lanes[order] == a_lanes, banks[order], np.inf))[last]
+      mask |= ((a_lanes <= lanes) & (fewest <= banks) &
+               ((a_lanes < lanes) & (a_lanes * (1 + margin) <= lanes) |
+                (fewest < banks) & (fewest * (1 + margin) <= banks)))
+    dominated.update(name for name, m in zip(names, mask) if m)
+  return dominated
+
+def estimate_sweep(benchmark, profile, sweep_params):
+  """ Estimate every design point of a sweep, one at a time.
+
+  Yields:
+    A tuple (config name, params, Estimate) per design point.
+  """
+  sweep_params, points = benchmark_sweep(benchmark, sweep_params)
+  for point in points:
+    yield (config_name(point, sweep_params), point,
+           estimate(benchmark, profile, point))
+
+def validation_report(benchmark, columns, profile, sweep_params, margin=0.0):
+  """ Compare estimates against simulated results.
+
+  Args:
+    columns: The benchmark's simulated results, from ResultsStore.load().
+    sweep_params: The SweepParams of the sweep that was simulated.
+
+  Returns:
+    A list of report lines.
+  """
+  designs = list(estimate_sweep(benchmark, profile, sweep_params))
+  dominated = dominated_designs(designs, margin)
+  estimates = dict((name, est) for name, _, est in designs)
+  in_sweep = np.array([c in estimates for c in columns["config"]], dtype=bool)
+  if not in_sweep.any():
+    return ["no simulated designs belong to the current sweep"]
+  columns = dict((name, values[in_sweep]) for name, values in columns.items())
+  configs = columns["config"]
+  estimated = np.array([estimates[c].cycles for c in configs])
+  simulated = columns["cycle"]
+  # The model's constants are rough, so its accuracy is judged after scaling
+  # it to the simulations; its ranking of designs is what the prefilter uses.
+  scale = np.median(simulated / estimated)
+  error = np.abs(scale * estimated - simulated) / simulated
+  sim_time = execution_time(columns)
+  est_time = np.array([estimates[c].time for c in configs])
+  rank_sim = sim_time.argsort().argsort()
+  rank_est = est_time.argsort().argsort()
+  rank_corr = np.corrcoef(rank_sim, rank_est)[0, 1] if len(configs) > 1 else 1
+  lines = ["%d simulated designs" % len(configs),
+           "  simulated / estimated cycles: median %g" % scale,
+           "  error after scaling: mean %.1f%%, max %.1f%%" %
+           (100 * error.mean(), 100 * error.max()),
+           "  rank correlation of execution time: %.3f" % rank_corr]
+  valid = np.isfinite(sim_time) & np.isfinite(columns["avg_power"])
+  frontier = valid.copy()
+  frontier[valid] = pareto_mask(sim_time[valid], columns["avg_power"][valid])
+  lost = sorted(configs[i] for i in frontier.nonzero()[0]
+                if configs[i] in dominated)
+  lines.append("  prefilter with margin %g skips %d of %d designs, %d of them "
+               "on the simulated Pareto frontier" %
+               (margin, len(dominated), len(estimates), len(lost)))
+  for config in lost:
+    lines.append("    %s" % config)
+  return lines
+
+def main():
+  parser = argparse.ArgumentParser(
+      description="Validate the analytical estimates of design points against "
+      "simulated results collected by aladdin_results.py.",
+      formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument("--output_dir", required=True, help="Sweep output "
+                      "directory.")
+  parser.add_argument("--db", help="Path of the results database. Defaults "
+                      "to <output_dir>/results.db.")
+  parser.add_argument("--benchmark", help="Only validate this benchmark.")
+  parser.add_argument("--margin", type=float, default=0.0, help="Prefilter "
+                      "safety margin to evaluate.")
+  args = parser.parse_args()
+
+  store = ResultsStore(args.db or os.path.join(args.output_dir, "results.db"))
+  store.collect(args.output_dir)
+  sweep_params = sweep_parameters()
+  for benchmark in MACH:
+    if args.benchmark and benchmark.name != args.benchmark:
+      continue
+    columns = store.load(benchmark.name)
+    if not len(columns["config"]):
+      continue
+    profile = trace_profile(os.path.join(args.output_dir, benchmark.name),
+                            benchmark)
+    if not profile:
+      print("%s: no trace, skipping" % benchmark.name)
+      continue
+    print("%s: %s" % (benchmark.name, "\n".join(
+        validation_report(benchmark, columns, profile, sweep_params,
+                          args.margin))))
+
+if __name__ == "__main__":
+  main()
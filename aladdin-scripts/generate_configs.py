@@ -2,13 +2,22 @@
 #
 # Authors: Sam Xi, Sophia Shao
 
-import argparse
-import ConfigParser
-import getpass
-import math
+import hashlib
+import itertools
+import json
+import multiprocessing
 import os
+import shutil
 import sys
 
+# At most this many kernels may take a value other than the start of a
+# per-kernel sweep in the same design point; None for no limit. sweep_config.py
+# may set it.
+max_tuned_kernels = None
+# Constraints that every design point of every benchmark must satisfy, in
+# addition to those of the benchmark itself. sweep_config.py may set it.
+constraints = []
+
 try:
   from sweep_config import *
 
@@ -18,135 +27,488 @@ except ImportError:
 
 from machsuite_config import MACH
 
-def write_aladdin_array_configs(benchmark, config_file, params):
-  """ Write the Aladdin array partitioning configurations. """
-  if "partition" in params:
+# File in each benchmark directory that maps the digest of each distinct
+# config to its canonical config directory.
+CONFIG_INDEX = "config_index.json"
+
+def write_aladdin_array_configs(benchmark, config_lines, params):
+  """ Write the Aladdin array partitioning configurations.
+
+  Partition factors are clamped to the number of words in the array, since
+  further banks would hold nothing.
+  """
+  if any(k.split(":")[0] == "partition" for k in params):
     for array in benchmark.arrays:
       if array.partition_type == PARTITION_CYCLIC:
-        config_file.write("partition,cyclic,%s,%d,%d,%d\n" %
-                          (array.name,
-                           array.size*array.word_size,
-                           array.word_size,
-                           params["partition"]))
+        config_lines.append("partition,cyclic,%s,%d,%d,%d\n" %
+                            (array.name,
+                             array.size*array.word_size,
+                             array.word_size,
+                             min(array_partition(params, array), array.size)))
       elif array.partition_type == PARTITION_BLOCK:
-        config_file.write("partition,block,%s,%d,%d,%d\n" %
-                          (array.name,
-                           array.size*array.word_size,
-                           array.word_size,
-                           params["partition"]))
+        config_lines.append("partition,block,%s,%d,%d,%d\n" %
+                            (array.name,
+                             array.size*array.word_size,
+                             array.word_size,
+                             min(array_partition(params, array), array.size)))
       elif array.partition_type == PARTITION_COMPLETE:
-        config_file.write("partition,complete,%s,%d\n" %
-                          (array.name, array.size*array.word_size))
+        config_lines.append("partition,complete,%s,%d\n" %
+                            (array.name, array.size*array.word_size))
       else:
         print("Invalid array partitioning configuration for array %s." %
               array.name)
         exit(1)
 
-def generate_aladdin_config(benchmark, kernel, params, loops):
-  """ Write an Aladdin configuration file for the specified parameters.
+def render_aladdin_config(benchmark, params, loops):
+  """ Return the contents of an Aladdin configuration file.
 
   Args:
     benchmark: A benchmark description object.
-    kernel: Either the name of the benchmark or the name of the individual kernel.
     params: Kernel configuration parameters. Must include the keys partition,
-        unrolling, and pipelining.
+        unrolling, and pipelining, or their per-kernel variants (see
+        kernel_sweep_params()).
     loops: The list of loops to include in the config file.
   """
-  config_file = open("%s.cfg" % kernel, "wb")
+  config_lines = []
   if "pipelining" in params:
-    config_file.write("pipelining,%d\n" % params["pipelining"])
+    config_lines.append("pipelining,%d\n" % params["pipelining"])
   if "cycle_time" in params:
-    config_file.write("cycle_time,%d\n" % params["cycle_time"])
-  write_aladdin_array_configs(benchmark, config_file, params)
+    config_lines.append("cycle_time,%d\n" % params["cycle_time"])
+  write_aladdin_array_configs(benchmark, config_lines, params)
 
   for loop in loops:
+    unrolling = kernel_value(params, "unrolling", loop.name)
     if loop.trip_count == UNROLL_FLATTEN:
-      config_file.write("flatten,%s,%d\n" % (loop.name, loop.line_num))
+      config_lines.append("flatten,%s,%d\n" % (loop.name, loop.line_num))
     elif loop.trip_count == UNROLL_ONE:
-      config_file.write("unrolling,%s,%d,1\n" %
-                        (loop.name, loop.line_num))
+      config_lines.append("unrolling,%s,%d,1\n" %
+                          (loop.name, loop.line_num))
     elif (loop.trip_count == ALWAYS_UNROLL or
-          params["unrolling"] < loop.trip_count):
+          unrolling < loop.trip_count):
       # We only unroll if it was specified to always unroll or if the loop's
       # trip count is greater than the current unrolling factor.
-      config_file.write("unrolling,%s,%d,%d\n" %
-                        (loop.name, loop.line_num, params["unrolling"]))
-    elif params["unrolling"] >= loop.trip_count:
-      config_file.write("flatten,%s,%d\n" % (loop.name, loop.line_num))
-  config_file.close()
+      config_lines.append("unrolling,%s,%d,%d\n" %
+                          (loop.name, loop.line_num, unrolling))
+    elif unrolling >= loop.trip_count:
+      config_lines.append("flatten,%s,%d\n" % (loop.name, loop.line_num))
+  return "".join(config_lines)
+
+def write_if_changed(path, contents):
+  """ Write contents to path unless the file already holds exactly that.
+
+  Returns:
+    True if the file was written.
+  """
+  if os.path.exists(path):
+    with open(path, "r") as f:
+      if f.read() == contents:
+        return False
+  tmp_path = "%s.tmp.%d" % (path, os.getpid())
+  with open(tmp_path, "w") as f:
+    f.write(contents)
+  os.rename(tmp_path, path)
+  return True
 
-def generate_configs_recurse(benchmark, set_params, sweep_params):
-  """ Recursively generate all possible configuration settings.
+def config_digest(contents):
+  """ The digest by which identical configs are recognized. """
+  return hashlib.sha1(contents.encode("utf-8")).hexdigest()
 
-  On each iteration, this function pops a SweepParam object from sweep_params,
-  generates all possible values of this parameter, and for each of these values,
-  adds an entry into set_params. On each iteration, it will recursively call
-  this function until all sweep parameters have been populated with values in
-  set_params. Then, it will write the configuration files accordingly.
+class ConfigIndex(object):
+  """ The canonical config directory of each distinct config of a benchmark.
+
+  Design points often render to byte-identical configs: unrolling factors at
+  or above a loop's trip count all flatten it, and partition factors are
+  clamped to the array size. The first point of the sweep with a given config
+  is canonical and is simulated; the directories of the others are symlinks
+  to it, which run_sweeps() skips. The index is kept in
+  <bmk_dir>/config_index.json.
+  """
+  def __init__(self, bmk_dir, benchmark_name, load=True):
+    self.bmk_dir = bmk_dir
+    self.benchmark_name = benchmark_name
+    self.path = os.path.join(bmk_dir, CONFIG_INDEX)
+    self.configs = {}
+    # Entries read from disk, which are checked against their directory
+    # before they are trusted.
+    self.unverified = set()
+    if load and os.path.exists(self.path):
+      with open(self.path) as f:
+        self.configs = json.load(f)
+      self.unverified = set(self.configs)
+
+  def _verify(self, digest):
+    """ Drop an entry whose directory no longer holds its config. """
+    config_dir = os.path.join(self.bmk_dir, self.configs[digest])
+    cfg_path = os.path.join(config_dir, "%s.cfg" % self.benchmark_name)
+    if not os.path.islink(config_dir) and os.path.exists(cfg_path):
+      with open(cfg_path) as f:
+        if config_digest(f.read()) == digest:
+          return
+    del self.configs[digest]
+
+  def canonical(self, digest, config):
+    """ The canonical config with this digest, which is config itself if
+    there was none yet. """
+    if digest in self.unverified:
+      self.unverified.discard(digest)
+      if self.configs[digest] != config:
+        self._verify(digest)
+    return self.configs.setdefault(digest, config)
+
+  def save(self):
+    write_if_changed(self.path, json.dumps(
+        self.configs, indent=0, separators=(",", ": "), sort_keys=True) + "\n")
+
+def link_config(bmk_dir, config, canonical):
+  """ Make a config directory a symlink to its canonical directory.
+
+  A real directory left by an earlier sweep is replaced; simulation outputs
+  it holds are moved to the canonical directory if that has none.
+  """
+  path = os.path.join(bmk_dir, config)
+  if os.path.islink(path):
+    if os.readlink(path) == canonical:
+      return
+  elif os.path.isdir(path):
+    for outputs in ("outputs", "outputs_sampled"):
+      target = os.path.join(bmk_dir, canonical, outputs)
+      if (os.path.isdir(os.path.join(path, outputs)) and
+          not os.path.exists(target)):
+        os.rename(os.path.join(path, outputs), target)
+    shutil.rmtree(path)
+  tmp_path = "%s.tmp.%d" % (path, os.getpid())
+  os.symlink(canonical, tmp_path)
+  os.rename(tmp_path, path)
+
+def generate_aladdin_config(benchmark, kernel, params, loops, config_dir):
+  """ Write an Aladdin configuration file for the specified parameters.
 
   Args:
     benchmark: A benchmark description object.
-    set_params: Parameters in the sweep that have been assigned a value.
-    sweep_params: Parameters in the sweep that have not yet been assigned a
-      value.
-  """
-  if len(sweep_params) > 0:
-    local_sweep_params = [i for i in sweep_params]  # Local copy.
-    next_param = local_sweep_params.pop()
-    value_range = []
-    # Generate all values of this parameter as set by the sweep start, end, and
-    # step. If the parameter was set to NO_SWEEP, then we just use the start
-    # value.
-    if next_param.step_type == NO_SWEEP:
-      value_range = [next_param.start]
+    kernel: Either the name of the benchmark or the name of the individual kernel.
+    params: Kernel configuration parameters. Must include the keys partition,
+        unrolling, and pipelining.
+    loops: The list of loops to include in the config file.
+    config_dir: Directory that <kernel>.cfg is written to.
+
+  Returns:
+    True if the file was (re)written, False if it was already up to date.
+  """
+  return write_if_changed(os.path.join(config_dir, "%s.cfg" % kernel),
+                          render_aladdin_config(benchmark, params, loops))
+
+def sweep_values(param):
+  """ Return all values of a SweepParam as set by its start, end, and step.
+
+  If the parameter was set to NO_SWEEP, then we just use the start value.
+  """
+  if param.step_type == NO_SWEEP:
+    return [param.start]
+  if param.step_type == LINEAR_SWEEP:
+    return list(range(param.start, param.end+1, param.step))
+  if param.step_type == EXP_SWEEP:
+    if param.start <= 0 or param.step <= 1:
+      raise ValueError("Exponential sweep of %s needs start > 0 and step > 1" %
+                       param.name)
+    values = []
+    value = param.start
+    while value <= param.end:
+      values.append(value)
+      value *= param.step
+    return values
+  raise ValueError("Invalid step_type for sweep parameter %s" % param.name)
+
+def swept_params(sweep_params):
+  """ The parameters that take more than one value in the sweep. """
+  return [p for p in sweep_params if p.step_type != NO_SWEEP]
+
+def config_name(point, sweep_params):
+  """ The directory name of a design point.
+
+  The name is built from the short name and value of every swept parameter,
+  e.g. pipe_1_unr_4_part_2. Parameters held constant are left out.
+  """
+  return "_".join("%s_%s" % (p.short_name, point[p.name])
+                  for p in swept_params(sweep_params))
+
+def check_sweep_params(sweep_params):
+  """ Reject sweeps whose config names could collide. """
+  short_names = [p.short_name for p in sweep_params]
+  duplicates = set(n for n in short_names if short_names.count(n) > 1)
+  if duplicates:
+    raise ValueError("Sweep parameters share a short name: %s" %
+                     ", ".join(sorted(duplicates)))
+
+def kernel_limits(benchmark, name):
+  """ The kernels a parameter configures, and the value beyond which it no
+  longer changes their configuration.
+
+  unrolling configures the kernels with loops that may be unrolled, up to
+  their largest trip count; partition configures the kernels that own arrays
+  partitioned into banks, up to their largest array.
+
+  Returns:
+    A list of (kernel, limit) in order of appearance, where limit is None if
+    there is no such value.
+  """
+  limits = []
+  def add(kernel, limit):
+    for i, (k, l) in enumerate(limits):
+      if k == kernel:
+        if l is not None:
+          limits[i] = (k, None if limit is None else max(l, limit))
+        return
+    limits.append((kernel, limit))
+  if name == "unrolling":
+    for loop in benchmark.loops:
+      if loop.trip_count == ALWAYS_UNROLL:
+        add(loop.name, None)
+      elif loop.trip_count not in (UNROLL_FLATTEN, UNROLL_ONE):
+        add(loop.name, loop.trip_count)
+  elif name == "partition":
+    for array in benchmark.arrays:
+      if (array.kernel is not None and
+          array.partition_type in (PARTITION_CYCLIC, PARTITION_BLOCK)):
+        add(array.kernel, array.size)
+  return limits
+
+def clip_sweep(param, limit):
+  """ End a sweep at its first value that reaches limit. """
+  if limit is None:
+    return param
+  for value in sweep_values(param):
+    if value >= limit:
+      return param._replace(end=value)
+  return param
+
+def kernel_sweep_params(benchmark, sweep_params):
+  """ Expand the parameters swept per kernel into one parameter per kernel.
+
+  Each kernel that a sweep_per_kernel parameter configures gets its own
+  parameter, named by kernel_param_name() and short-named
+  <short name>_<kernel>. Pruning keeps the product small: kernels the
+  parameter does not configure get no parameter of their own, each kernel's
+  sweep stops at the first value that changes nothing further (see
+  kernel_limits()), and a parameter that configures at most one kernel stays
+  global. max_tuned_kernels additionally bounds how many kernels may leave
+  the start value at once; see sweep_points().
+  """
+  expanded = []
+  for param in sweep_params:
+    limits = kernel_limits(benchmark, param.name)
+    if (not param.sweep_per_kernel or param.step_type == NO_SWEEP or
+        len(limits) < 2):
+      expanded.append(param)
+      continue
+    for kernel, limit in limits:
+      expanded.append(clip_sweep(param._replace(
+          name=kernel_param_name(param.name, kernel),
+          short_name="%s_%s" % (param.short_name, kernel),
+          sweep_per_kernel=False), limit))
+  return expanded
+
+def tuned_kernels(point, sweep_params):
+  """ The kernels whose per-kernel values in a point differ from the start
+  of their sweep. """
+  kernels = set()
+  for param in sweep_params:
+    name, _, kernel = param.name.partition(":")
+    if kernel and point[param.name] != param.start:
+      kernels.add(kernel)
+  return kernels
+
+def enumerate_sweep_points(sweep_params):
+  """ Lazily generate every point of the sweep.
+
+  Each point is a dict mapping parameter names to values. Points are produced
+  in the order of the cartesian product of sweep_params, with the last
+  parameter varying fastest, so the full sweep is never held in memory.
+  """
+  names = [p.name for p in sweep_params]
+  for values in itertools.product(*[sweep_values(p) for p in sweep_params]):
+    yield dict(zip(names, values))
+
+def benchmark_constraints(benchmark):
+  """ The constraints of sweep_config.py followed by those of a benchmark. """
+  return list(constraints) + benchmark.constraints
+
+def failed_constraint(benchmark, point, constraints):
+  """ The first of constraints that a point fails, or None. """
+  for constraint in constraints:
+    if not constraint.check(benchmark, point):
+      return constraint
+  return None
+
+def count_pruned(pruned, name):
+  if pruned is not None:
+    pruned[name] = pruned.get(name, 0) + 1
+
+def sweep_points(sweep_params, max_tuned=None, benchmark=None, constraints=(),
+                 pruned=None):
+  """ Lazily generate the points of a sweep that tune at most max_tuned
+  kernels (any number if max_tuned is None) and meet the constraints.
+
+  Args:
+    benchmark: The benchmark that constraints are checked against.
+    constraints: A list of Constraints, checked in order.
+    pruned: If given, a dict to which the number of points each constraint
+      removed is added, by constraint name. A point counts against the first
+      constraint it fails; the max_tuned limit is checked first.
+  """
+  tuned_limit = "max_tuned_kernels = %s" % max_tuned
+  for point in enumerate_sweep_points(sweep_params):
+    if (max_tuned is not None and
+        len(tuned_kernels(point, sweep_params)) > max_tuned):
+      count_pruned(pruned, tuned_limit)
+      continue
+    failed = failed_constraint(benchmark, point, constraints)
+    if failed:
+      count_pruned(pruned, failed.name)
+      continue
+    yield point
+
+def pruning_report(pruned):
+  """ Describe how many points each constraint removed. """
+  if not pruned:
+    return "no points pruned"
+  return "%d points pruned: %s" % (sum(pruned.values()), ", ".join(
+      "%d by %s" % (count, name) for name, count in
+      sorted(pruned.items(), key=lambda item: -item[1])))
+
+def benchmark_sweep(benchmark, sweep_params, pruned=None):
+  """ The sweep of one benchmark, with parameters swept per kernel expanded
+  and infeasible points left out.
+
+  Args:
+    pruned: See sweep_points().
+
+  Returns:
+    A tuple (the expanded SweepParams, a generator of the sweep's points).
+  """
+  sweep_params = kernel_sweep_params(benchmark, sweep_params)
+  check_sweep_params(sweep_params)
+  return sweep_params, sweep_points(sweep_params, max_tuned_kernels, benchmark,
+                                    benchmark_constraints(benchmark), pruned)
+
+def write_config_point(benchmark, bmk_dir, point, sweep_params):
+  """ Create the config directory and .cfg file of a single design point.
+
+  Returns:
+    True if the .cfg file was (re)written.
+  """
+  config_dir = os.path.join(bmk_dir, config_name(point, sweep_params))
+  if os.path.islink(config_dir):
+    # It was a duplicate in an earlier sweep.
+    os.remove(config_dir)
+  if not os.path.isdir(config_dir):
+    try:
+      os.makedirs(config_dir)
+    except OSError:
+      # Created concurrently by another writer.
+      if not os.path.isdir(config_dir):
+        raise
+  return generate_aladdin_config(
+      benchmark, benchmark.name, point, benchmark.loops, config_dir)
+
+def write_canonical_config_point(benchmark, bmk_dir, point, sweep_params,
+                                 index):
+  """ Write the config of a single design point, or link its directory to
+  an identical config already in the index.
+
+  Returns:
+    The name of the canonical config directory.
+  """
+  config = config_name(point, sweep_params)
+  canonical = index.canonical(config_digest(
+      render_aladdin_config(benchmark, point, benchmark.loops)), config)
+  if canonical == config:
+    write_config_point(benchmark, bmk_dir, point, sweep_params)
+  else:
+    link_config(bmk_dir, config, canonical)
+  return canonical
+
+def _write_config_point_star(args):
+  return write_config_point(*args)
+
+def _config_digest_star(args):
+  benchmark, point, sweep_params = args
+  return (config_name(point, sweep_params), point, config_digest(
+      render_aladdin_config(benchmark, point, benchmark.loops)))
+
+def generate_all_configs(benchmark, bmk_dir, sweep_params, pool=None,
+                         pruned=None):
+  """ Generates all the possible configurations for the design sweep.
+
+  Each distinct config is written once, to the directory of the first design
+  point that renders to it; the directories of the other points are symlinks
+  to that one. See ConfigIndex. Points that fail a constraint are counted in
+  pruned, as by sweep_points().
+
+  Returns:
+    A tuple (number of design points, number of distinct configs, number of
+    .cfg files written).
+  """
+  sweep_params, points = benchmark_sweep(benchmark, sweep_params, pruned)
+  # Canonical configs must not depend on the order in which workers finish,
+  # so digests are collected in sweep order.
+  work = ((benchmark, point, sweep_params) for point in points)
+  if pool:
+    digests = pool.imap(_config_digest_star, work, chunksize=64)
+  else:
+    digests = (_config_digest_star(w) for w in work)
+  index = ConfigIndex(bmk_dir, benchmark.name, load=False)
+  canonical_points = []
+  duplicates = []
+  num_points = 0
+  for config, point, digest in digests:
+    num_points += 1
+    canonical = index.canonical(digest, config)
+    if canonical == config:
+      canonical_points.append(point)
     else:
-      if next_param.step_type == LINEAR_SWEEP:
-        value_range = range(next_param.start, next_param.end+1, next_param.step)
-      elif next_param.step_type == EXP_SWEEP:
-        value_range = [next_param.start * (next_param.step ** exp)
-                       for exp in range(0,
-                           int(math.log(next_param.end/next_param.start,
-                                        next_param.step))+1)]
-    for value in value_range:
-      set_params[next_param.name] = value
-      generate_configs_recurse(benchmark, set_params, local_sweep_params)
+      duplicates.append((config, canonical))
+
+  work = ((benchmark, bmk_dir, point, sweep_params)
+          for point in canonical_points)
+  if pool:
+    written = pool.imap_unordered(_write_config_point_star, work, chunksize=64)
   else:
-    # All parameters have been populated with values. We can write the
-    # configuration now.
-
-    CONFIG_NAME_FORMAT = "pipe%d_unr_%d_part_%d"
-    config_name = CONFIG_NAME_FORMAT % (set_params["pipelining"],
-                                        set_params["unrolling"],
-                                        set_params["partition"])
-    print "  Configuration %s" % config_name
-    if not os.path.exists(config_name):
-      os.makedirs(config_name)
-
-    os.chdir(config_name)
-    generate_aladdin_config(benchmark, benchmark.name, set_params, benchmark.loops)
-    os.chdir("..")
-
-def generate_all_configs(benchmark):
-  """ Generates all the possible configurations for the design sweep. """
-  # Start out with these parameters.
-  all_sweep_params = [pipelining,
-                      unrolling,
-                      partition,
-                      cycle_time]
-  # This dict stores a single configuration.
-  params = {}
-  # Recursively generate all possible configurations.
-  print benchmark.kernels
-  generate_configs_recurse(benchmark, params, all_sweep_params)
-
-def write_config_files(workload, output_dir):
-  """ Create the directory structure and config files for a benchmark. """
-  # This assumes we're already in output_dir.
-  for benchmark in workload:
-    if not os.path.exists(benchmark.name):
-      os.makedirs(benchmark.name)
-    print "Generating configurations for %s" % benchmark.name
-    os.chdir(benchmark.name)
-    generate_all_configs(benchmark)
-    os.chdir("..")
+    written = (_write_config_point_star(w) for w in work)
+  num_written = sum(written)
+  for config, canonical in duplicates:
+    link_config(bmk_dir, config, canonical)
+  index.save()
+  return num_points, len(canonical_points), num_written
+
+def sweep_parameters():
+  """ The SweepParams of the sweep defined in sweep_config.py. """
+  return [pipelining,
+          unrolling,
+          partition,
+          cycle_time]
+
+def write_config_files(workload, output_dir, jobs=1):
+  """ Create the directory structure and config files for a benchmark.
 
+  Files are addressed by absolute path, so this does not depend on or change
+  the current directory. Config files whose contents would not change are
+  left untouched.
+  """
+  all_sweep_params = sweep_parameters()
+  check_sweep_params(all_sweep_params)
+  output_dir = os.path.abspath(output_dir)
+  pool = multiprocessing.Pool(processes=jobs) if jobs > 1 else None
+  for benchmark in workload:
+    bmk_dir = os.path.join(output_dir, benchmark.name)
+    if not os.path.exists(bmk_dir):
+      os.makedirs(bmk_dir)
+    pruned = {}
+    num_points, num_distinct, num_written = generate_all_configs(
+        benchmark, bmk_dir, all_sweep_params, pool, pruned)
+    print("Generated configurations for %s: %d design points (%s), %d "
+          "distinct configs, %d config files written" %
+          (benchmark.name, num_points, pruning_report(pruned), num_distinct,
+           num_written))
+  if pool:
+    pool.close()
+    pool.join()
@@ -2,11 +2,227 @@
 #
 # Authors: Sam Xi, Sophia Shao
 
+import glob
+import hashlib
+import json
+import multiprocessing
 import os
+import subprocess
+import sys
+import tempfile
+import time
 
 from machsuite_config import MACH
+from stage_log import wait_child
+from trace_sampler import SAMPLE_WINDOWS, metadata_path
 
-def generate_traces(workload, output_dir, source_dir):
+SAMPLER = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       "trace_sampler.py")
+
+CLANG_FLAGS = ["-g", "-O1", "-S", "-fno-slp-vectorize", "-fno-vectorize",
+               "-fno-unroll-loops", "-fno-inline", "-fno-builtin",
+               "-emit-llvm"]
+
+class BuildError(Exception):
+  pass
+
+def file_digest(path):
+  sha = hashlib.sha1()
+  with open(path, "rb") as f:
+    for chunk in iter(lambda: f.read(1 << 20), b""):
+      sha.update(chunk)
+  return sha.hexdigest()
+
+def file_stamp(path):
+  st = os.stat(path)
+  return [st.st_size, st.st_mtime]
+
+class BuildCache(object):
+  """ Make-style incremental execution of build steps.
+
+  Each step is identified by name and records a key derived from its command
+  line, extra environment and the contents of its inputs, along with the
+  size and mtime of its outputs. A step is skipped if its key is unchanged and
+  its outputs are untouched. Since a step's inputs are usually the outputs of
+  earlier steps, a rebuild that produces byte-identical files does not
+  propagate further down the chain.
+
+  Executed steps are recorded in stage_log, if given, with stage_fields such
+  as the benchmark name.
+  """
+  def __init__(self, build_dir, log_path, stage_log=None, **stage_fields):
+    self.build_dir = build_dir
+    self.log_path = log_path
+    self.stage_log = stage_log
+    self.stage_fields = stage_fields
+    self.stamps_path = os.path.join(build_dir, "build_stamps.json")
+    self.stamps = {}
+    if os.path.exists(self.stamps_path):
+      with open(self.stamps_path) as f:
+        self.stamps = json.load(f)
+
+  def _save(self):
+    fd, tmp_path = tempfile.mkstemp(dir=self.build_dir)
+    with os.fdopen(fd, "w") as f:
+      json.dump(self.stamps, f, indent=2, sort_keys=True)
+    os.rename(tmp_path, self.stamps_path)
+
+  def _key(self, cmd, inputs, env):
+    sha = hashlib.sha1()
+    sha.update(json.dumps([cmd, sorted(env.items())]).encode("utf-8"))
+    for path in inputs:
+      sha.update(file_digest(path).encode("ascii"))
+    return sha.hexdigest()
+
+  def _up_to_date(self, name, key, outputs):
+    record = self.stamps.get(name)
+    if not record or record["key"] != key:
+      return False
+    for path in outputs:
+      if not os.path.exists(path) or file_stamp(path) != record["outputs"][path]:
+        return False
+    return True
+
+  def run(self, name, cmd, inputs, outputs, env=None):
+    """ Run a build step unless it is up to date.
+
+    Args:
+      name: Unique name of this step within the build directory.
+      cmd: argv list of the command. It runs in the build directory.
+      inputs: Files the step reads.
+      outputs: Files the step writes.
+      env: Extra environment variables the step depends on.
+
+    Returns:
+      True if the step was executed, False if it was skipped.
+    """
+    env = env or {}
+    missing = [path for path in inputs if not os.path.exists(path)]
+    if missing:
+      raise BuildError("%s: missing input %s" % (name, ", ".join(missing)))
+    key = self._key(cmd, inputs, env)
+    if self._up_to_date(name, key, outputs):
+      return False
+    step_env = dict(os.environ)
+    step_env.update(env)
+    with open(self.log_path, "a") as log:
+      log.write("$ %s\n" % " ".join(cmd))
+      log.flush()
+      start = time.time()
+      try:
+        proc = subprocess.Popen(cmd, cwd=self.build_dir, env=step_env,
+                                stdout=log, stderr=subprocess.STDOUT)
+      except OSError as e:
+        raise BuildError("%s: could not run %s: %s" % (name, cmd[0], e))
+      _, rusage = wait_child(proc)
+    returncode = proc.returncode
+    if self.stage_log:
+      self.stage_log.record(name, start, time.time() - start, rusage,
+                            outputs=outputs, returncode=returncode,
+                            **self.stage_fields)
+    if returncode != 0:
+      raise BuildError("%s failed with exit code %d, see %s" %
+                       (name, returncode, self.log_path))
+    for path in outputs:
+      if not os.path.exists(path):
+        raise BuildError("%s did not produce %s" % (name, path))
+    self.stamps[name] = {"key": key,
+                         "outputs": dict((p, file_stamp(p)) for p in outputs)}
+    self._save()
+    return True
+
+def benchmark_source_dir(benchmark, source_dir):
+  """ Directory of a MachSuite benchmark, e.g. <source_dir>/gemm/blocked. """
+  return "%s/%s/%s" % (source_dir, benchmark.name.split('-')[0],
+                       benchmark.name.split('-')[1])
+
+def build_trace(benchmark, output_dir, source_dir, stage_log=None,
+                sample_iterations=0, sample_windows=SAMPLE_WINDOWS):
+  """ Build the dynamic trace of a single MachSuite benchmark.
+
+  If sample_iterations is set, also write a sampled trace with that many
+  iterations of the benchmark's main loop; see trace_sampler.py.
+
+  Returns:
+    The names of the build steps that were executed.
+  """
+  tracer_home = os.environ["TRACER_HOME"]
+  trace_output_dir = "%s/%s/inputs" % (output_dir, benchmark.name)
+  if not os.path.exists(trace_output_dir):
+    os.makedirs(trace_output_dir)
+  build = BuildCache(trace_output_dir, "%s/build.log" % trace_output_dir,
+                     stage_log, benchmark=benchmark.name)
+
+  bmk_source_dir = benchmark_source_dir(benchmark, source_dir)
+  source_file = "%s/%s.c" % (bmk_source_dir, benchmark.source_file)
+  headers = sorted(glob.glob("%s/*.h" % bmk_source_dir))
+
+  output_file_prefix = ("%s/%s" % (trace_output_dir, benchmark.source_file))
+  obj = output_file_prefix + ".llvm"
+  opt_obj = output_file_prefix + "-opt.llvm"
+  full_llvm = output_file_prefix + "_full.llvm"
+  full_s = output_file_prefix + "_full.s"
+  executable = output_file_prefix + "-instrumented"
+  full_trace_so = tracer_home + "/full-trace/full_trace.so"
+  trace_logger = tracer_home + "/profile-func/trace_logger.llvm"
+
+  all_objs = [opt_obj]
+  executed = []
+  def step(name, cmd, inputs, outputs, env=None):
+    if build.run(name, cmd, inputs, outputs, env):
+      executed.append(name)
+
+  # Compile the source file.
+  step("compile", ["clang"] + CLANG_FLAGS +
+       ["-I" + os.environ["ALADDIN_HOME"], "-o", obj, source_file],
+       [source_file] + headers, [obj])
+  # Compile the test harness if applicable.
+  if benchmark.test_harness:
+    test_obj = output_file_prefix + "_test.llvm"
+    all_objs.append(test_obj)
+    test_file = "%s/%s" % (source_dir, benchmark.test_harness)
+    step("compile_harness", ["clang"] + CLANG_FLAGS + ["-o", test_obj, test_file],
+         [test_file], [test_obj])
+
+  # Finish compilation, linking, and then execute the instrumented code to
+  # get the dynamic trace. The tracer pass reads the kernels to instrument from
+  # the WORKLOAD environment variable.
+  step("opt", ["opt", "-S", "-load=" + full_trace_so, "-fulltrace", obj,
+               "-o", opt_obj],
+       [obj, full_trace_so], [opt_obj],
+       env={"WORKLOAD": ",".join(benchmark.kernels)})
+  step("link", ["llvm-link", "-o", full_llvm] + all_objs + [trace_logger],
+       all_objs + [trace_logger], [full_llvm])
+  step("llc", ["llc", "-O0", "-disable-fp-elim", "-filetype=asm",
+               "-o", full_s, full_llvm],
+       [full_llvm], [full_s])
+  step("gcc", ["gcc", "-O0", "-fno-inline", "-o", executable, full_s,
+               "-lm", "-lz"],
+       [full_s], [executable])
+  # The instrumented binary writes dynamic_trace.gz into the build directory.
+  input_data = "%s/input.data" % bmk_source_dir
+  check_data = "%s/check.data" % bmk_source_dir
+  trace = "%s/dynamic_trace.gz" % trace_output_dir
+  step("trace", [executable, input_data, check_data],
+       [executable, input_data, check_data], [trace])
+  if sample_iterations:
+    sampled = "%s/dynamic_sampled_trace.gz" % trace_output_dir
+    step("sample", [sys.executable, SAMPLER, "sample", trace, sampled,
+                    "--benchmark", benchmark.name,
+                    "--iterations", str(sample_iterations),
+                    "--windows", str(sample_windows)],
+         [trace, SAMPLER], [sampled, metadata_path(sampled)])
+  return executed
+
+def _build_trace_star(args):
+  benchmark = args[0]
+  try:
+    return benchmark.name, build_trace(*args), None
+  except BuildError as e:
+    return benchmark.name, [], str(e)
+
+def generate_traces(workload, output_dir, source_dir, jobs=1, stage_log=None,
+                    sample_iterations=0, sample_windows=SAMPLE_WINDOWS):
   """ Generates dynamic traces for each workload.
 
   The traces are placed into <output_dir>/<benchmark>/inputs. This
@@ -14,65 +230,45 @@ def generate_traces(workload, output_dir, source_dir):
   contained inside a single source file, with the exception that a separate test
   harness can be specified through the Benchmark description objects.
 
+  Builds are incremental: a step is only rerun if its command line or the
+  contents of its inputs (sources, headers, the test harness and the
+  LLVM-Tracer artifacts in TRACER_HOME) changed since it last ran. Command
+  output is appended to <output_dir>/<benchmark>/inputs/build.log.
+
   Args:
     workload: A list of Benchmark description objects.
     output_dir: Top-level directory of simulation outputs.
     source_dir: The top-level directory of the benchmark suite.
+    jobs: Number of benchmarks to build in parallel.
+    stage_log: A StageLog that executed build steps are recorded in, or None.
+    sample_iterations, sample_windows: If sample_iterations is set, also
+      build sampled traces; see build_trace().
+
+  Returns:
+    The number of benchmarks whose trace could not be built.
   """
   if not "TRACER_HOME" in os.environ:
     raise Exception("Set TRACER_HOME directory as an environment variable")
-  for benchmark in workload:
-    print benchmark.name
-
-    trace_output_dir = "%s/%s/inputs" % (output_dir, benchmark.name)
-    if not os.path.exists(trace_output_dir):
-      os.makedirs(trace_output_dir)
-    os.chdir(trace_output_dir)
-
-    if workload == MACH:
-      source_file_prefix = "%s/%s/%s/%s" % (source_dir, \
-        benchmark.name.split('-')[0], benchmark.name.split('-')[1], \
-        benchmark.source_file)
-
-    source_file = source_file_prefix + ".c"
-
-    output_file_prefix = ("%s/%s" % (trace_output_dir, benchmark.source_file))
-    obj = output_file_prefix + ".llvm"
-    opt_obj = output_file_prefix + "-opt.llvm"
-    full_llvm = output_file_prefix + "_full.llvm"
-    full_s = output_file_prefix + "_full.s"
-    executable = output_file_prefix + "-instrumented"
-
-    os.environ["WORKLOAD"]=",".join(benchmark.kernels)
-    all_objs = [opt_obj]
-
-    # Compile the source file.
-    os.system("clang -g -O1 -S -fno-slp-vectorize -fno-vectorize "
-              "-I" + os.environ["ALADDIN_HOME"] + " " +
-              "-fno-unroll-loops -fno-inline -fno-builtin -emit-llvm " +
-              "-o " + obj + " " + source_file)
-    # Compile the test harness if applicable.
-    if benchmark.test_harness:
-      test_obj = output_file_prefix + "_test.llvm"
-      all_objs.append(test_obj)
-      test_file = "%s/%s" % ( source_dir, benchmark.test_harness)
-      os.system("clang -g -O1 -S -fno-slp-vectorize -fno-vectorize "
-                "-fno-unroll-loops -fno-inline -fno-builtin -emit-llvm " +
-                "-o " + test_obj + " " + test_file)
-
-    # Finish compilation, linking, and then execute the instrumented code to
-    # get the dynamic trace.
-    os.system("opt -S -load=" + os.getenv("TRACER_HOME") +
-              "/full-trace/full_trace.so -fulltrace " + obj + " -o " + opt_obj)
-    os.system("llvm-link -o " + full_llvm + " " + " ".join(all_objs) + " " +
-              os.getenv("TRACER_HOME") + "/profile-func/trace_logger.llvm")
-    os.system("llc -O0 -disable-fp-elim -filetype=asm -o " + full_s + " " + full_llvm)
-    os.system("gcc -O0 -fno-inline -o " + executable + " " + full_s + " -lm -lz")
-    # Change directory so that the dynamic_trace file gets put in the right
-    # place.
-    if workload == MACH:
-      os.system(executable + " %s/%s/%s/input.data %s/%s/%s/check.data" % \
-       (source_dir, benchmark.name.split('-')[0], benchmark.name.split('-')[1],\
-       source_dir, benchmark.name.split('-')[0], benchmark.name.split('-')[1]))
-    os.chdir(output_dir)
-
+  if workload != MACH:
+    raise Exception("Trace generation only supports MachSuite")
+  work = [(benchmark, output_dir, source_dir, stage_log, sample_iterations,
+           sample_windows) for benchmark in workload]
+  if jobs <= 1:
+    completed = (_build_trace_star(w) for w in work)
+    pool = None
+  else:
+    pool = multiprocessing.Pool(processes=jobs)
+    completed = pool.imap_unordered(_build_trace_star, work)
+  failed = 0
+  for name, executed, error in completed:
+    if error:
+      failed += 1
+      print("%s: FAILED: %s" % (name, error))
+    elif executed:
+      print("%s: ran %s" % (name, ", ".join(executed)))
+    else:
+      print("%s: up to date" % name)
+  if pool:
+    pool.close()
+    pool.join()
+  return failed
@@ -3,18 +3,36 @@
 #
 # Authors: Sam Xi, Sophia Shao
 
+import os
+import sys
+
 from design_sweep_types import *
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "common"))
+from bench_layout import evaluate, header_defines
+
+def header_value(header, expr):
+  """ Evaluate a C expression over the #defines of a benchmark header.
+
+  Used for the sizes of benchmarks whose inputs can be generated at any
+  scale, so that their arrays follow the header.
+  """
+  path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", header)
+  return evaluate(expr, header_defines(path))
+
 aes_aes = Benchmark("aes-aes", "aes", "common/harness.c")
 aes_aes.set_kernels(["gf_alog", "gf_log", "gf_mulinv", "rj_sbox", "rj_xtime",
                      "aes_subBytes", "aes_addRoundKey", "aes_addRoundKey_cpy",
                      "aes_shiftRows", "aes_mixColumns", "aes_expandEncKey",
                      "aes256_encrypt_ecb"])
-aes_aes.add_array("ctx", 96, 1, PARTITION_CYCLIC)
-aes_aes.add_array("k", 32, 1, PARTITION_CYCLIC)
+# Arrays are owned by the kernel whose loops access them most; buf is shared
+# by every round function.
+aes_aes.add_array("ctx", 96, 1, PARTITION_CYCLIC, kernel="aes256_encrypt_ecb")
+aes_aes.add_array("k", 32, 1, PARTITION_CYCLIC, kernel="aes256_encrypt_ecb")
 aes_aes.add_array("buf", 16, 1, PARTITION_CYCLIC)
 aes_aes.add_array("rcon", 1, 1, PARTITION_COMPLETE)
-aes_aes.add_array("sbox", 256, 1, PARTITION_CYCLIC)
+aes_aes.add_array("sbox", 256, 1, PARTITION_CYCLIC, kernel="aes_subBytes")
 aes_aes.add_loop("aes_addRoundKey_cpy", 138, 16)
 aes_aes.add_loop("aes_subBytes", 122, 16)
 aes_aes.add_loop("aes_addRoundKey", 130, 16)
@@ -24,21 +42,31 @@ aes_aes.add_loop("aes256_encrypt_ecb", 207, 13)
 
 bfs_bulk = Benchmark("bfs-bulk", "bulk", "common/harness.c")
 bfs_bulk.set_kernels(["bfs"])
-bfs_bulk.add_array("nodes", 512, 8, PARTITION_CYCLIC)
-bfs_bulk.add_array("edges", 4096, 8, PARTITION_CYCLIC)
-bfs_bulk.add_array("level", 256, 1, PARTITION_CYCLIC)
-bfs_bulk.add_array("level_counts", 10, 8, PARTITION_CYCLIC)
+bfs_bulk.add_array("nodes", header_value("bfs/bulk/bulk.h", "2*N_NODES"), 8,
+                   PARTITION_CYCLIC)
+bfs_bulk.add_array("edges", header_value("bfs/bulk/bulk.h", "N_EDGES"), 8,
+                   PARTITION_CYCLIC)
+bfs_bulk.add_array("level", header_value("bfs/bulk/bulk.h", "N_NODES"), 1,
+                   PARTITION_CYCLIC)
+bfs_bulk.add_array("level_counts", header_value("bfs/bulk/bulk.h", "N_LEVELS"),
+                   8, PARTITION_CYCLIC)
 bfs_bulk.add_loop("bfs", 67, UNROLL_ONE) #where the exit condition happens
-bfs_bulk.add_loop("bfs", 49, 256)
+bfs_bulk.add_loop("bfs", 49, header_value("bfs/bulk/bulk.h", "N_NODES"))
 bfs_bulk.add_loop("bfs", 52, UNROLL_FLATTEN)
 
 bfs_queue = Benchmark("bfs-queue", "queue", "common/harness.c")
 bfs_queue.set_kernels(["bfs"])
-bfs_queue.add_array("queue", 256, 8, PARTITION_CYCLIC)
-bfs_queue.add_array("nodes", 512, 8, PARTITION_CYCLIC)
-bfs_queue.add_array("edges", 4096, 8, PARTITION_CYCLIC)
-bfs_queue.add_array("level", 256, 1, PARTITION_CYCLIC)
-bfs_queue.add_array("level_counts", 10, 8, PARTITION_CYCLIC)
+bfs_queue.add_array("queue", header_value("bfs/queue/queue.h", "N_NODES"), 8,
+                    PARTITION_CYCLIC)
+bfs_queue.add_array("nodes", header_value("bfs/queue/queue.h", "2*N_NODES"), 8,
+                    PARTITION_CYCLIC)
+bfs_queue.add_array("edges", header_value("bfs/queue/queue.h", "N_EDGES"), 8,
+                    PARTITION_CYCLIC)
+bfs_queue.add_array("level", header_value("bfs/queue/queue.h", "N_NODES"), 1,
+                    PARTITION_CYCLIC)
+bfs_queue.add_array("level_counts",
+                    header_value("bfs/queue/queue.h", "N_LEVELS"), 8,
+                    PARTITION_CYCLIC)
 bfs_queue.add_loop("bfs", 63, UNROLL_ONE)
 bfs_queue.add_loop("bfs", 69, 512)
 
@@ -53,14 +81,17 @@ fft_strided.add_loop("fft", 9, 512)
 
 fft_transpose = Benchmark("fft-transpose", "fft", "common/harness.c")
 fft_transpose.set_kernels(["twiddles8","loadx8","loady8","fft1D_512"])
-fft_transpose.add_array("reversed", 8, 4, PARTITION_COMPLETE)
-fft_transpose.add_array("DATA_x", 512, 8, PARTITION_CYCLIC)
-fft_transpose.add_array("DATA_y", 512, 8, PARTITION_CYCLIC)
+# All arrays are local to fft1D_512; twiddles8 and loadx8/loady8 only work on
+# the completely partitioned data_x and data_y and on rows of smem.
+fft_transpose.add_array("reversed", 8, 4, PARTITION_COMPLETE,
+                        kernel="fft1D_512")
+fft_transpose.add_array("DATA_x", 512, 8, PARTITION_CYCLIC, kernel="fft1D_512")
+fft_transpose.add_array("DATA_y", 512, 8, PARTITION_CYCLIC, kernel="fft1D_512")
 fft_transpose.add_array("data_x", 8, 8, PARTITION_COMPLETE)
 fft_transpose.add_array("data_y", 8, 8, PARTITION_COMPLETE)
-fft_transpose.add_array("smem", 576, 8, PARTITION_CYCLIC)
-fft_transpose.add_array("work_x", 512, 8, PARTITION_CYCLIC)
-fft_transpose.add_array("work_y", 512, 8, PARTITION_CYCLIC)
+fft_transpose.add_array("smem", 576, 8, PARTITION_CYCLIC, kernel="fft1D_512")
+fft_transpose.add_array("work_x", 512, 8, PARTITION_CYCLIC, kernel="fft1D_512")
+fft_transpose.add_array("work_y", 512, 8, PARTITION_CYCLIC, kernel="fft1D_512")
 fft_transpose.add_loop("twiddles8", 55, 8)
 fft_transpose.add_loop("fft1D_512", 154, 64)
 fft_transpose.add_loop("fft1D_512", 201, 64)
@@ -97,7 +128,7 @@ gemm_ncubed.add_loop("gemm", 48, 64)
 kmp_kmp = Benchmark("kmp-kmp", "kmp", "common/harness.c")
 kmp_kmp.set_kernels(["CPF","kmp"])
 kmp_kmp.add_array("pattern", 4, 1, PARTITION_COMPLETE)
-kmp_kmp.add_array("input", 32411, 1, PARTITION_CYCLIC)
+kmp_kmp.add_array("input", 32411, 1, PARTITION_CYCLIC, kernel="kmp")
 kmp_kmp.add_array("kmpNext", 4, 4, PARTITION_COMPLETE)
 kmp_kmp.add_loop("CPF", 40, UNROLL_FLATTEN)
 kmp_kmp.add_loop("CPF", 41, UNROLL_FLATTEN)
@@ -106,29 +137,33 @@ kmp_kmp.add_loop("kmp", 61, UNROLL_FLATTEN)
 
 md_grid = Benchmark("md-grid", "md", "common/harness.c")
 md_grid.set_kernels(["md"])
-md_grid.add_array("n_points", 64, 4, PARTITION_CYCLIC)
-md_grid.add_array("d_force", 1920, 8, PARTITION_CYCLIC)
-md_grid.add_array("position", 1920, 8, PARTITION_CYCLIC)
+md_grid.add_array("n_points", header_value("md/grid/md.h", "nBlocks"), 4,
+                  PARTITION_CYCLIC)
+md_grid.add_array("d_force",
+                  header_value("md/grid/md.h", "nBlocks*densityFactor*3"), 8,
+                  PARTITION_CYCLIC)
+md_grid.add_array("position",
+                  header_value("md/grid/md.h", "nBlocks*densityFactor*3"), 8,
+                  PARTITION_CYCLIC)
 md_grid.add_loop("md", 46, UNROLL_ONE)
 md_grid.add_loop("md", 47, UNROLL_ONE)
 md_grid.add_loop("md", 48, UNROLL_ONE)
 md_grid.add_loop("md", 50, UNROLL_ONE)
 md_grid.add_loop("md", 51, UNROLL_ONE)
 md_grid.add_loop("md", 52, UNROLL_ONE) #FIXME
-md_grid.add_loop("md", 56, 10)
-md_grid.add_loop("md", 62, 10)
+md_grid.add_loop("md", 56, header_value("md/grid/md.h", "densityFactor"))
+md_grid.add_loop("md", 62, header_value("md/grid/md.h", "densityFactor"))
 
 md_knn = Benchmark("md-knn", "md", "common/harness.c")
 md_knn.set_kernels(["md_kernel"])
-md_knn.add_array("d_force_x", 256, 8, PARTITION_CYCLIC)
-md_knn.add_array("d_force_y", 256, 8, PARTITION_CYCLIC)
-md_knn.add_array("d_force_z", 256, 8, PARTITION_CYCLIC)
-md_knn.add_array("position_x", 256, 8, PARTITION_CYCLIC)
-md_knn.add_array("position_y", 256, 8, PARTITION_CYCLIC)
-md_knn.add_array("position_z", 256, 8, PARTITION_CYCLIC)
-md_knn.add_array("NL", 4096, 8, PARTITION_CYCLIC)
+for name in ["d_force_x", "d_force_y", "d_force_z",
+             "position_x", "position_y", "position_z"]:
+  md_knn.add_array(name, header_value("md/knn/md.h", "nAtoms"), 8,
+                   PARTITION_CYCLIC)
+md_knn.add_array("NL", header_value("md/knn/md.h", "nAtoms*maxNeighbors"), 8,
+                 PARTITION_CYCLIC)
 md_knn.add_loop("md_kernel", 51, UNROLL_ONE)
-md_knn.add_loop("md_kernel", 58, 16)
+md_knn.add_loop("md_kernel", 58, header_value("md/knn/md.h", "maxNeighbors"))
 
 nw_nw = Benchmark("nw-nw", "needwun", "common/harness.c")
 nw_nw.set_kernels(["needwun"])
@@ -144,8 +179,8 @@ nw_nw.add_loop("needwun", 99, UNROLL_ONE)
 
 sort_merge = Benchmark("sort-merge", "merge", "common/harness.c")
 sort_merge.set_kernels(["merge","mergesort"])
-sort_merge.add_array("temp", 4096, 4, PARTITION_CYCLIC)
-sort_merge.add_array("a", 4096, 4, PARTITION_CYCLIC)
+sort_merge.add_array("temp", 4096, 4, PARTITION_CYCLIC, kernel="merge")
+sort_merge.add_array("a", 4096, 4, PARTITION_CYCLIC, kernel="merge")
 sort_merge.add_loop("merge", 37, 2048)
 sort_merge.add_loop("merge", 41, 2048)
 sort_merge.add_loop("merge", 48, UNROLL_ONE)
@@ -154,10 +189,12 @@ sort_merge.add_loop("mergesort", 70, UNROLL_ONE)
 
 sort_radix = Benchmark("sort-radix", "radix", "common/harness.c")
 sort_radix.set_kernels(["local_scan","sum_scan","last_step_scan","init","hist","update","ss_sort"])
-sort_radix.add_array("a", 2048, 4, PARTITION_CYCLIC)
-sort_radix.add_array("b", 2048, 4, PARTITION_CYCLIC)
+# update reads and scatters both a and b, and last_step_scan reads sum once per
+# bucket; bucket is updated by every step alike.
+sort_radix.add_array("a", 2048, 4, PARTITION_CYCLIC, kernel="update")
+sort_radix.add_array("b", 2048, 4, PARTITION_CYCLIC, kernel="update")
 sort_radix.add_array("bucket", 2048, 4, PARTITION_CYCLIC)
-sort_radix.add_array("sum", 128, 4, PARTITION_CYCLIC)
+sort_radix.add_array("sum", 128, 4, PARTITION_CYCLIC, kernel="last_step_scan")
 sort_radix.add_loop("last_step_scan", 62, 128)
 sort_radix.add_loop("last_step_scan", 63, UNROLL_FLATTEN)
 sort_radix.add_loop("local_scan", 41, 128)
@@ -172,21 +209,31 @@ sort_radix.add_loop("ss_sort", 112, UNROLL_ONE)
 
 spmv_crs = Benchmark("spmv-crs", "crs", "common/harness.c")
 spmv_crs.set_kernels(["spmv"])
-spmv_crs.add_array("val", 1666, 8, PARTITION_CYCLIC)
-spmv_crs.add_array("cols", 1666, 4, PARTITION_CYCLIC)
-spmv_crs.add_array("rowDelimiters", 495, 4, PARTITION_CYCLIC)
-spmv_crs.add_array("vec", 494, 8, PARTITION_CYCLIC)
-spmv_crs.add_array("out", 494, 8, PARTITION_CYCLIC)
-spmv_crs.add_loop("spmv", 41, 494)
+spmv_crs.add_array("val", header_value("spmv/crs/crs.h", "NNZ"), 8,
+                   PARTITION_CYCLIC)
+spmv_crs.add_array("cols", header_value("spmv/crs/crs.h", "NNZ"), 4,
+                   PARTITION_CYCLIC)
+spmv_crs.add_array("rowDelimiters", header_value("spmv/crs/crs.h", "N+1"), 4,
+                   PARTITION_CYCLIC)
+spmv_crs.add_array("vec", header_value("spmv/crs/crs.h", "N"), 8,
+                   PARTITION_CYCLIC)
+spmv_crs.add_array("out", header_value("spmv/crs/crs.h", "N"), 8,
+                   PARTITION_CYCLIC)
+spmv_crs.add_loop("spmv", 41, header_value("spmv/crs/crs.h", "N"))
 spmv_crs.add_loop("spmv", 45, UNROLL_FLATTEN)
 
 spmv_ellpack = Benchmark("spmv-ellpack", "ellpack", "common/harness.c")
 spmv_ellpack.set_kernels(["ellpack"])
-spmv_ellpack.add_array("nzval", 4940, 8, PARTITION_CYCLIC)
-spmv_ellpack.add_array("cols", 4940, 4, PARTITION_CYCLIC)
-spmv_ellpack.add_array("vec", 494, 8, PARTITION_CYCLIC)
-spmv_ellpack.add_array("out", 494, 8, PARTITION_CYCLIC)
-spmv_ellpack.add_loop("ellpack", 41, 494)
+spmv_ellpack.add_array("nzval", header_value("spmv/ellpack/ellpack.h", "N*L"),
+                       8, PARTITION_CYCLIC)
+spmv_ellpack.add_array("cols", header_value("spmv/ellpack/ellpack.h", "N*L"),
+                       4, PARTITION_CYCLIC)
+spmv_ellpack.add_array("vec", header_value("spmv/ellpack/ellpack.h", "N"), 8,
+                       PARTITION_CYCLIC)
+spmv_ellpack.add_array("out", header_value("spmv/ellpack/ellpack.h", "N"), 8,
+                       PARTITION_CYCLIC)
+spmv_ellpack.add_loop("ellpack", 41, header_value("spmv/ellpack/ellpack.h",
+                                                  "N"))
 spmv_ellpack.add_loop("ellpack", 43, UNROLL_FLATTEN)
 
 stencil_stencil2d = Benchmark("stencil-stencil2d", "stencil", "common/harness.c")
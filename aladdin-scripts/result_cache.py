@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# Content-addressed cache of Aladdin simulation outputs.
+#
+# A simulation's outputs are fully determined by the dynamic trace, the
+# rendered .cfg file and the Aladdin binary, so those are hashed into a key.
+# Outputs are stored under <cache_dir>/objects/<key> and restored into a config
+# directory by hard-linking them (or copying them across filesystems). The
+# mtime of each entry directory records its last use for LRU eviction.
+
+import errno
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+HASH_CHUNK_SIZE = 1 << 20
+
+def _link_or_copy(src, dst):
+  try:
+    os.link(src, dst)
+  except OSError:
+    shutil.copy2(src, dst)
+
+def clear_outputs(output_dir):
+  """ Remove regular files from an outputs directory.
+
+  Restored outputs are hard links to cache entries, so they must be unlinked
+  rather than overwritten in place before a simulation writes new ones.
+  """
+  for name in os.listdir(output_dir):
+    path = os.path.join(output_dir, name)
+    if os.path.isfile(path):
+      os.unlink(path)
+
+class ResultCache(object):
+  """ A size-capped, LRU-evicted store of simulation outputs. """
+  def __init__(self, cache_dir, max_bytes):
+    """ Open (or create) the cache.
+
+    Args:
+      cache_dir: Directory holding the cache. May be shared between sweeps.
+      max_bytes: Total size that evict() trims the cache down to, or None
+        for no cap.
+    """
+    self.cache_dir = os.path.abspath(cache_dir)
+    self.objects_dir = os.path.join(self.cache_dir, "objects")
+    self.max_bytes = max_bytes
+    self.digests_path = os.path.join(self.cache_dir, "digests.json")
+    if not os.path.exists(self.objects_dir):
+      os.makedirs(self.objects_dir)
+    self.digests = {}
+    if os.path.exists(self.digests_path):
+      with open(self.digests_path) as f:
+        self.digests = json.load(f)
+
+  def file_digest(self, path):
+    """ Return the SHA-1 of a file's contents.
+
+    Traces can be gigabytes, so digests are remembered across runs and only
+    recomputed when the file's size or modification time changes.
+    """
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    stamp = [st.st_size, st.st_mtime]
+    memo = self.digests.get(path)
+    if memo and memo["stamp"] == stamp:
+      return memo["sha1"]
+    sha = hashlib.sha1()
+    with open(path, "rb") as f:
+      for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+        sha.update(chunk)
+    self.digests[path] = {"stamp": stamp, "sha1": sha.hexdigest()}
+    return self.digests[path]["sha1"]
+
+  def save_digests(self):
+    fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+    with os.fdopen(fd, "w") as f:
+      json.dump(self.digests, f)
+    os.rename(tmp_path, self.digests_path)
+
+  def key(self, benchmark_name, trace_path, cfg_path, aladdin_bin):
+    """ Compute the cache key of a simulation.
+
+    The benchmark name is part of the key because Aladdin names its output
+    files after it.
+    """
+    sha = hashlib.sha1()
+    sha.update(benchmark_name.encode("utf-8"))
+    sha.update(self.file_digest(trace_path).encode("ascii"))
+    sha.update(self.file_digest(aladdin_bin).encode("ascii"))
+    with open(cfg_path, "rb") as f:
+      sha.update(f.read())
+    return sha.hexdigest()
+
+  def _entry(self, key):
+    return os.path.join(self.objects_dir, key)
+
+  def restore(self, key, output_dir):
+    """ Populate output_dir with cached outputs.
+
+    Returns:
+      True on a cache hit, False if the key is not cached.
+    """
+    entry = self._entry(key)
+    if not os.path.isdir(entry):
+      return False
+    clear_outputs(output_dir)
+    for name in os.listdir(entry):
+      _link_or_copy(os.path.join(entry, name), os.path.join(output_dir, name))
+    # Mark the entry as recently used.
+    os.utime(entry, None)
+    return True
+
+  def store(self, key, output_dir):
+    """ Add the contents of output_dir to the cache under key.
+
+    The cache may temporarily exceed its size cap; call evict() once a batch
+    of stores is done.
+    """
+    entry = self._entry(key)
+    if os.path.isdir(entry):
+      return
+    tmp_entry = tempfile.mkdtemp(dir=self.objects_dir, prefix=".tmp-")
+    for name in os.listdir(output_dir):
+      path = os.path.join(output_dir, name)
+      if os.path.isfile(path):
+        _link_or_copy(path, os.path.join(tmp_entry, name))
+    try:
+      os.rename(tmp_entry, entry)
+    except OSError as e:
+      # Another sweep sharing this cache stored the same key first.
+      shutil.rmtree(tmp_entry)
+      if e.errno not in (errno.EEXIST, errno.ENOTEMPTY):
+        raise
+
+  def _entry_size(self, entry):
+    return sum(os.path.getsize(os.path.join(entry, name))
+               for name in os.listdir(entry))
+
+  def evict(self):
+    """ Delete least recently used entries until the cache fits max_bytes. """
+    if self.max_bytes is None:
+      return
+    entries = []
+    for name in os.listdir(self.objects_dir):
+      if name.startswith("."):
+        continue
+      entry = os.path.join(self.objects_dir, name)
+      entries.append((os.path.getmtime(entry), self._entry_size(entry), entry))
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries):
+      if total <= self.max_bytes:
+        break
+      shutil.rmtree(entry, ignore_errors=True)
+      total -= size
@@ -3,17 +3,175 @@
 # Authors: Sam Xi, Sophia Shao
 
 import argparse
+import atexit
 import ConfigParser
 import getpass
+import json
 import os
 import sys
+import time
 
 from generate_traces import *
 from generate_configs import *
+from aladdin_results import read_outputs
+from design_search import ParetoSearch, grid_size
+from estimator import dominated_designs, estimate_sweep, trace_profile
+from result_cache import ResultCache, clear_outputs
+from sim_runner import SimResult, SimTask, run_sim_tasks, print_summary
+from stage_log import StageLog, maybe_span, write_chrome_trace
+from stage_log import print_summary as print_stage_summary
+from work_queue import (Coordinator, LEASE_TIME, MAX_LEASES, parse_address,
+                        run_workers)
 
 from machsuite_config import MACH
 
-def run_sweeps(workload, output_dir, dry_run=False):
+def make_sim_task(benchmark, bmk_dir, config, aladdin_home, sampled=False):
+  """ Describe the simulation of one config directory.
+
+  This also writes a convenience run.sh script to the configuration directory
+  so a user can manually run a single simulation directly. If sampled, the
+  sampled trace is simulated instead, into outputs_sampled, and the script is
+  run_sampled.sh.
+
+  Returns:
+    A SimTask, or None if the directory holds no config file.
+  """
+  # Turning on debug outputs for CacheDatapath can incur a huge amount of disk
+  # space, most of which is redundant, so we leave that out of the command here.
+  run_cmd = ("%(aladdin_home)s/common/aladdin "
+             "%(output_path)s/%(benchmark_name)s "
+             "%(bmk_dir)s/inputs/%(trace_name)s_trace.gz "
+             "%(config_path)s/%(benchmark_name)s.cfg "
+             "> %(output_path)s/%(benchmark_name)s_stdout "
+             "2> %(output_path)s/%(benchmark_name)s_stderr")
+  file_name = "run_sampled.sh" if sampled else "run.sh"
+  trace_name = "dynamic_sampled" if sampled else "dynamic"
+  config_path = "%s/%s" % (bmk_dir, config)
+  abs_cfg_path = "%s/%s/%s.cfg" % (bmk_dir, config, benchmark.name)
+  if not os.path.exists(abs_cfg_path):
+    return None
+  abs_output_path = "%s/%s/%s" % (bmk_dir, config,
+                                  "outputs_sampled" if sampled else "outputs")
+  if not os.path.exists(abs_output_path):
+    os.makedirs(abs_output_path)
+  cmd = run_cmd % {"aladdin_home": aladdin_home,
+                   "benchmark_name": benchmark.name,
+                   "trace_name": trace_name,
+                   "output_path": abs_output_path,
+                   "bmk_dir": bmk_dir,
+                   "config_path": config_path}
+
+  # Create a run.sh convenience script in this directory so that we can
+  # quickly run a single config.
+  run_script = open("%s/%s/%s" % (bmk_dir, config, file_name), "wb")
+  run_script.write("#!/usr/bin/env bash\n"
+                   "%s\n" % cmd)
+  run_script.close()
+  return SimTask(
+      benchmark=benchmark.name,
+      config=config,
+      cmd=["%s/common/aladdin" % aladdin_home,
+           "%s/%s" % (abs_output_path, benchmark.name),
+           "%s/inputs/%s_trace.gz" % (bmk_dir, trace_name),
+           abs_cfg_path],
+      stdout="%s/%s_stdout" % (abs_output_path, benchmark.name),
+      stderr="%s/%s_stderr" % (abs_output_path, benchmark.name))
+
+def simulate(tasks, jobs=1, timeout=None, retries=0, cache=None,
+             stage_log=None, coordinator=None):
+  """ Run simulations, restoring what we can from the result cache.
+
+  Args:
+    tasks: List of SimTasks.
+    jobs, timeout, retries, stage_log: See run_sim_tasks().
+    cache: A ResultCache, or None.
+    coordinator: A work_queue.Coordinator to run the simulations on remote
+      workers instead of a local pool, or None.
+
+  Returns:
+    A list of SimResults, one per task. Results restored from the cache have
+    zero attempts.
+  """
+  restored = []
+  cache_keys = {}
+  if cache:
+    pending = []
+    for task in tasks:
+      try:
+        key = cache.key(task.benchmark, task.cmd[2], task.cmd[3], task.cmd[0])
+      except (IOError, OSError):
+        # Missing trace or binary; let the simulation report the failure.
+        pending.append(task)
+        continue
+      if cache.restore(key, os.path.dirname(task.stdout)):
+        restored.append(SimResult(benchmark=task.benchmark, config=task.config,
+                                  returncode=0, attempts=0, elapsed=0,
+                                  timed_out=False))
+        continue
+      cache_keys[(task.benchmark, task.config)] = key
+      pending.append(task)
+    cache.save_digests()
+    print "Restored %d of %d simulations from the result cache" % (
+        len(restored), len(tasks))
+    tasks = pending
+  for task in tasks:
+    clear_outputs(os.path.dirname(task.stdout))
+
+  if coordinator:
+    print "Serving %d simulations to workers at %s:%d" % (
+        (len(tasks),) + coordinator.address)
+    results = coordinator.run(tasks, timeout=timeout, retries=retries,
+                              stage_log=stage_log)
+  else:
+    print "Running %d simulations with %d jobs" % (len(tasks), jobs)
+    results = run_sim_tasks(tasks, jobs=jobs, timeout=timeout,
+                            retries=retries, stage_log=stage_log)
+  if cache:
+    outputs = dict(((t.benchmark, t.config), os.path.dirname(t.stdout))
+                   for t in tasks)
+    for result in results:
+      key = cache_keys.get((result.benchmark, result.config))
+      if result.returncode == 0 and key:
+        cache.store(key, outputs[(result.benchmark, result.config)])
+    cache.evict()
+  return restored + results
+
+def open_cache(cache_dir, cache_size):
+  if not cache_dir:
+    return None
+  return ResultCache(cache_dir, cache_size)
+
+def prefilter_configs(benchmark, bmk_dir, configs, margin):
+  """ Drop the configs that the analytical estimator finds dominated.
+
+  Configs that are not part of the current sweep are always kept.
+
+  Returns:
+    The list of configs to simulate.
+  """
+  profile = trace_profile(bmk_dir, benchmark)
+  if not profile:
+    print "No trace to estimate %s from; not prefiltering" % benchmark.name
+    return configs
+  # The estimates are streamed into dominated_designs() rather than kept, so
+  # only the configs on disk are remembered.
+  on_disk = set(configs)
+  in_sweep = set()
+  def designs():
+    for design in estimate_sweep(benchmark, profile, sweep_parameters()):
+      if design[0] in on_disk:
+        in_sweep.add(design[0])
+      yield design
+  dominated = dominated_designs(designs(), margin)
+  kept = [config for config in configs if config not in dominated]
+  print "Prefilter skips %d of %d configs" % (len(configs) - len(kept),
+                                              len(in_sweep))
+  return kept
+
+def run_sweeps(workload, output_dir, dry_run=False, jobs=1, timeout=None,
+               retries=0, cache_dir=None, cache_size=None,
+               prefilter_margin=None, stage_log=None, coordinator=None,
+               sampled=False):
   """ Run the design sweep on the given workloads.
 
   This function will also write a convenience Bash script to the configuration
@@ -25,74 +183,270 @@ def run_sweeps(workload, output_dir, dry_run=False):
     workload: List of benchmark description objects.
     output_dir: Top-level directory of simulation outputs.
     dry_run: True for a dry run.
+    jobs: Number of simulations to run concurrently.
+    timeout: Per-simulation wall time limit in seconds, or None.
+    retries: Number of times a failed simulation is retried.
+    cache_dir: If set, a result cache shared across sweeps. Simulations whose
+      trace, config and Aladdin binary are unchanged are restored from it
+      instead of being rerun.
+    cache_size: Size cap of the result cache, in bytes, or None for no cap.
+    prefilter_margin: If set, skip the configs that the analytical estimator
+      finds dominated, with this safety margin. See
+      estimator.dominated_designs().
+    stage_log: A StageLog that simulations and prefiltering are recorded in,
+      or None.
+    coordinator: A work_queue.Coordinator that serves the simulations to
+      workers, or None to run them locally.
+    sampled: Simulate the sampled traces that trace mode builds with
+      --sample_iterations instead of the full traces.
+
+  Returns:
+    The number of simulations that failed.
   """
   if not "ALADDIN_HOME" in os.environ:
     raise Exception("Set ALADDIN_HOME directory as an environment variable")
-  # Turning on debug outputs for CacheDatapath can incur a huge amount of disk
-  # space, most of which is redundant, so we leave that out of the command here.
-  run_cmd = ("%(aladdin_home)s/common/aladdin "
-             "%(output_path)s/%(benchmark_name)s "
-             "%(bmk_dir)s/inputs/%(trace_name)s_trace.gz "
-             "%(config_path)s/%(benchmark_name)s.cfg "
-             "> %(output_path)s/%(benchmark_name)s_stdout "
-             "2> %(output_path)s/%(benchmark_name)s_stderr")
-  os.chdir(output_dir)
-  file_name = "run.sh"
+  tasks = []
   for benchmark in workload:
     print "------------------------------------"
     print "Executing benchmark %s" % benchmark.name
     bmk_dir = "%s/%s" % (output_dir, benchmark.name)
+    # Symlinked configs are duplicates of the config they point to, which is
+    # simulated instead; see generate_configs.ConfigIndex.
     configs = [file for file in os.listdir(bmk_dir)
-               if os.path.isdir("%s/%s" % (bmk_dir, file))]
+               if os.path.isdir("%s/%s" % (bmk_dir, file)) and
+               not os.path.islink("%s/%s" % (bmk_dir, file))]
+    if prefilter_margin is not None:
+      with maybe_span(stage_log, "prefilter", benchmark=benchmark.name):
+        configs = prefilter_configs(benchmark, bmk_dir, configs,
+                                    prefilter_margin)
     for config in configs:
-      config_path = "%s/%s" % (bmk_dir, config)
-      abs_cfg_path = "%s/%s/%s.cfg" % (bmk_dir, config, benchmark.name)
-      if not os.path.exists(abs_cfg_path):
+      task = make_sim_task(benchmark, bmk_dir, config,
+                           os.environ["ALADDIN_HOME"], sampled)
+      if not task:
         continue
-      abs_output_path = "%s/%s/outputs" % (bmk_dir, config)
-      if not os.path.exists(abs_output_path):
-        os.makedirs(abs_output_path)
-      cmd = run_cmd % {"aladdin_home": os.environ["ALADDIN_HOME"],
-                       "benchmark_name": benchmark.name,
-                       "trace_name": "dynamic",
-                       "output_path": abs_output_path,
-                       "bmk_dir": bmk_dir,
-                       "config_path": config_path}
-
-      # Create a run.sh convenience script in this directory so that we can
-      # quickly run a single config.
-      run_script = open("%s/%s/%s" % (bmk_dir, config, file_name), "wb")
-      run_script.write("#!/usr/bin/env bash\n"
-                       "%s\n" % cmd)
-      run_script.close()
       print "     %s" % config
-      if not dry_run:
-        os.system(cmd)
-  os.chdir(output_dir)
+      tasks.append(task)
+  if dry_run:
+    return 0
+
+  print "------------------------------------"
+  results = simulate(tasks, jobs=jobs, timeout=timeout, retries=retries,
+                     cache=open_cache(cache_dir, cache_size),
+                     stage_log=stage_log, coordinator=coordinator)
+  return print_summary(results)
+
+def search_sweeps(workload, output_dir, jobs=1, timeout=None, retries=0,
+                  cache_dir=None, cache_size=None, budget=None, patience=3,
+                  initial=4, seed=0, stage_log=None, coordinator=None,
+                  sampled=False):
+  """ Search the design space of each benchmark instead of sweeping it.
+
+  Design points are proposed by a ParetoSearch over the values of the sweep
+  parameters in sweep_config.py, with those swept per kernel expanded into one
+  parameter per kernel, minimizing execution time (cycles times cycle time)
+  and average power. max_tuned_kernels does not apply, but points that fail a
+  constraint of the sweep or benchmark are skipped without using the budget.
+  Config directories are created on demand, so this does not need a prior
+  configs run; points whose config is identical to one already simulated are
+  linked to it instead of being simulated again. The evaluated points and the
+  final frontier are written to <output_dir>/<benchmark>/search.json.
+
+  Args:
+    budget: Maximum number of simulations per benchmark. Defaults to a quarter
+      of the full sweep.
+    patience: Stop after this many rounds without a change in the frontier.
+    initial: Number of random points simulated in the first round.
+    seed: Seed of the search's random number generator.
+    The remaining arguments are as for run_sweeps().
+
+  Returns:
+    The number of simulations that failed.
+  """
+  if not "ALADDIN_HOME" in os.environ:
+    raise Exception("Set ALADDIN_HOME directory as an environment variable")
+  base_params = sweep_parameters()
+  check_sweep_params(base_params)
+  cache = open_cache(cache_dir, cache_size)
+  all_results = []
+  for benchmark in workload:
+    print "------------------------------------"
+    print "Searching benchmark %s" % benchmark.name
+    bmk_dir = os.path.abspath("%s/%s" % (output_dir, benchmark.name))
+    sweep_params = kernel_sweep_params(benchmark, base_params)
+    check_sweep_params(sweep_params)
+    names = [p.name for p in sweep_params]
+    evaluated = {}
+    index = ConfigIndex(bmk_dir, benchmark.name)
+    point_constraints = benchmark_constraints(benchmark)
+    pruned = {}
+
+    def feasible(values):
+      failed = failed_constraint(benchmark, dict(zip(names, values)),
+                                 point_constraints)
+      if failed:
+        count_pruned(pruned, failed.name)
+      return failed is None
+
+    # Canonical configs simulated by this search. Points whose config is
+    # identical to one of them reuse its outputs through their symlink.
+    simulated = set()
+
+    def evaluate(points):
+      tasks = []
+      configs = []
+      for values in points:
+        point = dict(zip(names, values))
+        canonical = write_canonical_config_point(benchmark, bmk_dir, point,
+                                                 sweep_params, index)
+        configs.append((config_name(point, sweep_params), point))
+        if canonical not in simulated:
+          simulated.add(canonical)
+          tasks.append(make_sim_task(benchmark, bmk_dir, canonical,
+                                     os.environ["ALADDIN_HOME"], sampled))
+      index.save()
+      all_results.extend(simulate(tasks, jobs=jobs, timeout=timeout,
+                                  retries=retries, cache=cache,
+                                  stage_log=stage_log,
+                                  coordinator=coordinator))
+      objectives = []
+      for config, point in configs:
+        summary = read_outputs(bmk_dir, config, benchmark.name, sampled)
+        if summary and "avg_power" in summary:
+          obj = (summary["cycle"] * point.get("cycle_time", 1),
+                 summary["avg_power"])
+        else:
+          obj = None
+        evaluated[config] = (point, obj)
+        objectives.append(obj)
+      return objectives
+
+    value_lists = [sweep_values(p) for p in sweep_params]
+    search = ParetoSearch(value_lists, evaluate,
+                          budget=budget or max(1, (grid_size(value_lists)+3)//4),
+                          batch_size=max(jobs, 4), patience=patience,
+                          initial=initial, seed=seed, feasible=feasible)
+    frontier = [config_name(dict(zip(names, search.values(p))), sweep_params)
+                for p in search.run()]
+    print "Simulated %d of %d design points in %d rounds. Frontier:" % (
+        search.evaluated(), search.grid_size(), search.rounds)
+    if pruned:
+      print "Infeasible: %s" % pruning_report(pruned)
+    for config in sorted(frontier, key=lambda c: evaluated[c][1]):
+      print "  %s: time %g, power %g mW" % ((config,) + evaluated[config][1])
+    with open("%s/search.json" % bmk_dir, "w") as f:
+      json.dump({"evaluated": [{"config": config, "params": point,
+                                "objectives": obj}
+                               for config, (point, obj)
+                               in sorted(evaluated.items())],
+                 "frontier": sorted(frontier)}, f, indent=2)
+  return print_summary(all_results)
+
+def finish_stage_log(stage_log, since):
+  """ Summarize the stages recorded since a time and convert them to a Chrome
+  trace. """
+  records = [r for r in stage_log.read() if r["start"] >= since]
+  if not records:
+    return
+  print "------------------------------------"
+  print "Stages recorded in %s:" % stage_log.path
+  print_stage_summary(records)
+  trace_path = os.path.splitext(stage_log.path)[0] + ".trace.json"
+  write_chrome_trace(records, trace_path)
+  print "Chrome trace: %s" % trace_path
 
 def main():
   parser = argparse.ArgumentParser(
       description="Run design space exploration with Aladdin!",
       formatter_class=argparse.ArgumentDefaultsHelpFormatter)
   parser.add_argument(
-      "mode", choices=["trace", "configs", "run", "all"], help=
+      "mode", choices=["trace", "configs", "run", "search", "all", "worker"],
+      help=
       "Run mode. \"trace\" will build dynamic traces for all benchmarks. "
       "\"configs\" will generate all possible configurations for the "
       "desired sweep. "
       "\"run\" will run the generated design sweep for a benchmark suite. "
+      "\"search\" will adaptively search the sweep for the power/performance "
+      "Pareto frontier, only simulating the design points it proposes. "
+      "\"worker\" will run simulations served by a run or search started "
+      "with --serve elsewhere. "
       )
-  parser.add_argument("--output_dir", required=True, help="Config output "
-                      "directory. Required for all modes. ")
-  parser.add_argument("--benchmark_suite", required=True, help=""
-      "MachSuite. Required for all modes.")
+  parser.add_argument("--output_dir", help="Config output "
+                      "directory. Required for all modes but worker. ")
+  parser.add_argument("--benchmark_suite", help=""
+      "MachSuite. Required for all modes but worker.")
   parser.add_argument("--source_dir", help="Path to the benchmark suite "
                       "directory. Required for trace mode.")
   parser.add_argument("--dry", action="store_true", help="Perform a dry run. "
       "Simulations will not be executed, but a convenience Bash script will be "
       "written to each config directory so the user can run that config "
       "simulation manually.")
+  parser.add_argument("--jobs", type=int, default=1, help="Number of "
+      "parallel workers used to build traces in trace mode, write config "
+      "files in configs mode and run simulations in run and search modes.")
+  parser.add_argument("--timeout", type=float, default=None, help="Kill a "
+      "simulation after this many seconds of wall time.")
+  parser.add_argument("--retries", type=int, default=0, help="Number of "
+      "times to retry a failed or timed out simulation.")
+  parser.add_argument("--cache_dir", help="Directory of a simulation result "
+      "cache that can be shared across sweeps and output directories. "
+      "Simulations with an identical trace, config file and Aladdin binary "
+      "are restored from it instead of being rerun.")
+  parser.add_argument("--cache_size", type=float, default=50, help="Maximum "
+      "size of the result cache in GB. Least recently used results are "
+      "evicted first.")
+  parser.add_argument("--prefilter_margin", type=float, default=None,
+      help="In run mode, skip design points that an analytical estimate "
+      "shows to be dominated by a design that is at least as fast and uses "
+      "(1 + margin) times fewer lanes or memory banks. Disabled by default.")
+  parser.add_argument("--search_budget", type=int, default=None, help="Maximum "
+      "number of simulations per benchmark in search mode. Defaults to a "
+      "quarter of the full sweep.")
+  parser.add_argument("--search_patience", type=int, default=3, help="Search "
+      "mode stops after this many rounds without a change in the frontier.")
+  parser.add_argument("--search_initial", type=int, default=4, help="Number "
+      "of random design points simulated in the first round of a search.")
+  parser.add_argument("--seed", type=int, default=0, help="Random seed of "
+      "search mode.")
+  parser.add_argument("--stage_log", help="Append the wall time, CPU time, "
+      "peak RSS and output sizes of every build step and simulation to this "
+      "JSON lines file, and write it as a Chrome trace next to it. Defaults to "
+      "<output_dir>/stages.jsonl.")
+  parser.add_argument("--sample_iterations", type=int, default=0, help="In "
+      "trace mode, also build a sampled trace of each benchmark that keeps "
+      "this many iterations of its main loop. See trace_sampler.py.")
+  parser.add_argument("--sample_windows", type=int, default=SAMPLE_WINDOWS,
+      help="Number of windows of consecutive iterations that sampled traces "
+      "are split into.")
+  parser.add_argument("--sampled", action="store_true", help="In run and "
+      "search modes, simulate the sampled traces into outputs_sampled, and "
+      "search on their extrapolated cycles.")
+  parser.add_argument("--serve", metavar="HOST:PORT", help="In run and search "
+      "modes, serve the simulations to workers started with --coordinator "
+      "instead of running them locally. The output directory must be on a "
+      "filesystem shared with the workers.")
+  parser.add_argument("--coordinator", metavar="HOST:PORT", help="In worker "
+      "mode, the address of the run or search serving simulations. --jobs "
+      "workers are started on this host, and run the Aladdin binary of their "
+      "own ALADDIN_HOME if it is set.")
+  parser.add_argument("--lease_time", type=float, default=LEASE_TIME,
+      help="Seconds after which a served simulation whose worker stopped "
+      "responding is given to another worker.")
+  parser.add_argument("--max_leases", type=int, default=MAX_LEASES,
+      help="Number of times a served simulation is given to workers before it "
+      "counts as failed.")
   args = parser.parse_args()
 
+  if args.mode == "worker":
+    if not args.coordinator:
+      print "Worker mode needs the --coordinator address!"
+      exit(1)
+    run_workers(parse_address(args.coordinator), jobs=args.jobs,
+                aladdin_home=os.environ.get("ALADDIN_HOME"))
+    return
+  if not args.output_dir or not args.benchmark_suite:
+    print "Missing --output_dir or --benchmark_suite! See help (-h)."
+    exit(1)
+
   workload = []
   if args.benchmark_suite.upper() == "MACHSUITE":
     workload = MACH
@@ -103,18 +457,27 @@ def main():
   if args.mode == "all":
     args.dry = True
 
+  if not os.path.exists(args.output_dir):
+    os.makedirs(args.output_dir)
+  stage_log = StageLog(args.stage_log or
+                       os.path.join(args.output_dir, "stages.jsonl"))
+  atexit.register(finish_stage_log, stage_log, time.time())
+
+  coordinator = None
+  if args.serve:
+    coordinator = Coordinator(parse_address(args.serve),
+                              lease_time=args.lease_time,
+                              max_leases=args.max_leases)
+    atexit.register(coordinator.close)
+    print "Serving simulations at %s:%d" % coordinator.address
+
   if args.mode == "configs" or args.mode == "all":
     if (not args.benchmark_suite):
       print "Missing some required inputs! See help documentation (-h)."
       exit(1)
 
-    current_dir = os.getcwd()
-    if not os.path.exists(args.output_dir):
-      os.makedirs(args.output_dir)
-    os.chdir(args.output_dir)
-
-    write_config_files(workload, args.output_dir)
-    os.chdir(current_dir)
+    with stage_log.span("configs"):
+      write_config_files(workload, args.output_dir, jobs=args.jobs)
 
   if args.mode == "trace" or args.mode == "all":
     if (not args.benchmark_suite):
@@ -124,13 +487,38 @@ def main():
     if not args.source_dir:
       print "Need to specify the benchmark suite source directory!"
       exit(1)
-    generate_traces(workload, args.output_dir, args.source_dir)
+    if generate_traces(workload, args.output_dir, args.source_dir,
+                       jobs=args.jobs, stage_log=stage_log,
+                       sample_iterations=args.sample_iterations,
+                       sample_windows=args.sample_windows):
+      exit(1)
 
   if args.mode == "run" or args.mode == "all":
     if not args.benchmark_suite:
       print "Missing benchmark_suite parameter! See help documentation (-h)"
       exit(1)
-    run_sweeps(workload, args.output_dir, dry_run=args.dry)
+    failed = run_sweeps(workload, args.output_dir, dry_run=args.dry,
+                        jobs=args.jobs, timeout=args.timeout,
+                        retries=args.retries, cache_dir=args.cache_dir,
+                        cache_size=int(args.cache_size * (1 << 30)),
+                        prefilter_margin=args.prefilter_margin,
+                        stage_log=stage_log, coordinator=coordinator,
+                        sampled=args.sampled)
+    if failed:
+      exit(1)
+
+  if args.mode == "search":
+    failed = search_sweeps(workload, args.output_dir, jobs=args.jobs,
+                           timeout=args.timeout, retries=args.retries,
+                           cache_dir=args.cache_dir,
+                           cache_size=int(args.cache_size * (1 << 30)),
+                           budget=args.search_budget,
+                           patience=args.search_patience,
+                           initial=args.search_initial, seed=args.seed,
+                           stage_log=stage_log, coordinator=coordinator,
+                           sampled=args.sampled)
+    if failed:
+      exit(1)
 
 if __name__ == "__main__":
   main()
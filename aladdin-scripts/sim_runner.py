@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# Parallel, fault-tolerant execution of Aladdin simulations.
+
+import multiprocessing
+import subprocess
+import sys
+import time
+from collections import namedtuple
+
+from stage_log import wait_child
+
+# Returned in place of an exit code when the simulator could not be launched
+# at all, mirroring the shell's "command not found".
+LAUNCH_FAILED = 127
+# Returned in place of an exit code when a distributed simulation was leased
+# to workers too many times without any of them reporting back.
+LOST = 126
+
+# A single simulation to run.
+#   benchmark, config: Names used for reporting.
+#   cmd: The argv list of the simulator invocation.
+#   stdout, stderr: Paths that the simulator's output streams are written to.
+SimTask = namedtuple("SimTask", "benchmark, config, cmd, stdout, stderr")
+
+# The outcome of a SimTask.
+#   returncode: Exit code of the last attempt. Negative values are signals.
+#   attempts: Number of times the simulation was launched.
+#   elapsed: Wall time of the last attempt, in seconds.
+#   timed_out: True if the last attempt was killed for exceeding the timeout.
+SimResult = namedtuple(
+    "SimResult", "benchmark, config, returncode, attempts, elapsed, timed_out")
+
+def _run_once(task, timeout, stage_log=None, attempt=1, cancel=None):
+  """ Launch the simulation once. Returns (returncode, timed_out). """
+  with open(task.stdout, "w") as stdout, open(task.stderr, "w") as stderr:
+    start = time.time()
+    try:
+      proc = subprocess.Popen(task.cmd, stdout=stdout, stderr=stderr)
+    except OSError as e:
+      stderr.write("Failed to launch %s: %s\n" % (task.cmd[0], e))
+      return LAUNCH_FAILED, False
+    timed_out, rusage = wait_child(proc, timeout, cancel)
+  if stage_log:
+    stage_log.record("aladdin", start, time.time() - start, rusage,
+                     outputs=[task.stdout, task.stderr],
+                     benchmark=task.benchmark, config=task.config,
+                     attempt=attempt, returncode=proc.returncode,
+                     timed_out=timed_out)
+  return proc.returncode, timed_out
+
+def run_sim_task(task, timeout=None, retries=0, stage_log=None, cancel=None):
+  """ Run a single simulation, retrying it on failure.
+
+  Args:
+    task: A SimTask.
+    timeout: Per-attempt wall time limit in seconds, or None for no limit.
+    retries: Number of additional attempts made after a failed one.
+    stage_log: A StageLog that each attempt is recorded in, or None.
+    cancel: A threading.Event that kills the simulation, without further
+      attempts, once it is set.
+
+  Returns:
+    A SimResult describing the last attempt.
+  """
+  attempts = 0
+  while True:
+    attempts += 1
+    start = time.time()
+    returncode, timed_out = _run_once(task, timeout, stage_log, attempts,
+                                      cancel)
+    elapsed = time.time() - start
+    if returncode == 0 or attempts > retries or (cancel and cancel.is_set()):
+      break
+  return SimResult(benchmark=task.benchmark,
+                   config=task.config,
+                   returncode=returncode,
+                   attempts=attempts,
+                   elapsed=elapsed,
+                   timed_out=timed_out)
+
+def _run_sim_task_star(args):
+  return run_sim_task(*args)
+
+def run_sim_tasks(tasks, jobs=1, timeout=None, retries=0, stage_log=None):
+  """ Run a list of simulations on a pool of jobs worker processes.
+
+  Results are printed as they complete, which is not necessarily the order of
+  tasks.
+
+  Returns:
+    A list of SimResult objects, one per task.
+  """
+  work = [(task, timeout, retries, stage_log) for task in tasks]
+  results = []
+  if jobs <= 1:
+    completed = (_run_sim_task_star(w) for w in work)
+    pool = None
+  else:
+    pool = multiprocessing.Pool(processes=jobs)
+    completed = pool.imap_unordered(_run_sim_task_star, work)
+  try:
+    for result in completed:
+      results.append(result)
+      print("  [%d/%d] %s %s: %s (%.1fs)" % (
+          len(results), len(tasks), result.benchmark, result.config,
+          describe_result(result), result.elapsed))
+      sys.stdout.flush()
+  except KeyboardInterrupt:
+    if pool:
+      pool.terminate()
+      pool.join()
+    raise
+  if pool:
+    pool.close()
+    pool.join()
+  return results
+
+def describe_result(result):
+  if result.returncode == 0:
+    status = "ok"
+  elif result.timed_out:
+    status = "TIMEOUT"
+  elif result.returncode == LAUNCH_FAILED:
+    status = "FAILED (could not launch)"
+  elif result.returncode == LOST:
+    status = "FAILED (lost by its workers)"
+  elif result.returncode < 0:
+    status = "FAILED (signal %d)" % -result.returncode
+  else:
+    status = "FAILED (exit %d)" % result.returncode
+  if result.attempts > 1:
+    status += ", %d attempts" % result.attempts
+  return status
+
+def print_summary(results):
+  """ Print a pass/fail summary of a list of SimResults.
+
+  Returns:
+    The number of failed simulations.
+  """
+  failed = [r for r in results if r.returncode != 0]
+  total_time = sum(r.elapsed for r in results)
+  print("------------------------------------")
+  print("Simulations: %d passed, %d failed (%d timed out), %.1fs total "
+        "simulation time" % (len(results) - len(failed), len(failed),
+                             len([r for r in failed if r.timed_out]),
+                             total_time))
+  for result in sorted(failed, key=lambda r: (r.benchmark, r.config)):
+    print("  %s %s: %s" % (result.benchmark, result.config,
+                           describe_result(result)))
+  return len(failed)
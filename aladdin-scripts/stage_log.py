@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# Timing of the stages of a design sweep.
+#
+# Every external command of a sweep (clang, opt, llvm-link, llc, gcc, the
+# instrumented binary and Aladdin itself) runs as a stage. Its wall time, user
+# and system CPU time and peak resident set size come from the kernel's
+# accounting of the child process, and the sizes of the files it wrote are
+# recorded with them. Stages are appended as JSON lines to a log that all
+# worker processes share. The log can be summarized per stage, or converted to
+# the Chrome trace event format (chrome://tracing, Perfetto) to see how the
+# stages of parallel workers overlap.
+#
+# Usage:
+#   python stage_log.py <output_dir>/stages.jsonl --chrome stages.trace.json
+
+import argparse
+import errno
+import json
+import os
+import resource
+import time
+from contextlib import contextmanager
+
+# Polling interval bounds (seconds) used while waiting on a child with a
+# timeout.
+MIN_POLL_INTERVAL = 0.05
+MAX_POLL_INTERVAL = 1.0
+
+def _wait4(pid, options):
+  while True:
+    try:
+      return os.wait4(pid, options)
+    except OSError as e:
+      if e.errno != errno.EINTR:
+        raise
+
+def wait_child(proc, timeout=None, cancel=None):
+  """ Wait for a subprocess.Popen child to exit, killing it after timeout
+  seconds or once the threading.Event cancel is set.
+
+  Unlike Popen.wait(), this reaps the child with wait4() to get its resource
+  usage. proc.returncode is set as Popen would set it.
+
+  Returns:
+    A tuple (True if the child had to be killed, its resource usage).
+  """
+  timed_out = False
+  if timeout or cancel:
+    deadline = time.time() + timeout if timeout else None
+    interval = MIN_POLL_INTERVAL
+    while True:
+      pid, status, rusage = _wait4(proc.pid, os.WNOHANG)
+      if pid:
+        break
+      now = time.time()
+      if cancel and cancel.is_set():
+        proc.kill()
+        pid, status, rusage = _wait4(proc.pid, 0)
+        break
+      if deadline and now >= deadline:
+        proc.kill()
+        pid, status, rusage = _wait4(proc.pid, 0)
+        timed_out = True
+        break
+      time.sleep(min(interval, deadline - now) if deadline else interval)
+      interval = min(interval * 2, MAX_POLL_INTERVAL)
+  else:
+    pid, status, rusage = _wait4(proc.pid, 0)
+  if os.WIFSIGNALED(status):
+    proc.returncode = -os.WTERMSIG(status)
+  else:
+    proc.returncode = os.WEXITSTATUS(status)
+  return timed_out, rusage
+
+def output_sizes(paths):
+  """ Sizes in bytes of the files a stage wrote, by file name. None for
+  files that do not exist. """
+  sizes = {}
+  for path in paths:
+    try:
+      sizes[os.path.basename(path)] = os.path.getsize(path)
+    except OSError:
+      sizes[os.path.basename(path)] = None
+  return sizes
+
+class StageLog(object):
+  """ A JSON lines log of sweep stages.
+
+  Each record holds the stage name, its start (seconds since the epoch), wall
+  time, user and system CPU time, peak RSS in KB, the pid of the process that
+  ran it, the sizes of its outputs and any fields given by the caller, such as
+  the benchmark and config. Records are written with a single append each, so
+  worker processes can share a log.
+  """
+  def __init__(self, path):
+    self.path = path
+
+  def record(self, stage, start, wall, rusage=None, outputs=(), **fields):
+    entry = {"stage": stage, "start": start, "wall": wall,
+             "worker": os.getpid(), "outputs": output_sizes(outputs)}
+    if rusage is not None:
+      entry["user"] = rusage.ru_utime
+      entry["sys"] = rusage.ru_stime
+      # ru_maxrss is in KB on Linux.
+      entry["max_rss_kb"] = rusage.ru_maxrss
+    entry.update(fields)
+    self.append(entry)
+
+  def append(self, entry):
+    """ Append a record, e.g. one reported by a remote worker. """
+    line = json.dumps(entry, sort_keys=True) + "\n"
+    fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+      os.write(fd, line.encode("utf-8"))
+    finally:
+      os.close(fd)
+
+  @contextmanager
+  def span(self, stage, outputs=(), **fields):
+    """ Record work done in this process, e.g. writing config files.
+
+    CPU time is the difference in this process's usage; peak RSS is that of
+    the process so far.
+    """
+    before = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.time()
+    yield
+    wall = time.time() - start
+    after = resource.getrusage(resource.RUSAGE_SELF)
+    self.record(stage, start, wall, outputs=outputs,
+                user=after.ru_utime - before.ru_utime,
+                sys=after.ru_stime - before.ru_stime,
+                max_rss_kb=after.ru_maxrss, **fields)
+
+  def read(self):
+    """ All records of the log, skipping a partly written last line. """
+    records = []
+    if not os.path.exists(self.path):
+      return records
+    with open(self.path) as f:
+      for line in f:
+        try:
+          records.append(json.loads(line))
+        except ValueError:
+          continue
+    return records
+
+class StageBuffer(StageLog):
+  """ A stage log kept in memory, for stages run on behalf of another
+  process that writes them to its own log. """
+  def __init__(self):
+    StageLog.__init__(self, None)
+    self.entries = []
+
+  def append(self, entry):
+    self.entries.append(entry)
+
+  def read(self):
+    return list(self.entries)
+
+@contextmanager
+def maybe_span(stage_log, stage, outputs=(), **fields):
+  """ StageLog.span() of stage_log, or no recording if stage_log is None. """
+  if stage_log is None:
+    yield
+  else:
+    with stage_log.span(stage, outputs, **fields):
+      yield
+
+def chrome_trace(records):
+  """ Convert stage records to the Chrome trace event format.
+
+  Each stage is a complete ("X") event on the row of the process that ran
+  it, named after the stage and categorized by benchmark.
+  """
+  if not records:
+    return {"traceEvents": []}
+  origin = min(r["start"] for r in records)
+  events = []
+  for worker in sorted(set(r["worker"] for r in records)):
+    events.append({"name": "process_name", "ph": "M", "pid": worker,
+                   "tid": worker, "args": {"name": "worker %d" % worker}})
+  for r in records:
+    args = dict((k, v) for k, v in r.items()
+                if k not in ("stage", "start", "wall", "worker"))
+    events.append({"name": r["stage"], "cat": r.get("benchmark", ""),
+                   "ph": "X", "ts": (r["start"] - origin) * 1e6,
+                   "dur": r["wall"] * 1e6, "pid": r["worker"],
+                   "tid": r["worker"], "args": args})
+  return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+def write_chrome_trace(records, path):
+  with open(path, "w") as f:
+    json.dump(chrome_trace(records), f)
+
+def summarize(records):
+  """ Per-stage totals, largest total wall time first.
+
+  Returns:
+    A list of (stage, count, wall, cpu, peak RSS in KB, output bytes).
+  """
+  stages = {}
+  for r in records:
+    s = stages.setdefault(r["stage"], [0, 0.0, 0.0, 0, 0])
+    s[0] += 1
+    s[1] += r["wall"]
+    s[2] += r.get("user", 0) + r.get("sys", 0)
+    s[3] = max(s[3], r.get("max_rss_kb", 0))
+    s[4] += sum(size for size in r["outputs"].values() if size)
+  return sorted(((name,) + tuple(s) for name, s in stages.items()),
+                key=lambda s: -s[2])
+
+def print_summary(records):
+  rows = summarize(records)
+  total = sum(row[2] for row in rows) or 1.0
+  print("%-16s %6s %10s %6s %10s %10s %12s" % (
+      "stage", "count", "wall (s)", "share", "cpu (s)", "peak RSS", "output"))
+  for stage, count, wall, cpu, rss, size in rows:
+    print("%-16s %6d %10.1f %5.1f%% %10.1f %8.0fMB %10.0fMB" % (
+        stage, count, wall, 100 * wall / total, cpu, rss / 1024.0,
+        size / float(1 << 20)))
+
+def main():
+  parser = argparse.ArgumentParser(
+      description="Summarize the stage log of a design sweep and convert it to "
+      "a Chrome trace.")
+  parser.add_argument("log", help="Stage log, e.g. <output_dir>/stages.jsonl.")
+  parser.add_argument("--chrome", help="Write a Chrome trace event file here.")
+  parser.add_argument("--benchmark", help="Only include this benchmark.")
+  args = parser.parse_args()
+
+  records = StageLog(args.log).read()
+  if args.benchmark:
+    records = [r for r in records if r.get("benchmark") == args.benchmark]
+  print_summary(records)
+  if args.chrome:
+    write_chrome_trace(records, args.chrome)
+
+if __name__ == "__main__":
+  main()
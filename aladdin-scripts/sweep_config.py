@@ -8,12 +8,46 @@ from design_sweep_types import *
 # Sweep parameters. If a certain parameter should not be swept, set the value of
 # step_type to NO_SWEEP, and the value of start will be used as a constant. end
 # will be ignored. Unless step_type is NO_SWEEP, step should never be less than
-# 1.
+# 1. short_name is used to name config directories, which are built from the
+# short name and value of every swept parameter (e.g. pipe_1_unr_4_part_2), so
+# short names must be unique.
+#
+# Set sweep_per_kernel=True to give each kernel of a multi-kernel benchmark its
+# own value of unrolling (for the loops of the kernel) or partition (for the
+# arrays that name it as their owner), e.g. to find designs where only the hot
+# kernel is unrolled. See generate_configs.kernel_sweep_params() for how these
+# sweeps are pruned.
 cycle_time = SweepParam(
-    "cycle_time", start=2, end=6, step=1, step_type=NO_SWEEP)
+    "cycle_time", start=2, end=6, step=1, step_type=NO_SWEEP,
+    short_name="cycle")
 unrolling = SweepParam(
-    "unrolling", start=1, end=8, step=2, step_type=EXP_SWEEP)
+    "unrolling", start=1, end=8, step=2, step_type=EXP_SWEEP,
+    short_name="unr")
 partition = SweepParam(
-    "partition", start=1, end=8, step=2, step_type=EXP_SWEEP)
+    "partition", start=1, end=8, step=2, step_type=EXP_SWEEP,
+    short_name="part")
 pipelining = SweepParam(
-    "pipelining", start=0, end=1, step=1, step_type=LINEAR_SWEEP)
+    "pipelining", start=0, end=1, step=1, step_type=LINEAR_SWEEP,
+    short_name="pipe")
+
+# With per-kernel sweeps, at most this many kernels of a benchmark leave the
+# start value of their sweep in any one design point. None for no limit.
+max_tuned_kernels = 2
+
+# Constraints that every design point must meet. Points that fail one are
+# dropped while the sweep is enumerated, so they are never written or
+# simulated, and the configs stage reports how many points each constraint
+# removed. A Constraint is a name and a function of (benchmark, point); see
+# design_sweep_types.py for the helpers below and for reading parameters swept
+# per kernel. Constraints of a single benchmark are added in
+# machsuite_config.py with Benchmark.add_constraint(). For example:
+#
+#   constraints = [
+#       at_most("partition", "unrolling", 2),
+#       max_total_banks(512),
+#       partition_within_arrays(),
+#       Constraint("no pipelining at unrolling 1",
+#                  lambda benchmark, point: point["pipelining"] == 0 or
+#                                           point["unrolling"] > 1),
+#   ]
+constraints = []
@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+# Sampled dynamic traces for faster, approximate simulation.
+#
+# Most of a MachSuite trace repeats the body of one outer loop. A sampled
+# trace keeps everything outside that loop but only a few windows of
+# consecutive iterations of it, evenly spread over the loop so that irregular
+# kernels are represented. Windows of consecutive iterations keep the
+# overlap that unrolling and pipelining find between iterations, so they
+# should be at least as long as the largest unrolling factor swept.
+#
+# The sampled loop is the declared loop of the benchmark (see
+# machsuite_config.py) whose iterations span the most instructions; an
+# iteration runs from one branch at the loop's line to the next. Next to
+# the sampled trace, a JSON file records how it was sampled and the ratio
+# of full to sampled instructions. Simulated cycles are multiplied by that
+# ratio, which assumes that the sampled iterations take as many cycles per
+# instruction as the rest. Power and area are left as they are, so energy
+# scales with the cycles. The "report" command compares such extrapolations
+# with simulations of the full trace.
+#
+# Usage:
+#   python trace_sampler.py sample <bmk_dir>/inputs/dynamic_trace.gz \
+#     <bmk_dir>/inputs/dynamic_sampled_trace.gz --benchmark md-knn
+#   python trace_sampler.py report --output_dir /where/you/want/to/output
+
+import argparse
+import gzip
+import json
+import os
+
+from trace_stats import BR, CHUNK_SIZE
+
+# Iterations of the sampled loop kept in a sampled trace, and the number of
+# windows they are split into.
+SAMPLE_ITERATIONS = 32
+SAMPLE_WINDOWS = 4
+
+def trace_lines(path, chunk_size=CHUNK_SIZE):
+  """ The lines of a gzip-compressed (or plain) trace, without newlines. """
+  opener = gzip.open if path.endswith(".gz") else open
+  partial = b""
+  with opener(path, "rb") as f:
+    while True:
+      data = f.read(chunk_size)
+      if not data:
+        break
+      lines = (partial + data).split(b"\n")
+      partial = lines.pop()
+      for line in lines:
+        if line:
+          yield line.rstrip(b"\r")
+  if partial:
+    yield partial
+
+def metadata_path(sampled_trace):
+  """ dynamic_sampled_trace.gz -> dynamic_sampled_trace.json """
+  base = sampled_trace[:-3] if sampled_trace.endswith(".gz") else sampled_trace
+  return os.path.splitext(base)[0] + ".json"
+
+def scan_loops(path, loops):
+  """ Count the branches at the line of each loop.
+
+  Args:
+    loops: List of (function, line number).
+
+  Returns:
+    A tuple (number of instructions, dict mapping each loop to [branches,
+    index of the first branch, index of the last branch]).
+  """
+  headers = dict(((function.encode("utf-8"), line), (function, line))
+                 for function, line in loops)
+  found = dict((loop, [0, None, None]) for loop in loops)
+  instructions = 0
+  for line in trace_lines(path):
+    if not line.startswith(b"0,"):
+      continue
+    fields = line.split(b",", 6)
+    if int(fields[5]) == BR:
+      loop = headers.get((fields[2], int(fields[1])))
+      if loop:
+        counts = found[loop]
+        counts[0] += 1
+        if counts[1] is None:
+          counts[1] = instructions
+        counts[2] = instructions
+    instructions += 1
+  return instructions, found
+
+def choose_loop(found, min_iterations):
+  """ The loop whose iterations span the most instructions, among those with
+  at least min_iterations iterations, or None. """
+  best = None
+  for loop, (branches, first, last) in found.items():
+    if branches - 1 < min_iterations:
+      continue
+    if best is None or last - first > found[best][2] - found[best][1]:
+      best = loop
+  return best
+
+def sample_windows(iterations, samples, windows):
+  """ Iteration numbers (from 1) of windows of consecutive iterations, evenly
+  spread over the loop. """
+  windows = max(1, min(windows, samples))
+  length = max(1, samples // windows)
+  kept = set()
+  for w in range(windows):
+    center = (w + 0.5) * iterations / windows
+    start = int(center - length / 2.0) + 1
+    start = min(max(start, 1), iterations - length + 1)
+    kept.update(range(start, start + length))
+  return kept
+
+def write_sampled_trace(path, out_path, loop, iterations, kept):
+  """ Copy a trace, keeping only the given iterations of a loop.
+
+  Instructions are renumbered consecutively.
+
+  Returns:
+    A tuple (instructions written, instructions in the loop's iterations,
+    instructions written from them).
+  """
+  header = (loop[0].encode("utf-8"), loop[1])
+  segment = 0
+  keep = True
+  written = 0
+  loop_instructions = 0
+  loop_written = 0
+  out = gzip.open(out_path, "wb")
+  buf = []
+  try:
+    for line in trace_lines(path):
+      if line.startswith(b"0,"):
+        fields = line.split(b",")
+        in_loop = 1 <= segment <= iterations
+        keep = not in_loop or segment in kept
+        if in_loop:
+          loop_instructions += 1
+        if keep:
+          if len(fields) > 6:
+            fields[6] = str(written).encode("ascii")
+            line = b",".join(fields)
+          written += 1
+          loop_written += in_loop
+        if (int(fields[5]) == BR and
+            (fields[2], int(fields[1])) == header):
+          segment += 1
+      if keep:
+        buf.append(line)
+        if len(buf) >= 65536:
+          out.write(b"\n".join(buf) + b"\n")
+          buf = []
+    if buf:
+      out.write(b"\n".join(buf) + b"\n")
+  finally:
+    out.close()
+  return written, loop_instructions, loop_written
+
+def sample_trace(path, out_path, benchmark, samples=SAMPLE_ITERATIONS,
+                 windows=SAMPLE_WINDOWS):
+  """ Write a sampled trace of a benchmark and its scaling metadata.
+
+  If no declared loop has more than samples iterations, the whole trace is
+  kept.
+
+  Returns:
+    The metadata, as also written to metadata_path(out_path).
+  """
+  loops = [(loop.name, loop.line_num) for loop in benchmark.loops]
+  instructions, found = scan_loops(path, loops)
+  loop = choose_loop(found, samples + 1)
+  if loop:
+    # The last branch leaves the loop.
+    iterations = found[loop][0] - 1
+    kept = sample_windows(iterations, samples, windows)
+  else:
+    loop, iterations, kept = ("", 0), 0, set()
+  written, loop_instructions, loop_written = write_sampled_trace(
+      path, out_path, loop, iterations, kept)
+  meta = {"trace": os.path.basename(path),
+          "loop": "%s:%d" % loop if loop[0] else None,
+          "iterations": iterations,
+          "sampled_iterations": sorted(kept),
+          "instructions": instructions,
+          "sampled_instructions": written,
+          "loop_instructions": loop_instructions,
+          "sampled_loop_instructions": loop_written,
+          "scale": instructions / float(max(written, 1))}
+  with open(metadata_path(out_path), "w") as f:
+    json.dump(meta, f, indent=2, sort_keys=True)
+  return meta
+
+def read_metadata(sampled_trace):
+  """ The metadata of a sampled trace, or None. """
+  path = metadata_path(sampled_trace)
+  if not os.path.exists(path):
+    return None
+  with open(path) as f:
+    return json.load(f)
+
+def extrapolate(summary, meta):
+  """ Scale the summary of a sampled simulation to the full trace. """
+  if summary is None or meta is None:
+    return None
+  full = dict(summary)
+  full["cycle"] = summary["cycle"] * meta["scale"]
+  return full
+
+def _ranks(values):
+  order = sorted(range(len(values)), key=lambda i: values[i])
+  ranks = [0] * len(values)
+  for rank, i in enumerate(order):
+    ranks[i] = rank
+  return ranks
+
+def _correlation(x, y):
+  n = float(len(x))
+  mx, my = sum(x) / n, sum(y) / n
+  sxy = sum((a - mx) * (b - my) for a, b in zip(x, y))
+  sxx = sum((a - mx) ** 2 for a in x)
+  syy = sum((b - my) ** 2 for b in y)
+  if not sxx or not syy:
+    return 1.0
+  return sxy / (sxx * syy) ** 0.5
+
+def accuracy_report(bmk_dir, benchmark_name):
+  """ Compare extrapolated sampled simulations with full ones.
+
+  Returns:
+    A list of report lines.
+  """
+  # Imported here: aladdin_results reads sampled results through this module.
+  from aladdin_results import read_outputs
+  meta = read_metadata(os.path.join(bmk_dir, "inputs",
+                                    "dynamic_sampled_trace.gz"))
+  if not meta:
+    return ["no sampled trace"]
+  pairs = []
+  for config in sorted(os.listdir(bmk_dir)):
+    if not os.path.isdir(os.path.join(bmk_dir, config, "outputs_sampled")):
+      continue
+    full = read_outputs(bmk_dir, config, benchmark_name)
+    sampled = read_outputs(bmk_dir, config, benchmark_name, sampled=True)
+    if full and sampled:
+      pairs.append((full, sampled))
+  lines = ["sampled %s: %d of %d iterations, %.1f%% of %d instructions" %
+           (meta["loop"], len(meta["sampled_iterations"]), meta["iterations"],
+            100.0 / meta["scale"], meta["instructions"])]
+  if not pairs:
+    return lines + ["  no config has both full and sampled results"]
+  lines.append("  %d configs simulated both ways" % len(pairs))
+  energy = lambda s: s["cycle"] * s.get("avg_power", 0)
+  for name, value in [("cycles", lambda s: s["cycle"]), ("energy", energy),
+                      ("avg power", lambda s: s.get("avg_power", 0))]:
+    errors = [abs(value(s) - value(f)) / value(f) for f, s in pairs
+              if value(f)]
+    if errors:
+      lines.append("  %-9s error: mean %.1f%%, max %.1f%%" %
+                   (name, 100 * sum(errors) / len(errors), 100 * max(errors)))
+  if len(pairs) > 1:
+    lines.append("  rank correlation of cycles: %.3f" % _correlation(
+        _ranks([f["cycle"] for f, _ in pairs]),
+        _ranks([s["cycle"] for _, s in pairs])))
+  return lines
+
+def main():
+  parser = argparse.ArgumentParser(
+      description="Sample dynamic traces and report the accuracy of "
+      "simulations of the samples.",
+      formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  commands = parser.add_subparsers(dest="command")
+  sample = commands.add_parser("sample", help="Write a sampled trace.")
+  sample.add_argument("trace", help="Full trace.")
+  sample.add_argument("sampled_trace", help="Sampled trace to write.")
+  sample.add_argument("--benchmark", required=True, help="Name of the "
+                      "benchmark whose loops are sampled, e.g. md-knn.")
+  sample.add_argument("--iterations", type=int, default=SAMPLE_ITERATIONS,
+                      help="Iterations of the sampled loop to keep.")
+  sample.add_argument("--windows", type=int, default=SAMPLE_WINDOWS,
+                      help="Number of windows of consecutive iterations.")
+  report = commands.add_parser("report", help="Compare the extrapolated "
+                               "results of sampled traces with full ones.")
+  report.add_argument("--output_dir", required=True, help="Sweep output "
+                      "directory.")
+  report.add_argument("--benchmark", help="Only report this benchmark.")
+  args = parser.parse_args()
+
+  from machsuite_config import MACH
+  benchmarks = dict((b.name, b) for b in MACH)
+  if args.benchmark and args.benchmark not in benchmarks:
+    parser.error("Unknown benchmark %s" % args.benchmark)
+  if args.command == "sample":
+    meta = sample_trace(args.trace, args.sampled_trace,
+                        benchmarks[args.benchmark], args.iterations,
+                        args.windows)
+    print("Kept %d of %d instructions (%s, %d of %d iterations)" % (
+        meta["sampled_instructions"], meta["instructions"], meta["loop"],
+        len(meta["sampled_iterations"]), meta["iterations"]))
+  else:
+    for benchmark in MACH:
+      if args.benchmark and benchmark.name != args.benchmark:
+        continue
+      bmk_dir = os.path.join(args.output_dir, benchmark.name)
+      if os.path.isdir(bmk_dir):
+        print("%s: %s" % (benchmark.name,
+                          "\n".join(accuracy_report(bmk_dir, benchmark.name))))
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+# Streaming statistics of LLVM-Tracer dynamic traces.
+#
+# A trace is a sequence of dynamic instructions. Each one starts with a line
+#   0,<line number>,<function>,<basic block>,<instruction id>,<opcode>,<count>
+# followed by one line per operand and one for the result:
+#   <operand number>,<size in bits>,<value>,<is register>,<label>
+#   r,<size in bits>,<value>,<is register>,<label>
+# Traces can be gigabytes, so they are decompressed and parsed in fixed-size
+# chunks and only aggregate counts are kept in memory.
+
+import argparse
+import gzip
+import os
+
+from machsuite_config import MACH
+
+CHUNK_SIZE = 1 << 22
+
+# LLVM 3.4 opcode numbers, as written by LLVM-Tracer.
+OPCODES = {
+    1: "Ret", 2: "Br", 3: "Switch", 4: "IndirectBr", 5: "Invoke", 6: "Resume",
+    7: "Unreachable", 8: "Add", 9: "FAdd", 10: "Sub", 11: "FSub", 12: "Mul",
+    13: "FMul", 14: "UDiv", 15: "SDiv", 16: "FDiv", 17: "URem", 18: "SRem",
+    19: "FRem", 20: "Shl", 21: "LShr", 22: "AShr", 23: "And", 24: "Or",
+    25: "Xor", 26: "Alloca", 27: "Load", 28: "Store", 29: "GetElementPtr",
+    30: "Fence", 31: "AtomicCmpXchg", 32: "AtomicRMW", 33: "Trunc",
+    34: "ZExt", 35: "SExt", 36: "FPToUI", 37: "FPToSI", 38: "UIToFP",
+    39: "SIToFP", 40: "FPTrunc", 41: "FPExt", 42: "PtrToInt", 43: "IntToPtr",
+    44: "BitCast", 45: "ICmp", 46: "FCmp", 47: "PHI", 48: "Call",
+    49: "Select", 52: "VAArg", 53: "ExtractElement", 54: "InsertElement",
+    55: "ShuffleVector", 56: "ExtractValue", 57: "InsertValue",
+}
+LOAD = 27
+STORE = 28
+GEP = 29
+BR = 2
+# The operand that holds the address of a memory access.
+ADDRESS_OPERAND = {LOAD: b"1", STORE: b"2"}
+
+def _text(label):
+  return label if isinstance(label, str) else label.decode("utf-8", "replace")
+
+class ArrayStats(object):
+  """ Accesses to one array, identified by its label in the trace. """
+  def __init__(self):
+    self.loads = 0
+    self.stores = 0
+    self.min_address = None
+    self.max_address = None
+    self.word_size = 0
+
+  def access(self, opcode, address, word_size):
+    if opcode == LOAD:
+      self.loads += 1
+    else:
+      self.stores += 1
+    if self.min_address is None or address < self.min_address:
+      self.min_address = address
+    if self.max_address is None or address > self.max_address:
+      self.max_address = address
+    self.word_size = max(self.word_size, word_size)
+
+  def footprint(self):
+    """ Bytes spanned by the accessed addresses. """
+    if self.min_address is None:
+      return 0
+    return self.max_address - self.min_address + self.word_size
+
+class TraceStats(object):
+  """ Aggregate counts of a dynamic trace, fed one chunk at a time. """
+  def __init__(self):
+    self.instructions = 0
+    self.opcodes = {}
+    self.functions = {}
+    # (function, line number) -> [instructions, branches]
+    self.lines = {}
+    self.arrays = {}
+    # Register label -> label of the array it points into.
+    self.pointers = {}
+    self._partial = b""
+    self._inst = None
+
+  def _finish_instruction(self):
+    """ Account for the memory access or address computation just parsed. """
+    opcode, operands = self._inst
+    self._inst = None
+    if opcode == GEP:
+      if b"1" in operands and b"r" in operands:
+        base = operands[b"1"][2]
+        self.pointers[operands[b"r"][2]] = self.pointers.get(base, base)
+      return
+    access = operands.get(ADDRESS_OPERAND[opcode])
+    if access is None:
+      return
+    try:
+      address = int(access[1])
+    except ValueError:
+      return
+    label = self.pointers.get(access[2], access[2])
+    # Loads are as wide as their result, stores as the value they store.
+    data = operands.get(b"r" if opcode == LOAD else b"1")
+    word_size = int(data[0]) // 8 if data else 0
+    stats = self.arrays.get(label)
+    if stats is None:
+      stats = self.arrays[label] = ArrayStats()
+    stats.access(opcode, address, word_size)
+
+  def _parse_line(self, line):
+    fields = line.split(b",")
+    tag = fields[0]
+    if tag == b"0" and len(fields) >= 6:
+      if self._inst:
+        self._finish_instruction()
+      opcode = int(fields[5])
+      function = fields[2]
+      key = (function, int(fields[1]))
+      self.instructions += 1
+      self.opcodes[opcode] = self.opcodes.get(opcode, 0) + 1
+      self.functions[function] = self.functions.get(function, 0) + 1
+      counts = self.lines.get(key)
+      if counts is None:
+        counts = self.lines[key] = [0, 0]
+      counts[0] += 1
+      if opcode == BR:
+        counts[1] += 1
+      if opcode in (LOAD, STORE, GEP):
+        self._inst = (opcode, {})
+    elif self._inst and len(fields) >= 5:
+      # Operand or result of a memory instruction: keep size, value, label.
+      self._inst[1][tag] = (fields[1], fields[2], fields[4])
+
+  def feed(self, data):
+    """ Parse a chunk of decompressed trace. Lines may span chunks. """
+    lines = (self._partial + data).split(b"\n")
+    self._partial = lines.pop()
+    for line in lines:
+      if line:
+        self._parse_line(line.rstrip(b"\r"))
+
+  def finish(self):
+    if self._partial:
+      self._parse_line(self._partial)
+      self._partial = b""
+    if self._inst:
+      self._finish_instruction()
+
+  def loop_counts(self, function, line_num):
+    """ (instructions, branches) executed at a source line of a function. """
+    counts = self.lines.get((function.encode("utf-8"), line_num), (0, 0))
+    return tuple(counts)
+
+def analyze_trace(path, chunk_size=CHUNK_SIZE):
+  """ Compute the TraceStats of a gzip-compressed (or plain) trace file. """
+  stats = TraceStats()
+  opener = gzip.open if path.endswith(".gz") else open
+  with opener(path, "rb") as f:
+    while True:
+      data = f.read(chunk_size)
+      if not data:
+        break
+      stats.feed(data)
+  stats.finish()
+  return stats
+
+def check_benchmark(stats, benchmark):
+  """ Cross-check trace statistics against a benchmark description.
+
+  Returns:
+    A list of warning strings; empty if the description matches the trace.
+  """
+  warnings = []
+  traced = set(_text(f) for f in stats.functions)
+  for kernel in benchmark.kernels:
+    if kernel not in traced:
+      warnings.append("kernel %s does not appear in the trace" % kernel)
+  arrays = dict((_text(label), s) for label, s in stats.arrays.items())
+  for array in benchmark.arrays:
+    accessed = arrays.get(array.name)
+    if accessed is None:
+      warnings.append("array %s is never accessed" % array.name)
+      continue
+    if accessed.word_size and accessed.word_size != array.word_size:
+      warnings.append("array %s is accessed with %d-byte words, configured "
+                      "as %d" % (array.name, accessed.word_size,
+                                 array.word_size))
+    size = array.size * array.word_size
+    if accessed.footprint() > size:
+      warnings.append("array %s spans %d bytes in the trace, configured as %d"
+                      % (array.name, accessed.footprint(), size))
+  for loop in benchmark.loops:
+    if loop.name not in traced:
+      continue
+    instructions, branches = stats.loop_counts(loop.name, loop.line_num)
+    if not instructions:
+      warnings.append("no instructions of %s at line %d; is the loop's line "
+                      "number stale?" % (loop.name, loop.line_num))
+    elif not branches:
+      warnings.append("no branches of %s at line %d; it is not a loop header"
+                      % (loop.name, loop.line_num))
+  return warnings
+
+def format_report(stats, benchmark=None):
+  """ Render trace statistics as text. """
+  lines = ["%d dynamic instructions" % stats.instructions]
+  lines.append("  Opcodes:")
+  for opcode, count in sorted(stats.opcodes.items(), key=lambda x: -x[1]):
+    lines.append("    %-16s %12d" % (OPCODES.get(opcode, str(opcode)), count))
+  lines.append("  Functions:")
+  for function, count in sorted(stats.functions.items(), key=lambda x: -x[1]):
+    lines.append("    %-24s %12d" % (_text(function), count))
+  lines.append("  Arrays:%32s %12s %12s" % ("loads", "stores", "footprint"))
+  for label, s in sorted(stats.arrays.items(), key=lambda x: _text(x[0])):
+    lines.append("    %-24s %12d %12d %12d" %
+                 (_text(label), s.loads, s.stores, s.footprint()))
+  if benchmark:
+    lines.append("  Loops:%33s %12s" % ("instructions", "branches"))
+    for loop in benchmark.loops:
+      lines.append("    %-24s %12d %12d" %
+                   (("%s:%d" % (loop.name, loop.line_num),) +
+                    stats.loop_counts(loop.name, loop.line_num)))
+    for warning in check_benchmark(stats, benchmark):
+      lines.append("  WARNING: %s" % warning)
+  return "\n".join(lines)
+
+def main():
+  parser = argparse.ArgumentParser(
+      description="Summarize LLVM-Tracer dynamic traces and check them "
+      "against the MachSuite benchmark descriptions.",
+      formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument("--output_dir", help="Sweep output directory. The "
+                      "trace of every benchmark under it is analyzed.")
+  parser.add_argument("--trace", help="Analyze only this trace file.")
+  parser.add_argument("--benchmark", help="Name of the benchmark, e.g. "
+                      "gemm-blocked, to check the trace against.")
+  parser.add_argument("--chunk_size", type=int, default=CHUNK_SIZE,
+                      help="Bytes of decompressed trace parsed at a time.")
+  args = parser.parse_args()
+
+  benchmarks = dict((b.name, b) for b in MACH)
+  if args.benchmark and args.benchmark not in benchmarks:
+    parser.error("Unknown benchmark %s" % args.benchmark)
+  if args.trace:
+    traces = [(benchmarks.get(args.benchmark), args.trace)]
+  elif args.output_dir:
+    traces = []
+    for benchmark in MACH:
+      if args.benchmark and benchmark.name != args.benchmark:
+        continue
+      path = os.path.join(args.output_dir, benchmark.name, "inputs",
+                          "dynamic_trace.gz")
+      if os.path.exists(path):
+        traces.append((benchmark, path))
+  else:
+    parser.error("Either --output_dir or --trace is required.")
+
+  warned = False
+  for benchmark, path in traces:
+    stats = analyze_trace(path, args.chunk_size)
+    print("%s: %s" % (benchmark.name if benchmark else path,
+                      format_report(stats, benchmark)))
+    warned = warned or bool(benchmark and check_benchmark(stats, benchmark))
+  if warned:
+    exit(1)
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,321 @@
+#!/usr/bin/env python
+# Distributed execution of Aladdin simulations over TCP.
+#
+# A coordinator serves the simulations of a sweep to workers on any number of
+# hosts. Workers lease one simulation at a time, run it with the retries and
+# timeout of the sweep, and report the result back. A lease lasts lease_time
+# seconds and is renewed by the worker while its simulation runs; if a worker
+# dies or loses its connection, its lease expires and the simulation is queued
+# again for another worker. The first result reported for a simulation wins.
+# A worker whose renewal is refused, because its lease expired or another
+# worker finished the simulation, kills its simulation so that it does not
+# overwrite the outputs of the other worker.
+#
+# Only task descriptions and results travel over the network: the trace,
+# config and output files are read and written at the paths the coordinator
+# uses, so the sweep's output directory must be on a filesystem shared by all
+# hosts. Each request is a single line of JSON on its own connection, so
+# workers may come and go at any time.
+
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+
+try:
+  import socketserver
+except ImportError:
+  import SocketServer as socketserver
+
+from sim_runner import LOST, SimResult, SimTask, describe_result, run_sim_task
+from stage_log import StageBuffer
+
+# Seconds a lease lasts without being renewed.
+LEASE_TIME = 60.0
+# Times a simulation is leased before it is given up as lost.
+MAX_LEASES = 3
+# Seconds an idle worker waits before asking for work again.
+POLL_INTERVAL = 2.0
+# Seconds a worker keeps trying to reach an unreachable coordinator.
+IDLE_TIMEOUT = 600.0
+# Seconds the coordinator keeps telling workers that the sweep is over.
+LINGER = 2 * POLL_INTERVAL
+
+def parse_address(address):
+  """ Parse HOST:PORT. An empty host listens on all interfaces. """
+  host, _, port = address.rpartition(":")
+  return host, int(port)
+
+def request(address, message, timeout=30.0):
+  """ Send one request to a coordinator and return its reply. """
+  conn = socket.create_connection(address, timeout)
+  try:
+    conn.sendall((json.dumps(message) + "\n").encode("utf-8"))
+    reply = conn.makefile("rb").readline()
+  finally:
+    conn.close()
+  if not reply:
+    raise IOError("No reply from coordinator %s:%d" % address)
+  return json.loads(reply.decode("utf-8"))
+
+class _Handler(socketserver.StreamRequestHandler):
+  def handle(self):
+    try:
+      message = json.loads(self.rfile.readline().decode("utf-8"))
+    except ValueError:
+      return
+    reply = self.server.coordinator.handle(message)
+    self.wfile.write((json.dumps(reply) + "\n").encode("utf-8"))
+
+class _Server(socketserver.ThreadingTCPServer):
+  allow_reuse_address = True
+  daemon_threads = True
+
+class Coordinator(object):
+  """ Serves batches of SimTasks to workers.
+
+  The server runs in a background thread from construction until close(), so
+  that workers stay connected across batches, e.g. the rounds of a search.
+  """
+  def __init__(self, address, lease_time=LEASE_TIME, max_leases=MAX_LEASES):
+    self.lease_time = lease_time
+    self.max_leases = max_leases
+    self.lock = threading.Condition()
+    self.closed = False
+    self._start_batch([], None, 0, None)
+    self.server = _Server(address, _Handler)
+    self.server.coordinator = self
+    self.address = self.server.server_address
+    thread = threading.Thread(target=self.server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+  def _start_batch(self, tasks, timeout, retries, stage_log):
+    self.tasks = tasks
+    self.timeout = timeout
+    self.retries = retries
+    self.stage_log = stage_log
+    self.pending = deque(range(len(tasks)))
+    # Lease id -> [task index, deadline, worker] of the outstanding leases.
+    self.leases = {}
+    # Lease id -> task index of every lease of this batch, so that a worker
+    # whose lease expired can still report its result.
+    self.issued = {}
+    self.times_leased = [0] * len(tasks)
+    self.results = {}
+    self.completed = []
+
+  def _finish(self, index, result, worker):
+    self.results[index] = result
+    self.completed.append((index, worker))
+    for lease_id in [l for l, lease in self.leases.items() if lease[0] == index]:
+      del self.leases[lease_id]
+    self.lock.notify_all()
+
+  def _expire(self):
+    now = time.time()
+    for lease_id, (index, deadline, worker) in list(self.leases.items()):
+      if deadline > now:
+        continue
+      del self.leases[lease_id]
+      if index in self.results:
+        continue
+      task = self.tasks[index]
+      print("  lease of %s %s by %s expired" %
+            (task.benchmark, task.config, worker))
+      if any(lease[0] == index for lease in self.leases.values()):
+        continue
+      if self.times_leased[index] >= self.max_leases:
+        self._finish(index, SimResult(benchmark=task.benchmark,
+                                      config=task.config, returncode=LOST,
+                                      attempts=0, elapsed=0, timed_out=False),
+                     worker)
+      else:
+        self.pending.appendleft(index)
+
+  def handle(self, message):
+    """ Answer a worker's request. """
+    with self.lock:
+      self._expire()
+      op = message.get("op")
+      if op == "lease":
+        while self.pending and self.pending[0] in self.results:
+          self.pending.popleft()
+        if not self.pending:
+          return {"done": True} if self.closed else {"wait": POLL_INTERVAL}
+        index = self.pending.popleft()
+        lease_id = uuid.uuid4().hex
+        self.leases[lease_id] = [index, time.time() + self.lease_time,
+                                 message.get("worker")]
+        self.issued[lease_id] = index
+        self.times_leased[index] += 1
+        return {"lease": lease_id, "task": self.tasks[index]._asdict(),
+                "lease_time": self.lease_time, "timeout": self.timeout,
+                "retries": self.retries}
+      if op == "renew":
+        lease = self.leases.get(message.get("lease"))
+        if lease:
+          lease[1] = time.time() + self.lease_time
+        return {"ok": lease is not None}
+      if op == "complete":
+        index = self.issued.get(message.get("lease"))
+        if index is None or index in self.results:
+          return {"ok": False}
+        if self.stage_log:
+          for entry in message.get("stages", []):
+            entry["host"] = message.get("worker")
+            self.stage_log.append(entry)
+        self._finish(index, SimResult(**message["result"]),
+                     message.get("worker"))
+        return {"ok": True}
+      return {"error": "unknown request %r" % op}
+
+  def run(self, tasks, timeout=None, retries=0, stage_log=None):
+    """ Run simulations on the connected workers.
+
+    Results are printed as they complete, which is not necessarily the order
+    of tasks.
+
+    Args:
+      tasks: List of SimTasks.
+      timeout, retries: Applied by the workers; see run_sim_task().
+      stage_log: A StageLog that the stages run by the workers are added to,
+        or None.
+
+    Returns:
+      A list of SimResult objects, one per task.
+    """
+    with self.lock:
+      self._start_batch(list(tasks), timeout, retries, stage_log)
+      printed = 0
+      while True:
+        self._expire()
+        for index, worker in self.completed[printed:]:
+          result = self.results[index]
+          printed += 1
+          print("  [%d/%d] %s %s: %s (%.1fs) on %s" % (
+              printed, len(self.tasks), result.benchmark, result.config,
+              describe_result(result), result.elapsed, worker))
+          sys.stdout.flush()
+        if len(self.results) == len(self.tasks):
+          break
+        self.lock.wait(1.0)
+      results = [self.results[index] for index, _ in self.completed]
+      self._start_batch([], None, 0, None)
+    return results
+
+  def close(self, linger=LINGER):
+    """ Tell polling workers that the sweep is over, then stop serving. """
+    with self.lock:
+      self.closed = True
+    time.sleep(linger)
+    self.server.shutdown()
+    self.server.server_close()
+
+class _Heartbeat(threading.Thread):
+  """ Renews a lease until stopped, or until the coordinator refuses to
+  renew it, which sets revoked. """
+  def __init__(self, address, lease_id, interval):
+    threading.Thread.__init__(self)
+    self.daemon = True
+    self.address = address
+    self.lease_id = lease_id
+    self.interval = interval
+    self.stopped = threading.Event()
+    self.revoked = threading.Event()
+
+  def run(self):
+    while not self.stopped.wait(self.interval):
+      try:
+        reply = request(self.address, {"op": "renew", "lease": self.lease_id})
+      except (IOError, OSError, ValueError):
+        # The coordinator may be back before the lease expires.
+        continue
+      if not reply.get("ok"):
+        self.revoked.set()
+        return
+
+def run_worker(address, name=None, aladdin_home=None,
+               idle_timeout=IDLE_TIMEOUT):
+  """ Run simulations leased from a coordinator until it closes.
+
+  Args:
+    address: (host, port) of the coordinator.
+    name: Name of this worker in the coordinator's output. Defaults to
+      <host>:<pid>.
+    aladdin_home: If set, run the Aladdin binary of this installation rather
+      than the coordinator's.
+    idle_timeout: Give up after failing to reach the coordinator for this many
+      seconds.
+
+  Returns:
+    The number of simulations this worker ran.
+  """
+  name = name or "%s:%d" % (socket.gethostname(), os.getpid())
+  count = 0
+  unreachable_since = None
+  while True:
+    try:
+      reply = request(address, {"op": "lease", "worker": name})
+      unreachable_since = None
+    except (IOError, OSError, ValueError):
+      now = time.time()
+      unreachable_since = unreachable_since or now
+      if now - unreachable_since >= idle_timeout:
+        return count
+      time.sleep(POLL_INTERVAL)
+      continue
+    if reply.get("done"):
+      return count
+    if "lease" not in reply:
+      time.sleep(reply.get("wait", POLL_INTERVAL))
+      continue
+
+    task = SimTask(**reply["task"])
+    if aladdin_home:
+      task = task._replace(cmd=["%s/common/aladdin" % aladdin_home] +
+                           task.cmd[1:])
+    heartbeat = _Heartbeat(address, reply["lease"], reply["lease_time"] / 4.0)
+    heartbeat.start()
+    stages = StageBuffer()
+    try:
+      result = run_sim_task(task, reply["timeout"], reply["retries"], stages,
+                            heartbeat.revoked)
+    finally:
+      heartbeat.stopped.set()
+    if heartbeat.revoked.is_set():
+      # The simulation was killed; it belongs to another worker now.
+      print("  lease of %s %s was revoked" % (task.benchmark, task.config))
+      continue
+    count += 1
+    # Keep trying to report: the result is not lost until the lease expires.
+    deadline = time.time() + reply["lease_time"]
+    while True:
+      try:
+        request(address, {"op": "complete", "lease": reply["lease"],
+                          "worker": name, "result": result._asdict(),
+                          "stages": stages.read()})
+        break
+      except (IOError, OSError, ValueError):
+        if time.time() >= deadline:
+          break
+        time.sleep(POLL_INTERVAL)
+
+def run_workers(address, jobs=1, aladdin_home=None, idle_timeout=IDLE_TIMEOUT):
+  """ Run jobs worker processes on this host; see run_worker(). """
+  if jobs <= 1:
+    run_worker(address, aladdin_home=aladdin_home, idle_timeout=idle_timeout)
+    return
+  workers = [multiprocessing.Process(
+                 target=run_worker, args=(address, None, aladdin_home,
+                                          idle_timeout))
+             for _ in range(jobs)]
+  for worker in workers:
+    worker.start()
+  for worker in workers:
+    worker.join()
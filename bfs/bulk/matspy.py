@@ -1,21 +1,44 @@
 #!/usr/bin/env python
 
+# Plots the adjacency matrix of the bfs graph in input.data (mat.png) and the
+# same matrix with the nodes ordered by their BFS level in check.data
+# (mat2.png).
+
+import os
+import sys
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import numpy as np
-from mat import mat, mat2
-
-#(fig,ax)=plt.subplots()
-plt.imshow(mat);
-plt.savefig('mat.png')
-plt.imshow(mat2);
-plt.savefig('mat2.png')
-
-print sum(map(sum,mat))
-print sum(map(sum,mat2))
-
-#d=dict(zip(list('ABCD'),[0,0,0,0]))
-#for c in mat:
-#  d[c] += 1
-#s=sum(d.values())
-#for k in d:
-#  print 100*d[k]/s
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, '..', '..', 'common'))
+from bench_layout import open_bench_data
+
+data = open_bench_data(here, 'input.data')
+check = open_bench_data(here, 'check.data')
+
+nodes = data['nodes']
+begin = nodes['edge_begin'].astype(np.int64)
+degree = nodes['edge_end'].astype(np.int64) - begin
+n = len(nodes)
+src = np.repeat(np.arange(n), degree)
+# Edge lists need not be contiguous; gather each node's own slice.
+offsets = np.arange(len(src)) - np.repeat(np.cumsum(degree)-degree, degree)
+dst = data['edges']['dst'][np.repeat(begin, degree) + offsets]
+
+mat = np.zeros((n, n), dtype=np.int64)
+mat[src, dst] = 1
+order = np.argsort(check['level'], kind='mergesort')
+mat2 = mat[order][:,order]
+
+plt.imshow(mat, interpolation='nearest')
+plt.savefig(os.path.join(here, 'mat.png'))
+plt.imshow(mat2, interpolation='nearest')
+plt.savefig(os.path.join(here, 'mat2.png'))
+
+print(mat.sum())
+print(mat2.sum())
+(levels, counts) = np.unique(check['level'], return_counts=True)
+for (level, count) in zip(levels, counts):
+  print('level %d: %d nodes' % (level, count))
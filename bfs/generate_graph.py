@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+
+# Generates R-MAT graphs of any size as bfs input.data and check.data files, in
+# the layout of bulk.h or queue.h. This is a NumPy version of generate.c that
+# scales to millions of nodes. Like generate.c, it makes an undirected graph
+# without self or duplicate edges, with 2^SCALE nodes and N_NODES*EDGE_FACTOR
+# directed edges, and shuffles the nodes to remove degree locality.
+# The files are written through memory maps, and check.data holds the levels
+# and level counts that the kernel computes.
+#
+# Usage:
+#   generate_graph.py --scale 20 [--edge_factor 16] [--format queue]
+#       [--update_header]
+
+import argparse
+import os
+import shutil
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'common'))
+from bench_layout import (Layout, LayoutError, create_data, evaluate,
+                          header_defines, update_defines)
+
+# R-MAT quadrant probabilities, as in generate.c: a scale-free, small-world
+# graph. (0.25, 0.25, 0.25, 0.25) gives an Erdos-Renyi graph.
+RMAT = (0.57, 0.19, 0.19, 0.05)
+MAX_LEVEL = 127 # INT8_MAX, the level of unvisited nodes
+
+def rmat_edges(scale, n_edges, rng, abcd=RMAT):
+  """ n_edges distinct undirected R-MAT edges, as (row, column) with
+  row < column. """
+  n_nodes = 1<<scale
+  if n_edges > n_nodes*(n_nodes-1)//2:
+    sys.exit('A graph of %d nodes has fewer than %d edges' % (n_nodes, n_edges))
+  (a, b, c, _) = abcd
+  keys = np.empty(0, dtype=np.int64)
+  while len(keys) < n_edges:
+    missing = n_edges - len(keys)
+    draw = missing + missing//4 + 16
+    r = np.zeros(draw, dtype=np.int64)
+    col = np.zeros(draw, dtype=np.int64)
+    # Pick a quadrant at each level of the recursive matrix.
+    for level in range(scale):
+      p = rng.random_sample(draw)
+      bit = 1<<(scale-1-level)
+      r += bit * (p >= a+b)
+      col += bit * (((p >= a) & (p < a+b)) | (p >= a+b+c))
+    (lo, hi) = (np.minimum(r, col), np.maximum(r, col))
+    key = lo*n_nodes + hi
+    # Self edges are irrelevant; keep edges in the order they were drawn.
+    key = key[lo != hi]
+    (_, first) = np.unique(np.concatenate((keys, key)), return_index=True)
+    keys = np.concatenate((keys, key))[np.sort(first)][:n_edges]
+  return (keys // n_nodes, keys % n_nodes)
+
+def adjacency(scale, lo, hi, rng):
+  """ Symmetric adjacency lists of shuffled nodes.
+
+  Returns:
+    (edge_begin, edge_end, dst), with each node's neighbors in dst sorted.
+  """
+  n_nodes = 1<<scale
+  perm = rng.permutation(n_nodes)
+  src = perm[np.concatenate((lo, hi))]
+  dst = perm[np.concatenate((hi, lo))]
+  order = np.lexsort((dst, src))
+  (src, dst) = (src[order], dst[order])
+  edge_end = np.cumsum(np.bincount(src, minlength=n_nodes))
+  edge_begin = edge_end - np.bincount(src, minlength=n_nodes)
+  return (edge_begin, edge_end, dst)
+
+def bfs_levels(edge_begin, edge_end, dst, start):
+  """ The BFS distance of every node from start, -1 if unreachable. """
+  n_nodes = len(edge_begin)
+  level = np.full(n_nodes, -1, dtype=np.int64)
+  level[start] = 0
+  frontier = np.array([start])
+  depth = 0
+  while len(frontier):
+    degree = edge_end[frontier] - edge_begin[frontier]
+    offsets = np.arange(degree.sum()) - np.repeat(np.cumsum(degree)-degree,
+                                                  degree)
+    neighbors = dst[np.repeat(edge_begin[frontier], degree) + offsets]
+    neighbors = np.unique(neighbors[level[neighbors] < 0])
+    depth += 1
+    level[neighbors] = depth
+    frontier = neighbors
+  return level
+
+def kernel_results(fmt, level, n_levels):
+  """ The level and level_counts arrays the bulk or queue kernel computes.
+
+  Both mark nodes with their distance from the starting node. The bulk
+  kernel visits at most n_levels horizons, so nodes farther away stay
+  unmarked.
+  """
+  reached = level >= 0
+  if fmt=='bulk':
+    reached &= level <= n_levels
+  out = np.where(reached, level, MAX_LEVEL).astype(np.int8)
+  counts = np.bincount(level[reached], minlength=n_levels)[:n_levels]
+  return (out, counts)
+
+def levels_needed(fmt, depth):
+  # The bulk kernel writes level_counts[depth+1] = 0 before it stops; the
+  # queue kernel counts nodes at every level up to depth.
+  return depth+2 if fmt=='bulk' else depth+1
+
+def write_data(layout, filename, fields):
+  data = create_data(filename, layout)
+  for (path, value) in fields.items():
+    view = data
+    for name in path:
+      view = view[name]
+    view[0] = value
+  data.flush()
+  del data
+
+def main():
+  here = os.path.dirname(os.path.abspath(__file__))
+  parser = argparse.ArgumentParser(description='Generate an R-MAT graph as '
+    'bfs input.data and check.data files.')
+  parser.add_argument('--scale', type=int, required=True, help='The graph has '
+    '2^SCALE nodes.')
+  parser.add_argument('--edge_factor', type=int, default=16, help='Directed '
+    'edges per node.')
+  parser.add_argument('--rmat', default=','.join(str(p) for p in RMAT),
+    help='R-MAT quadrant probabilities a,b,c,d.')
+  parser.add_argument('--seed', type=int, default=1)
+  parser.add_argument('--format', choices=['bulk', 'queue'], default='bulk')
+  parser.add_argument('--output_dir', help='Where to write input.data and '
+    'check.data. Defaults to the directory of the chosen format.')
+  parser.add_argument('--update_header', action='store_true', help='Rewrite '
+    'SCALE, EDGE_FACTOR and, if the graph is too deep, N_LEVELS in bulk.h or '
+    'queue.h.')
+  args = parser.parse_args()
+  abcd = tuple(float(p) for p in args.rmat.split(','))
+  if len(abcd)!=4 or abs(sum(abcd)-1) > 1e-6:
+    parser.error('--rmat needs four probabilities that sum to 1')
+  if not 1 <= args.scale <= 31:
+    parser.error('--scale must be between 1 and 31')
+
+  rng = np.random.RandomState(args.seed)
+  n_nodes = 1<<args.scale
+  n_edges = n_nodes*args.edge_factor
+  (lo, hi) = rmat_edges(args.scale, n_edges//2, rng, abcd)
+  (edge_begin, edge_end, dst) = adjacency(args.scale, lo, hi, rng)
+
+  # Start from a node with at least two neighbors, as generate.c does.
+  candidates = np.flatnonzero(edge_end-edge_begin >= 2)
+  if not len(candidates):
+    sys.exit('No node has two neighbors; increase --edge_factor')
+  start = int(rng.choice(candidates))
+  level = bfs_levels(edge_begin, edge_end, dst, start)
+
+  header = os.path.join(here, args.format, args.format+'.h')
+  defines = {'SCALE': args.scale, 'EDGE_FACTOR': args.edge_factor}
+  n_levels = evaluate('N_LEVELS', header_defines(header))
+  needed = levels_needed(args.format, int(level.max()))
+  if needed > n_levels:
+    defines['N_LEVELS'] = n_levels = needed
+  if n_levels > MAX_LEVEL:
+    sys.exit('The graph is %d levels deep, more than level_t holds' %
+             level.max())
+  try:
+    layout = Layout(header, defines)
+  except LayoutError as e:
+    sys.exit(str(e))
+  (out_level, counts) = kernel_results(args.format, level, n_levels)
+
+  output_dir = args.output_dir or os.path.join(here, args.format)
+  inputs = {('nodes', 'edge_begin'): edge_begin,
+            ('nodes', 'edge_end'): edge_end,
+            ('edges', 'dst'): dst,
+            ('starting_node',): start,
+            ('level',): MAX_LEVEL,
+            ('level_counts',): 0}
+  write_data(layout, os.path.join(output_dir, 'input.data'), inputs)
+  shutil.copyfile(os.path.join(output_dir, 'input.data'),
+                  os.path.join(output_dir, 'check.data'))
+  check = np.memmap(os.path.join(output_dir, 'check.data'), dtype=layout.dtype,
+                    mode='r+', shape=(1,))
+  check['level'][0] = out_level
+  check['level_counts'][0] = counts
+  check.flush()
+  del check
+
+  print('%d nodes, %d edges, %d reached from node %d in %d levels' %
+        (n_nodes, n_edges, (level >= 0).sum(), start, level.max()))
+  if args.update_header:
+    try:
+      update_defines(header, defines)
+    except LayoutError as e:
+      sys.exit(str(e))
+    print('Updated %s' % header)
+  else:
+    print('%s must define:' % header)
+  for (name, value) in sorted(defines.items()):
+    print('#define %s %d' % (name, value))
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+
+# Describes the binary layout of a benchmark's struct bench_args_t, as read and
+# written by common/harness.c, and maps its data files as NumPy arrays.
+#
+# The layout is derived from the benchmark header (bulk.h, crs.h, md.h, ...):
+# object-like #defines are expanded, typedefs and structs are resolved, and the
+# members of bench_args_t become the fields of an aligned NumPy structured
+# dtype. Data files are opened with numpy.memmap, so nothing is read until it
+# is used, however large the file.
+#
+# Usage:
+#   from bench_layout import open_bench_data
+#   data = open_bench_data('bfs/bulk', 'input.data')
+#   data['edges']['dst']
+#
+# Run it on benchmark directories to print their layouts:
+#   python common/bench_layout.py bfs/bulk spmv/crs
+
+import ast
+import glob
+import os
+import re
+import sys
+
+try:
+  import numpy as np
+except ImportError:
+  # Only Layout and the data files need NumPy; evaluating a header's
+  # #defines does not.
+  np = None
+
+class LayoutError(Exception):
+  pass
+
+# C types on the LP64 targets MachSuite is built for.
+BASE_TYPES = {
+  'char':'i1', 'signed char':'i1', 'unsigned char':'u1',
+  'short':'i2', 'short int':'i2', 'unsigned short':'u2',
+  'int':'i4', 'signed':'i4', 'signed int':'i4', 'unsigned':'u4',
+  'unsigned int':'u4',
+  'long':'i8', 'long int':'i8', 'unsigned long':'u8', 'long long':'i8',
+  'unsigned long long':'u8',
+  'float':'f4', 'double':'f8',
+  'int8_t':'i1', 'uint8_t':'u1', 'int16_t':'i2', 'uint16_t':'u2',
+  'int32_t':'i4', 'uint32_t':'u4', 'int64_t':'i8', 'uint64_t':'u8',
+}
+
+def strip_comments(text):
+  text = re.sub(r'/\*.*?\*/', ' ', text, flags=re.S)
+  return re.sub(r'//[^\n]*', '', text)
+
+def read_defines(text):
+  # Object-like macros only; function-like macros cannot size an array.
+  defines = {}
+  for m in re.finditer(r'^\s*#\s*define\s+(\w+)(?![\w(])[ \t]*([^\n]*)$', text,
+                       flags=re.M):
+    defines[m.group(1)] = m.group(2).strip()
+  return defines
+
+def expand(text, defines, depth=0):
+  if depth>32:
+    raise LayoutError('Recursive macro in "%s"' % text)
+  def replace(m):
+    name = m.group(0)
+    if name in defines:
+      return '(%s)' % expand(defines[name], defines, depth+1)
+    return name
+  return re.sub(r'[A-Za-z_]\w*', replace, text)
+
+def _eval(node):
+  if isinstance(node, ast.Expression):
+    return _eval(node.body)
+  if (isinstance(node, getattr(ast, 'Constant', ())) and
+      isinstance(node.value, (int, float))):
+    return node.value
+  if isinstance(node, getattr(ast, 'Num', ())):
+    return node.n
+  if isinstance(node, ast.UnaryOp):
+    value = _eval(node.operand)
+    if isinstance(node.op, ast.USub): return -value
+    if isinstance(node.op, ast.UAdd): return value
+    if isinstance(node.op, ast.Invert): return ~value
+  if isinstance(node, ast.BinOp):
+    (a, b) = (_eval(node.left), _eval(node.right))
+    op = node.op
+    if isinstance(op, ast.Add): return a+b
+    if isinstance(op, ast.Sub): return a-b
+    if isinstance(op, ast.Mult): return a*b
+    if isinstance(op, ast.Div):
+      if isinstance(a, int) and isinstance(b, int):
+        return int(float(a)/b) # C truncates toward zero
+      return a/b
+    if isinstance(op, ast.Mod): return a%b
+    if isinstance(op, ast.LShift): return a<<b
+    if isinstance(op, ast.RShift): return a>>b
+    if isinstance(op, ast.BitOr): return a|b
+    if isinstance(op, ast.BitAnd): return a&b
+    if isinstance(op, ast.BitXor): return a^b
+  raise LayoutError('Unsupported constant expression')
+
+def evaluate(expr, defines):
+  """ Evaluate a C integer constant expression such as N_NODES*EDGE_FACTOR. """
+  text = expand(expr, defines)
+  text = re.sub(r'\b(0[xX][0-9a-fA-F]+|\d+)[uUlL]*\b', r'\1', text)
+  try:
+    return _eval(ast.parse(text.strip(), mode='eval'))
+  except (SyntaxError, LayoutError):
+    raise LayoutError('Cannot evaluate "%s" (expanded to "%s")' % (expr, text))
+
+def header_defines(header, overrides=None):
+  """ The object-like #defines of a header, for evaluate(). """
+  with open(header) as f:
+    defines = read_defines(strip_comments(f.read()))
+  for (name, value) in (overrides or {}).items():
+    defines[name] = str(value)
+  return defines
+
+def update_defines(header, values):
+  """ Rewrite the numeric #defines of a header to new values. """
+  with open(header) as f:
+    text = f.read()
+  for (name, value) in sorted(values.items()):
+    literal = '%d' % value if isinstance(value, int) else repr(float(value))
+    (text, n) = re.subn(r'^#define %s\s+[0-9][0-9.eE+-]*\b' % name,
+                        '#define %s %s' % (name, literal), text, flags=re.M)
+    if n!=1:
+      raise LayoutError('%s: expected one numeric "#define %s" line, found %d'
+                        % (header, name, n))
+  with open(header, 'w') as f:
+    f.write(text)
+
+class Layout(object):
+  """ The struct bench_args_t of a benchmark header. """
+  def __init__(self, header, overrides=None):
+    """ Parse a header.
+
+    overrides maps macro names to values that replace the header's #defines,
+    like -D flags, to describe inputs generated at other sizes.
+    """
+    self.header = header
+    with open(header) as f:
+      self.text = strip_comments(f.read())
+    self.defines = header_defines(header, overrides)
+    self.types = {}
+    self._parse_types()
+    if 'bench_args_t' not in self.types:
+      raise LayoutError('%s does not define struct bench_args_t' % header)
+    self.dtype = self.types['bench_args_t']
+
+  def value(self, name):
+    """ The integer or float value of a #define. """
+    return evaluate(name, self.defines)
+
+  def _base_type(self, spelling):
+    spelling = ' '.join(expand(spelling, self.defines).replace('(', ' ')
+                        .replace(')', ' ').split())
+    spelling = re.sub(r'^(const|volatile) ', '', spelling)
+    spelling = re.sub(r'^struct ', '', spelling)
+    if spelling in self.types:
+      return self.types[spelling]
+    if spelling in BASE_TYPES:
+      return np.dtype('<'+BASE_TYPES[spelling])
+    raise LayoutError('%s: unknown type "%s"' % (self.header, spelling))
+
+  def _struct(self, body):
+    fields = []
+    for decl in body.split(';'):
+      decl = ' '.join(decl.split())
+      if not decl:
+        continue
+      if '*' in re.sub(r'\[[^\]]*\]', '', decl):
+        raise LayoutError('%s: pointer member "%s" has no fixed layout' %
+                          (self.header, decl))
+      # Split "double x, y, z" into the type and its declarators.
+      (typ, declarators) = self._split_declaration(decl)
+      base = self._base_type(typ)
+      for declarator in declarators:
+        name = re.match(r'\s*(\w+)', declarator).group(1)
+        dims = tuple(evaluate(d, self.defines)
+                     for d in re.findall(r'\[([^\]]*)\]', declarator))
+        fields.append((name, base, dims) if dims else (name, base))
+    return np.dtype(fields, align=True)
+
+  def _split_declaration(self, decl):
+    first = decl.split(',')[0]
+    m = re.match(r'^(.*[^\w])?(\w+)\s*((?:\[[^\]]*\]\s*)*)$', first)
+    if not m or not m.group(1):
+      raise LayoutError('%s: cannot parse member "%s"' % (self.header, decl))
+    typ = m.group(1).strip()
+    return (typ, decl[len(typ):].split(','))
+
+  def _parse_types(self):
+    # Typedefs and structs, in the order they appear.
+    pattern = re.compile(
+      r'typedef\s+struct\s*(\w*)\s*\{([^{}]*)\}\s*(\w+)\s*;'
+      r'|struct\s+(\w+)\s*\{([^{}]*)\}\s*;'
+      r'|typedef\s+([\w\s]+?)\s+(\w+)\s*;')
+    for m in pattern.finditer(self.text):
+      if m.group(3):
+        dtype = self._struct(m.group(2))
+        self.types[m.group(3)] = dtype
+        if m.group(1):
+          self.types[m.group(1)] = dtype
+      elif m.group(4):
+        self.types[m.group(4)] = self._struct(m.group(5))
+      else:
+        self.types[m.group(7)] = self._base_type(m.group(6))
+
+  def describe(self):
+    """ One line per field: offset, size, dtype and shape. """
+    lines = []
+    for name in self.dtype.names:
+      (dtype, offset) = self.dtype.fields[name][:2]
+      (base, shape) = (dtype.base, dtype.shape)
+      lines.append('%8d %10d  %-16s %s' % (offset, dtype.itemsize,
+        name+''.join('[%d]' % d for d in shape),
+        base.str if not base.names else '{%s}' % ', '.join(base.names)))
+    lines.append('%8s %10d  sizeof(struct bench_args_t)' % ('',
+                                                           self.dtype.itemsize))
+    return '\n'.join(lines)
+
+def find_header(bench_dir):
+  """ The header of a benchmark directory that declares bench_args_t. """
+  headers = []
+  for path in sorted(glob.glob(os.path.join(bench_dir, '*.h'))):
+    with open(path) as f:
+      if re.search(r'struct\s+bench_args_t\s*\{', strip_comments(f.read())):
+        headers.append(path)
+  if len(headers)!=1:
+    raise LayoutError('%s: expected one header declaring bench_args_t, '
+                      'found %d' % (bench_dir, len(headers)))
+  return headers[0]
+
+def open_data(path, layout, mode='r'):
+  """ Map a data file as an array of bench_args_t records.
+
+  harness.c reads one record; files that hold several back to back map to
+  several records. Trailing bytes that do not fill a record are ignored.
+  """
+  size = os.path.getsize(path)
+  count = size // layout.dtype.itemsize
+  if count==0:
+    raise LayoutError('%s holds %d bytes, less than one %d-byte record' %
+                      (path, size, layout.dtype.itemsize))
+  return np.memmap(path, dtype=layout.dtype, mode=mode, shape=(count,))
+
+def create_data(path, layout, count=1):
+  """ Create a data file of count zeroed records and map it for writing.
+
+  Padding between fields stays zero, as in files written by generate.c.
+  """
+  return np.memmap(path, dtype=layout.dtype, mode='w+', shape=(count,))
+
+def open_bench_data(bench_dir, name='input.data', mode='r', overrides=None):
+  """ Map the first record of a benchmark's input, check or output data. """
+  layout = Layout(find_header(bench_dir), overrides)
+  return open_data(os.path.join(bench_dir, name), layout, mode)[0]
+
+def main():
+  import argparse
+  parser = argparse.ArgumentParser(description='Print the bench_args_t '
+    'layout of benchmarks and check their data files against it.')
+  parser.add_argument('bench_dirs', nargs='+', help='Benchmark directories, '
+    'e.g. bfs/bulk.')
+  args = parser.parse_args()
+
+  status = 0
+  for bench_dir in args.bench_dirs:
+    try:
+      layout = Layout(find_header(bench_dir))
+    except LayoutError as e:
+      print('%s: %s' % (bench_dir, e))
+      status = 1
+      continue
+    print('%s (%s)' % (bench_dir, os.path.basename(layout.header)))
+    print(layout.describe())
+    for name in ('input.data', 'check.data', 'output.data'):
+      path = os.path.join(bench_dir, name)
+      if os.path.exists(path):
+        size = os.path.getsize(path)
+        (count, extra) = divmod(size, layout.dtype.itemsize)
+        print('%8s %10d  %s: %d record(s)%s' % ('', size, name, count,
+          ', %d trailing bytes' % extra if extra else ''))
+        if extra or not count:
+          status = 1
+  sys.exit(status)
+
+if __name__ == '__main__':
+  main()
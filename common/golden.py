@@ -0,0 +1,481 @@
+#!/usr/bin/env python
+
+# Reference implementations of the MachSuite kernels in NumPy, to build
+# check.data for inputs of any size without compiling or running the kernels.
+#
+# Each reference reads a copy of an input record through bench_layout and
+# fills in what the kernel writes to it, so the result is a whole struct
+# bench_args_t, as harness.c dumps it. Integer kernels, and floating-point
+# kernels whose operations can be replayed in the kernel's order (spmv, md,
+# stencils, viterbi), produce the same bytes as the C code; gemm on
+# floating-point types and fft use NumPy's own summation order and match
+# within the tolerances of verify_outputs.py. Sizes come from the #defines of
+# the benchmark header, so inputs generated at another scale need the same
+# --define overrides they were generated with.
+#
+# aes, backprop and kmp have no reference here.
+#
+# Usage:
+#   python common/golden.py gemm/ncubed md/knn        # compare with check.data
+#   python common/golden.py --write bfs/bulk          # rewrite check.data
+#   python common/golden.py --write spmv/crs --define N=100000 --define NNZ=1200000
+
+import argparse
+import os
+import sys
+import numpy as np
+
+from bench_layout import Layout, LayoutError, create_data, find_header, open_data
+from verify_outputs import (TOLERANCES, _field, bench_name, compare_field,
+  leaf_fields)
+
+class GoldenError(Exception):
+  pass
+
+# Benchmark name -> reference. A reference takes the layout and a 0-d view of
+# one record, and updates the record in place as the kernel would.
+KERNELS = {}
+
+def reference(*names):
+  def register(f):
+    for name in names:
+      KERNELS[name] = f
+    return f
+  return register
+
+def _acc(dtype):
+  # Integer arithmetic is done in 64 bits and truncated back, which wraps
+  # exactly like C's 32-bit arithmetic for +, - and *.
+  return np.int64 if np.issubdtype(dtype, np.integer) else dtype
+
+def _store(field, values):
+  field[...] = values.astype(field.dtype)
+
+########################################
+# gemm
+
+@reference('gemm/ncubed')
+def gemm_ncubed(layout, rec):
+  (rows, cols) = (layout.value('row_size'), layout.value('col_size'))
+  acc = _acc(rec['prod'].dtype)
+  m1 = rec['m1'].reshape(rows, cols)[:, :rows].astype(acc)
+  m2 = rec['m2'].reshape(rows, cols).astype(acc)
+  _store(rec['prod'], np.dot(m1, m2).reshape(-1))
+
+@reference('gemm/blocked')
+def gemm_blocked(layout, rec):
+  # The blocked kernel accumulates into prod, and needs a square matrix.
+  n = layout.value('row_size')
+  acc = _acc(rec['prod'].dtype)
+  m1 = rec['m1'].reshape(n, n).astype(acc)
+  m2 = rec['m2'].reshape(n, n).astype(acc)
+  prod = rec['prod'].reshape(n, n).astype(acc)
+  _store(rec['prod'], (prod + np.dot(m1, m2)).reshape(-1))
+
+########################################
+# spmv
+
+@reference('spmv/crs')
+def spmv_crs(layout, rec):
+  (val, cols, vec) = (rec['val'], rec['cols'], rec['vec'])
+  delimiters = rec['rowDelimiters'].astype(np.int64)
+  begin = delimiters[:-1]
+  length = delimiters[1:] - begin
+  # Rows by decreasing length, so that the rows with a p-th element are a
+  # prefix; each row still sums its elements in order.
+  order = np.argsort(-length, kind='stable')
+  descending = -length[order]
+  sums = np.zeros(len(length), dtype=rec['out'].dtype)
+  for p in range(length.max() if len(length) else 0):
+    rows = order[:np.searchsorted(descending, -p, side='left')]
+    e = begin[rows] + p
+    sums[rows] = sums[rows] + val[e]*vec[cols[e]]
+  rec['out'][...] = sums
+
+@reference('spmv/ellpack')
+def spmv_ellpack(layout, rec):
+  n = layout.value('N')
+  nzval = rec['nzval'].reshape(n, -1)
+  cols = rec['cols'].reshape(n, -1)
+  vec = rec['vec']
+  out = rec['out'].copy()
+  for j in range(nzval.shape[1]):
+    out = out + nzval[:, j]*vec[cols[:, j]]
+  rec['out'][...] = out
+
+########################################
+# stencil
+
+@reference('stencil/stencil2d')
+def stencil2d(layout, rec):
+  (rows, cols) = (layout.value('row_size'), layout.value('col_size'))
+  acc = _acc(rec['sol'].dtype)
+  orig = rec['orig'].reshape(rows, cols).astype(acc)
+  fil = rec['filter'].reshape(3, 3).astype(acc)
+  temp = np.zeros((rows-2, cols-2), dtype=acc)
+  for k1 in range(3):
+    for k2 in range(3):
+      temp = temp + fil[k1, k2]*orig[k1:k1+rows-2, k2:k2+cols-2]
+  sol = rec['sol'].reshape(rows, cols)
+  _store(sol[:rows-2, :cols-2], temp)
+
+@reference('stencil/stencil3d')
+def stencil3d(layout, rec):
+  (height, cols, rows) = (layout.value('height_size'),
+                          layout.value('col_size'), layout.value('row_size'))
+  acc = _acc(rec['sol'].dtype)
+  orig = rec['orig'].astype(acc)
+  (c0, c1) = (acc(rec['C0']), acc(rec['C1']))
+  # indx(row_size, col_size, i, j, k) mixes up the dimensions, so the interior
+  # points overlap; each value only depends on its flat index, though.
+  (i, j, k) = np.ix_(np.arange(1, height-1), np.arange(1, cols-1),
+                     np.arange(1, rows-1))
+  idx = (i + rows*(j + cols*k)).reshape(-1)
+  (dk, dj) = (rows*cols, rows)
+  if len(idx) and (idx.min()-dk < 0 or idx.max()+dk >= orig.size):
+    raise GoldenError('stencil3d reads outside orig with these sizes')
+  sum0 = orig[idx]
+  sum1 = (orig[idx+dk] + orig[idx-dk] + orig[idx+dj] + orig[idx-dj] +
+          orig[idx+1] + orig[idx-1])
+  rec['sol'][idx] = (sum1*c1 - sum0*c0).astype(rec['sol'].dtype)
+
+########################################
+# fft
+
+def _bit_reverse(n):
+  bits = n.bit_length()-1
+  index = np.arange(n)
+  rev = np.zeros(n, dtype=np.int64)
+  for b in range(bits):
+    rev |= ((index >> b) & 1) << (bits-1-b)
+  return rev
+
+@reference('fft/strided')
+def fft_strided(layout, rec):
+  # The kernel leaves the transform in bit-reversed order. It uses the
+  # twiddle factors of the input, which generate.c fills with the standard
+  # ones.
+  n = layout.value('size')
+  if n & (n-1):
+    raise GoldenError('fft/strided needs a power-of-two size, not %d' % n)
+  x = np.fft.fft(rec['real'] + 1j*rec['img'])[_bit_reverse(n)]
+  rec['real'][...] = x.real
+  rec['img'][...] = x.imag
+
+@reference('fft/transpose')
+def fft_transpose(layout, rec):
+  x = np.fft.fft(rec['work_x'] + 1j*rec['work_y'])
+  rec['work_x'][...] = x.real
+  rec['work_y'][...] = x.imag
+
+########################################
+# sort
+
+@reference('sort/merge')
+def sort_merge(layout, rec):
+  n = layout.value('size')
+  if n & (n-1):
+    raise GoldenError('sort/merge only sorts power-of-two sizes, not %d' % n)
+  rec['a'][...] = np.sort(rec['a'], kind='stable')
+
+@reference('sort/radix')
+def sort_radix(layout, rec):
+  # Each pass is a stable sort by (digit, block); a and b end up holding the
+  # last two passes, and bucket and sum what the last pass left in them.
+  (n, blocks) = (layout.value('N'), layout.value('NUMOFBLOCKS'))
+  per_block = layout.value('ELEMENTSPERBLOCK')
+  buckets = layout.value('BUCKETSIZE')
+  scan_block = layout.value('SCAN_BLOCK')
+  if per_block != 4 or blocks*per_block != n:
+    raise GoldenError('sort/radix needs N = 4*NUMOFBLOCKS')
+  block = np.arange(n) // per_block
+  (src, last) = (rec['a'].copy(), None)
+  for exp in range(0, 32, 2):
+    slot = ((src.view(np.uint32) >> exp) & 3).astype(np.int64)*blocks + block
+    (src, last) = (src[np.argsort(slot, kind='stable')], src)
+  # hist() counts slot s in bucket s+1; the count of the last slot lands in
+  # sum[0], which sum_scan() overwrites.
+  hist = np.bincount(slot+1, minlength=buckets+1)[:buckets]
+  totals = hist.reshape(-1, scan_block).sum(axis=1)
+  rec['a'][...] = src
+  rec['b'][...] = last
+  _store(rec['bucket'], np.cumsum(hist) + np.bincount(slot, minlength=buckets))
+  _store(rec['sum'], np.concatenate(([0], np.cumsum(totals)[:-1])))
+
+########################################
+# nw
+
+@reference('nw/nw')
+def nw(layout, rec):
+  (n, m) = (layout.value('N'), layout.value('M'))
+  (seq_a, seq_b) = (rec['seqA'], rec['seqB'])
+  a = rec['A'].reshape(m+1, n+1).astype(np.int64)
+  ptr = rec['ptr'].reshape(m+1, n+1)
+  steps = np.arange(n+1)
+  for i in range(1, m+1):
+    score = np.where(seq_a[:n]==seq_b[i-1], 1, -1)
+    choice1 = a[i-1, :-1] + score
+    choice2 = a[i-1, 1:] - 1
+    # A[i][j] = max(choice1, choice2, A[i][j-1] - 1) is a running maximum of
+    # max(choice1, choice2)[t] + t, less j.
+    best = np.maximum(choice1, choice2) + steps[1:]
+    row = np.maximum.accumulate(np.concatenate(([a[i, 0]], best))) - steps
+    a[i, 1:] = row[1:]
+    ptr[i, 1:] = np.where(row[1:]==choice1, 0,
+                          np.where(row[1:]==choice2, 1, -1))
+  _store(rec['A'], a.reshape(-1))
+  _nw_traceback(layout, rec, m)
+
+def _nw_traceback(layout, rec, m):
+  # The traceback indexes ptr with i + j*M and reads SEQA[i] and SEQB[j],
+  # past the ends of the sequences, so it is replayed on the bytes of the
+  # record in which those reads land.
+  raw = rec.reshape(1).view(np.int8)
+  offset = dict((name, layout.dtype.fields[name][1])
+                for name in ('seqA', 'seqB', 'alignedA', 'alignedB', 'ptr'))
+  gap = ord('X')
+  def at(name, index):
+    address = offset[name] + index
+    if not 0 <= address < len(raw):
+      raise GoldenError('nw traceback reads %s[%d], outside the record' %
+                        (name, index))
+    return address
+  (i, j, t) = (m, layout.value('N'), 0)
+  while i>0 or j>0:
+    p = raw[at('ptr', i + j*m)]
+    raw[at('alignedA', t)] = raw[at('seqA', i)] if p in (0, 1) else gap
+    raw[at('alignedB', t)] = gap if p==1 else raw[at('seqB', j)]
+    if p in (0, 1):
+      i -= 1
+    if p!=1:
+      j -= 1
+    t += 1
+
+########################################
+# viterbi
+
+@reference('viterbi/viterbi')
+def viterbi(layout, rec):
+  (states, obs) = (layout.value('numStates'), layout.value('numObs'))
+  observed = rec['Obs']
+  if observed.min()<0 or observed.max()>=obs:
+    raise GoldenError('viterbi observations must be below numObs')
+  trans = rec['transMat'].reshape(states, obs)[:, :states]
+  lik = rec['obsLik'].reshape(states, obs)
+  v = rec['v']
+  v[0] = 1.0
+  rows = np.arange(states)*obs
+  for i in range(obs):
+    # temp[j, k], multiplied left to right in single precision like the C.
+    temp = (v[rows+i][:, None]*trans)*lik[:, observed[i]][None, :]
+    target = rows + i + 1
+    # For the last observation, the write of the last state falls past v.
+    keep = target<v.size
+    target = target[keep]
+    v[target] = np.maximum(v[target], temp.max(axis=0)[keep])
+
+########################################
+# md
+
+@reference('md/knn')
+def md_knn(layout, rec):
+  (atoms, neighbors) = (layout.value('nAtoms'), layout.value('maxNeighbors'))
+  (lj1, lj2) = (layout.value('lj1'), layout.value('lj2'))
+  pos = [rec['position_'+c] for c in 'xyz']
+  nl = rec['NL'].reshape(atoms, neighbors).astype(np.int64)
+  force = [np.zeros(atoms) for c in 'xyz']
+  for j in range(neighbors):
+    delta = [p - p[nl[:, j]] for p in pos]
+    r2inv = 1.0/(delta[0]*delta[0] + delta[1]*delta[1] + delta[2]*delta[2])
+    r6inv = r2inv*r2inv*r2inv
+    potential = r6inv*(lj1*r6inv - lj2)
+    f = r2inv*potential
+    force = [s + d*f for (s, d) in zip(force, delta)]
+  for (c, s) in zip('xyz', force):
+    rec['d_force_'+c][...] = s
+
+@reference('md/grid')
+def md_grid(layout, rec):
+  # Every point p of every block is updated at once; the neighbor blocks and
+  # their points q are visited in the order of the kernel's loops.
+  side = layout.value('blockSide')
+  (lj1, lj2) = (layout.value('lj1'), layout.value('lj2'))
+  n_points = rec['n_points']
+  position = rec['position']
+  density = position.shape[-1]
+  p = [position[c] for c in 'xyz']
+  sums = [rec['d_force'][c].copy() for c in 'xyz']
+  active = np.arange(density) < n_points[..., None]
+  grid = np.arange(side)
+  for ox in (-1, 0, 1):
+    for oy in (-1, 0, 1):
+      for oz in (-1, 0, 1):
+        b1 = [grid+o for o in (ox, oy, oz)]
+        inside = [(b>=0) & (b<side) for b in b1]
+        b1 = np.ix_(*[np.clip(b, 0, side-1) for b in b1])
+        inside = (inside[0][:, None, None] & inside[1][None, :, None] &
+                  inside[2][None, None, :])
+        q_count = np.where(inside, n_points[b1], 0)
+        for q_idx in range(density):
+          q = [position[c][b1 + (q_idx,)][..., None] for c in 'xyz']
+          use = (active & (q_idx < q_count)[..., None] &
+                 ((q[0]!=p[0]) | (q[1]!=p[1]) | (q[2]!=p[2])))
+          if not use.any():
+            continue
+          with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            d = [a - b for (a, b) in zip(p, q)]
+            r2inv = 1.0/(d[0]*d[0] + d[1]*d[1] + d[2]*d[2])
+            r6inv = r2inv*r2inv*r2inv
+            potential = r6inv*(lj1*r6inv - lj2)
+            f = r2inv*potential
+            sums = [np.where(use, s + f*dc, s) for (s, dc) in zip(sums, d)]
+  for (c, s) in zip('xyz', sums):
+    rec['d_force'][c][...] = s
+
+########################################
+# bfs
+
+def _neighbors(nodes, edges, frontier):
+  begin = nodes['edge_begin'][frontier].astype(np.int64)
+  degree = nodes['edge_end'][frontier].astype(np.int64) - begin
+  degree = np.maximum(degree, 0)
+  first = np.cumsum(degree) - degree
+  e = np.repeat(begin - first, degree) + np.arange(degree.sum())
+  return edges['dst'][e].astype(np.int64)
+
+def _bfs_start(rec):
+  level = rec['level']
+  start = int(rec['starting_node'])
+  level[start] = 0
+  rec['level_counts'][0] = 1
+  return (level, start, rec['level_counts'], np.iinfo(level.dtype).max)
+
+@reference('bfs/bulk')
+def bfs_bulk(layout, rec):
+  (level, start, counts, unmarked) = _bfs_start(rec)
+  for horizon in range(len(counts)):
+    if horizon+1 >= len(counts):
+      raise GoldenError('bfs/bulk needs more than N_LEVELS=%d levels' %
+                        len(counts))
+    frontier = np.flatnonzero(level==horizon)
+    found = _neighbors(rec['nodes'], rec['edges'], frontier)
+    found = np.unique(found[level[found]==unmarked])
+    level[found] = horizon+1
+    counts[horizon+1] = len(found)
+    if not len(found):
+      break
+
+@reference('bfs/queue')
+def bfs_queue(layout, rec):
+  # The queue visits the graph level by level, from the start node only.
+  (level, start, counts, unmarked) = _bfs_start(rec)
+  frontier = np.array([start])
+  depth = 0
+  while len(frontier):
+    found = _neighbors(rec['nodes'], rec['edges'], frontier)
+    (found, first) = np.unique(found[level[found]==unmarked], return_index=True)
+    if not len(found):
+      break
+    depth += 1
+    if depth >= len(counts):
+      raise GoldenError('bfs/queue needs more than N_LEVELS=%d levels' %
+                        len(counts))
+    level[found] = depth
+    counts[depth] += len(found)
+    # Keep the queue order, although the levels do not depend on it.
+    frontier = found[np.argsort(first, kind='stable')]
+
+########################################
+
+def run_reference(name, layout, inputs):
+  """ Run the reference of a benchmark on input records.
+
+  Args:
+    name: Benchmark name, e.g. gemm/ncubed.
+    inputs: Array of bench_args_t records, e.g. an open input.data.
+
+  Returns:
+    A new array holding the records as the kernel leaves them.
+  """
+  if name not in KERNELS:
+    raise GoldenError('no reference for %s' % name)
+  outputs = np.array(inputs)
+  for r in range(len(outputs)):
+    KERNELS[name](layout, outputs[r:r+1].reshape(()))
+  return outputs
+
+def compare(outputs, checks, layout, tolerance):
+  """ (record, FieldResult) of the fields of outputs that differ from checks. """
+  failures = []
+  for r in range(len(outputs)):
+    for (name, path) in leaf_fields(layout.dtype):
+      result = compare_field(name, _field(outputs[r], path),
+                             _field(checks[r], path), tolerance)
+      if result.mismatches:
+        failures.append((r, result))
+  return failures
+
+def main():
+  parser = argparse.ArgumentParser(description='Compute benchmark results '
+    'with NumPy reference implementations, and compare them with check.data '
+    'or write check.data.')
+  parser.add_argument('bench_dirs', nargs='+', help='Benchmark directories, '
+    'e.g. gemm/ncubed.')
+  parser.add_argument('--write', action='store_true', help='Write check.data '
+    'instead of comparing with it.')
+  parser.add_argument('--input', help='Input file. Defaults to input.data in '
+    'the benchmark directory; only one benchmark may be given with this '
+    'option.')
+  parser.add_argument('--check', help='Check file to compare with or write. '
+    'Defaults to check.data in the benchmark directory.')
+  parser.add_argument('--benchmark', help='Benchmark whose reference runs, '
+    'e.g. md/knn, for copies of a benchmark directory. Defaults to the last '
+    'two components of the directory.')
+  parser.add_argument('--records', type=int, help='Records of the input to '
+    'run. Defaults to as many as check.data holds, or all of them with '
+    '--write.')
+  parser.add_argument('--define', action='append', default=[],
+    metavar='NAME=VALUE', help='Override a #define of the benchmark header, '
+    'for inputs generated at another size.')
+  args = parser.parse_args()
+  if (args.input or args.check or args.benchmark) and len(args.bench_dirs)>1:
+    parser.error('--input, --check and --benchmark need a single benchmark '
+                 'directory')
+  overrides = dict(d.split('=', 1) for d in args.define)
+
+  failed = 0
+  for bench_dir in args.bench_dirs:
+    name = args.benchmark or bench_name(bench_dir)
+    input_path = args.input or os.path.join(bench_dir, 'input.data')
+    check_path = args.check or os.path.join(bench_dir, 'check.data')
+    try:
+      layout = Layout(find_header(bench_dir), overrides)
+      inputs = open_data(input_path, layout)
+      checks = None if args.write else open_data(check_path, layout)
+      count = args.records or (len(inputs) if checks is None else len(checks))
+      if count > len(inputs):
+        raise LayoutError('%s holds %d records, not %d' %
+                          (input_path, len(inputs), count))
+      outputs = run_reference(name, layout, inputs[:count])
+    except (GoldenError, LayoutError, IOError, OSError, ValueError) as e:
+      print('ERROR %s: %s' % (name, e))
+      failed += 1
+      continue
+    if args.write:
+      create_data(check_path, layout, count)[:] = outputs
+      print('WROTE %s (%d record%s)' % (check_path, count, 's'*(count!=1)))
+      continue
+    (atol, rtol) = TOLERANCES.get(name, (0.0, 0.0))
+    failures = compare(outputs, checks, layout, (atol, rtol))
+    if failures:
+      failed += 1
+      print('FAIL %s' % name)
+      multi = len(set(r for (r, _) in failures))>1 or failures[0][0]>0
+      for (r, result) in failures:
+        print(result.describe(r if multi else None))
+    else:
+      print('PASS %s' % name)
+  sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+  main()
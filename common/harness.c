@@ -4,77 +4,203 @@
 #include <unistd.h>
 #include <fcntl.h>
 #include <assert.h>
+#include <time.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
 extern int INPUT_SIZE;
 void run_benchmark( void *args );
 
 //#define CHECK_OUTPUT
 
+// Map the first INPUT_SIZE bytes of a data file, read-only.
+static char *map_data(char *file)
+{
+  int fd, status;
+  struct stat st;
+  char *data;
+
+  fd = open( file, O_RDONLY );
+  assert( fd>=0 && "Couldn't open data file" );
+  status = fstat(fd, &st);
+  assert( status==0 && "Couldn't stat data file" );
+  assert( st.st_size>=INPUT_SIZE && "Data file is smaller than bench_args_t" );
+  data = mmap( NULL, INPUT_SIZE, PROT_READ, MAP_PRIVATE, fd, 0 );
+  assert( data!=MAP_FAILED && "Couldn't map data file" );
+  close(fd);
+  return data;
+}
+
+static long long elapsed_ns(struct timespec *start, struct timespec *end)
+{
+  return (end->tv_sec-start->tv_sec)*1000000000LL + (end->tv_nsec-start->tv_nsec);
+}
+
+static FILE *open_stream(char *file, char *mode, FILE *std)
+{
+  FILE *f;
+  if( !strcmp(file, "-") )
+    return std;
+  f = fopen(file, mode);
+  assert( f!=NULL && "Couldn't open data stream" );
+  return f;
+}
+
+// Process every record of a stream of concatenated bench_args_t, in order.
+// "-" reads from stdin or writes to stdout. Returns the number of records.
+static int run_batch(char *in_file, char *out_file, char *check_file)
+{
+  FILE *in, *out=NULL, *check=NULL;
+  char *input, *expected=NULL;
+  size_t n;
+  int status, records, failures;
+  long long kernel_ns;
+  struct timespec start, end;
+
+  in = open_stream(in_file, "rb", stdin);
+  setvbuf(in, NULL, _IOFBF, 1<<20);
+  if( out_file!=NULL ) {
+    out = open_stream(out_file, "wb", stdout);
+    setvbuf(out, NULL, _IOFBF, 1<<20);
+  }
+  if( check_file!=NULL ) {
+    check = open_stream(check_file, "rb", stdin);
+    expected = malloc(INPUT_SIZE);
+    assert( expected!=NULL && "Out of memory" );
+  }
+  input = malloc(INPUT_SIZE);
+  assert( input!=NULL && "Out of memory" );
+
+  records = 0;
+  failures = 0;
+  kernel_ns = 0;
+  while( (n=fread(input, 1, INPUT_SIZE, in))==INPUT_SIZE ) {
+    clock_gettime(CLOCK_MONOTONIC, &start);
+    run_benchmark( input );
+    clock_gettime(CLOCK_MONOTONIC, &end);
+    kernel_ns += elapsed_ns(&start, &end);
+    if( out!=NULL ) {
+      n = fwrite(input, 1, INPUT_SIZE, out);
+      assert( n==INPUT_SIZE && "Couldn't write output data" );
+    }
+    if( check!=NULL ) {
+      n = fread(expected, 1, INPUT_SIZE, check);
+      assert( n==INPUT_SIZE && "Check data has fewer records than the input" );
+      if( memcmp(input, expected, INPUT_SIZE) ) {
+        fprintf(stderr, "Record %d: results are incorrect\n", records);
+        ++failures;
+      }
+    }
+    ++records;
+  }
+  assert( n==0 && "Input ends with a partial record" );
+  assert( !ferror(in) && "Couldn't read input data" );
+  if( out!=NULL ) {
+    status = fflush(out);
+    assert( status==0 && "Couldn't write output data" );
+  }
+
+  // Statistics go to stderr, since the output may be streamed to stdout.
+  fprintf(stderr, "Records: %d\n", records);
+  fprintf(stderr, "Kernel time: %lld ns\n", kernel_ns);
+  if( kernel_ns>0 )
+    fprintf(stderr, "Throughput: %.1f records/s\n", records*1e9/kernel_ns);
+  assert( failures==0 && "Benchmark results are incorrect" );
+  return records;
+}
+
 int main(int argc, char **argv)
 {
   int status;
-  int in_fd;
+  int opt;
   char *in_file;
+  char *out_file;
+  char *pristine;
   char *input;
   #ifdef CHECK_OUTPUT
-  int check_fd;
   char *check_file;
   char *check;
   #endif
-  int n;
+  int i, iterations, timed, batch;
+  struct timespec start, end;
 
-  //assert( argc==3 && "Usage: ./benchmark <input_file> <check_file>" );
   in_file = "input.data";
+  out_file = "output.data";
   #ifdef CHECK_OUTPUT
   check_file = "check.data";
   #endif
-  if( argc>1 )
-    in_file = argv[1];
+  iterations = 1;
+  timed = 0;
+  batch = 0;
+  while( (opt=getopt(argc, argv, "r:o:nb"))!=-1 ) {
+    switch(opt) {
+      case 'r': // Time this many calls, each on a fresh copy of the input
+        iterations = atoi(optarg);
+        timed = 1;
+        break;
+      case 'o':
+        out_file = optarg;
+        break;
+      case 'n': // Don't write the output
+        out_file = NULL;
+        break;
+      case 'b': // Process every record of the input
+        batch = 1;
+        break;
+      default:
+        fprintf(stderr, "Usage: %s [-r iterations | -b] [-o output_file | -n] [input_file [check_file]]\n", argv[0]);
+        return 1;
+    }
+  }
+  assert( iterations>0 && "Need at least one iteration" );
+  if( optind<argc )
+    in_file = argv[optind];
   #ifdef CHECK_OUTPUT
-  if( argc>2 )
-    check_file = argv[2];
+  if( optind+1<argc )
+    check_file = argv[optind+1];
   #endif
 
-  // Load input data
+  if( batch ) {
+    assert( !timed && "-r and -b are exclusive" );
+    #ifdef CHECK_OUTPUT
+    run_batch(in_file, out_file, check_file);
+    #else
+    run_batch(in_file, out_file, NULL);
+    #endif
+    fprintf(stderr, "Success.\n");
+    return 0;
+  }
+
+  // Load input data. The mapping stays pristine; each call gets a copy.
+  pristine = map_data(in_file);
   input = malloc(INPUT_SIZE);
   assert( input!=NULL && "Out of memory" );
-  in_fd = open( in_file, O_RDONLY );
 
-  n = 0;
-  while(n<INPUT_SIZE) {
-    status = read(in_fd, &input[n], INPUT_SIZE-n);
-    assert( status>=0 && "Failed to read input" );
-    n += status;
+  for( i=0; i<iterations; i++ ) {
+    memcpy(input, pristine, INPUT_SIZE);
+    clock_gettime(CLOCK_MONOTONIC, &start);
+    // Unpack and call
+    run_benchmark( input );
+    clock_gettime(CLOCK_MONOTONIC, &end);
+    if( timed )
+      printf("Iteration %d: %lld ns\n", i, elapsed_ns(&start, &end));
   }
-  close(in_fd);
-
-  //run_benchmark( input );
-  // Unpack and call
-  run_benchmark( input );
-  //#if WRITE_OUTPUT
-  //FIXME: Maybe remove this.
-  int out_fd, written=0;
-  char *ptr = input;
-  out_fd = open("output.data", O_WRONLY|O_CREAT|O_TRUNC, S_IRUSR|S_IWUSR|S_IRGRP|S_IWGRP|S_IROTH|S_IWOTH);
-  assert( out_fd>0 && "Couldn't open output data file" );
-  while( written<INPUT_SIZE ) {
-    status = write( out_fd, ptr, INPUT_SIZE-written );
-    assert( status>=0 && "Couldn't write output data file" );
-    written += status;
+
+  if( out_file!=NULL ) {
+    int out_fd, written=0;
+    char *ptr = input;
+    out_fd = open(out_file, O_WRONLY|O_CREAT|O_TRUNC, S_IRUSR|S_IWUSR|S_IRGRP|S_IWGRP|S_IROTH|S_IWOTH);
+    assert( out_fd>0 && "Couldn't open output data file" );
+    while( written<INPUT_SIZE ) {
+      status = write( out_fd, ptr+written, INPUT_SIZE-written );
+      assert( status>=0 && "Couldn't write output data file" );
+      written += status;
+    }
+    close(out_fd);
   }
-  //#endif
 
   // Load check data
   #ifdef CHECK_OUTPUT
-  check = malloc(INPUT_SIZE);
-  assert( check!=NULL && "Out of memory" );
-  check_fd = open( check_file, O_RDONLY );
-  n = 0;
-  while(n<INPUT_SIZE) {
-    status = read(check_fd, &check[n], INPUT_SIZE-n);
-    assert( status>=0 && "Failed to read input" );
-    n += status;
-  }
-  close(check_fd);
+  check = map_data(check_file);
 
   // Validate benchmark results
   assert( !memcmp(input,check,INPUT_SIZE) && "Benchmark results are incorrect" );
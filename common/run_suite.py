@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+
+# Builds and times the MachSuite kernels on the host CPU.
+#
+# Each benchmark is built with the given CFLAGS and run once with harness.c
+# calling the kernel repeatedly on fresh copies of its input: a few untimed
+# calls warm the caches, and the rest are timed in-process, so the times are
+# those of the kernel alone, without process startup or file I/O. The
+# per-benchmark median, 95th
+# percentile and standard deviation are written as JSON. Given the JSON of an
+# earlier run as a baseline, benchmarks whose times have increased
+# significantly, by a one-sided Mann-Whitney U test, are reported as
+# regressions.
+#
+# Benchmarks with a multithreaded variant (a <program>_omp target in their
+# Makefile, built with OpenMP) can also be timed with several numbers of
+# threads; those results are keyed <benchmark>:omp<threads> and carry their
+# speedup over the single-threaded kernel.
+#
+# Usage:
+#   python common/run_suite.py --output base.json
+#   python common/run_suite.py --cflags "-O2" --baseline base.json
+#   python common/run_suite.py --threads 1,2,4,8 gemm/blocked spmv/crs
+
+import argparse
+import json
+import math
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+
+from bench_layout import Layout, LayoutError, find_header
+from verify_outputs import TOLERANCES, bench_name, verify
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CFLAGS = '-O3 -Wall -Wno-unused-label'
+WARMUP = 2
+REPEAT = 10
+ALPHA = 0.05     # significance level of the regression test
+THRESHOLD = 0.02 # smallest relative slowdown of the median reported
+
+timer = getattr(time, 'perf_counter', time.time)
+
+def suite_benchmarks():
+  """ The BENCHMARKS list of the top-level Makefile. """
+  with open(os.path.join(ROOT, 'Makefile')) as f:
+    m = re.search(r'^BENCHMARKS\s*=((?:.*\\\n)*.*)$', f.read(), flags=re.M)
+  return m.group(1).replace('\\', ' ').split()
+
+def executable(bench_dir):
+  """ The program built by a benchmark's Makefile: its first target. """
+  with open(os.path.join(bench_dir, 'Makefile')) as f:
+    for line in f:
+      m = re.match(r'^(\w+)\s*:', line)
+      if m:
+        return m.group(1)
+  raise ValueError('%s/Makefile has no targets' % bench_dir)
+
+def variant(bench_dir, program, suffix='omp'):
+  """ The program of a variant of a benchmark, e.g. bbgemm_omp, or None if
+  its Makefile has no target for it. """
+  target = '%s_%s' % (program, suffix)
+  with open(os.path.join(bench_dir, 'Makefile')) as f:
+    if re.search(r'^%s\s*:' % re.escape(target), f.read(), flags=re.M):
+      return target
+  return None
+
+def build(bench_dir, cflags, targets=()):
+  # Rebuild from scratch: make does not know that CFLAGS changed.
+  with open(os.devnull, 'w') as null:
+    subprocess.check_call(['make', '-C', bench_dir, 'clean'], stdout=null)
+    subprocess.check_call(['make', '-C', bench_dir, 'CFLAGS='+cflags] +
+                          list(targets), stdout=null)
+
+def run_iterations(bench_dir, program, iterations, threads=None):
+  """ Seconds taken by each of a number of calls to a benchmark's kernel.
+
+  The benchmark runs from its directory and writes output.data there, as
+  it is after the last call. threads sets OMP_NUM_THREADS.
+  """
+  env = None
+  if threads:
+    env = dict(os.environ, OMP_NUM_THREADS=str(threads))
+  proc = subprocess.Popen(['./'+program, '-r', str(iterations), 'input.data',
+                           'check.data'], cwd=bench_dir, stdout=subprocess.PIPE,
+                          env=env)
+  out = proc.communicate()[0].decode('utf-8', 'replace')
+  if proc.returncode:
+    raise RuntimeError('%s exited with status %d' % (program, proc.returncode))
+  times = [int(ns)*1e-9 for ns in re.findall(r'^Iteration \d+: (\d+) ns$', out,
+                                             flags=re.M)]
+  if len(times)!=iterations:
+    raise RuntimeError('%s reported %d of %d iterations; is it built with the '
+                       'current harness.c?' % (program, len(times), iterations))
+  return times
+
+def percentile(values, q):
+  """ Linearly interpolated percentile, q in [0, 100]. """
+  values = sorted(values)
+  pos = (len(values)-1) * q / 100.0
+  lo = int(math.floor(pos))
+  hi = min(lo+1, len(values)-1)
+  return values[lo] + (values[hi]-values[lo]) * (pos-lo)
+
+def summarize(samples):
+  n = len(samples)
+  mean = sum(samples) / float(n)
+  var = sum((x-mean)**2 for x in samples) / (n-1) if n>1 else 0.0
+  return {'samples': samples, 'mean': mean, 'median': percentile(samples, 50),
+          'p95': percentile(samples, 95), 'stddev': math.sqrt(var),
+          'min': min(samples), 'max': max(samples)}
+
+def mann_whitney_greater(a, b):
+  """ One-sided Mann-Whitney U test that samples a tend to exceed samples b.
+
+  Uses the normal approximation with a tie correction, which is adequate
+  from about eight samples per side.
+
+  Returns:
+    (U statistic of a, p-value)
+  """
+  (n1, n2) = (len(a), len(b))
+  ranked = sorted([(x, 0) for x in a] + [(x, 1) for x in b])
+  ranks = [0.0]*len(ranked)
+  ties = 0.0
+  i = 0
+  while i<len(ranked):
+    j = i
+    while j+1<len(ranked) and ranked[j+1][0]==ranked[i][0]:
+      j += 1
+    for k in range(i, j+1):
+      ranks[k] = (i+j)/2.0 + 1
+    t = j-i+1
+    ties += t**3 - t
+    i = j+1
+  r1 = sum(r for (r, (_, side)) in zip(ranks, ranked) if side==0)
+  u1 = r1 - n1*(n1+1)/2.0
+  n = n1+n2
+  mu = n1*n2/2.0
+  sigma = math.sqrt(n1*n2/12.0 * ((n+1) - ties/(n*(n-1))))
+  if sigma==0:
+    return (u1, 0.5 if u1==mu else (0.0 if u1>mu else 1.0))
+  z = (u1 - mu - 0.5) / sigma # continuity correction
+  return (u1, 0.5*math.erfc(z/math.sqrt(2)))
+
+def compare(results, baseline, alpha=ALPHA, threshold=THRESHOLD):
+  """ Compare per-benchmark results with a baseline.
+
+  Returns:
+    A list of (benchmark, change of the median, p-value, regressed) for the
+    benchmarks present in both.
+  """
+  rows = []
+  for (name, result) in sorted(results.items()):
+    base = baseline.get(name)
+    if not base:
+      continue
+    change = result['median'] / base['median'] - 1
+    (_, p) = mann_whitney_greater(result['samples'], base['samples'])
+    rows.append((name, change, p, p<alpha and change>threshold))
+  return rows
+
+def compiler_version():
+  try:
+    out = subprocess.check_output([os.environ.get('CC', 'cc'), '--version'])
+    return out.decode('utf-8', 'replace').splitlines()[0]
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+def run_suite(benchmarks, cflags=CFLAGS, warmup=WARMUP, repeat=REPEAT,
+              check=True, build_first=True, log=sys.stderr, threads=()):
+  """ Build, warm up, time and optionally verify benchmarks.
+
+  Args:
+    threads: Numbers of threads to time the OpenMP variants of the benchmarks
+      that have one with.
+
+  Returns:
+    A dict mapping benchmark names to their summarize()d times, with
+    "verified" set to whether the last output matched check.data. OpenMP
+    variants are under <benchmark>:omp<threads>, with "threads" and
+    "speedup" over the benchmark's own median.
+  """
+  results = {}
+  for name in benchmarks:
+    bench_dir = os.path.join(ROOT, name)
+    program = executable(bench_dir)
+    parallel = variant(bench_dir, program) if threads else None
+    if build_first:
+      build(bench_dir, cflags, [program, parallel] if parallel else [])
+    runs = [(name, program, None)]
+    if parallel:
+      runs += [('%s:omp%d' % (name, t), parallel, t) for t in threads]
+    for (key, run, t) in runs:
+      samples = run_iterations(bench_dir, run, warmup+repeat, t)[warmup:]
+      results[key] = summarize(samples)
+      speedup = ''
+      if t:
+        results[key]['threads'] = t
+        results[key]['speedup'] = (results[name]['median'] /
+                                   results[key]['median'])
+        speedup = '  speedup %6.2fx' % results[key]['speedup']
+      if check:
+        layout = Layout(find_header(bench_dir))
+        failures = verify(os.path.join(bench_dir, 'output.data'),
+                          os.path.join(bench_dir, 'check.data'), layout,
+                          TOLERANCES.get(bench_name(bench_dir), (0.0, 0.0)))
+        results[key]['verified'] = not failures
+      log.write('%-24s median %12.3f us  p95 %12.3f us  stddev %12.3f us%s%s\n'
+                % (key, 1e6*results[key]['median'], 1e6*results[key]['p95'],
+                   1e6*results[key]['stddev'], speedup,
+                   '' if results[key].get('verified', True) else
+                   '  WRONG OUTPUT'))
+  return results
+
+def main():
+  parser = argparse.ArgumentParser(description='Build and time the MachSuite '
+    'kernels, and compare the times with a baseline.')
+  parser.add_argument('benchmarks', nargs='*', help='Benchmarks to run, e.g. '
+    'md/knn. Defaults to the BENCHMARKS of the top-level Makefile.')
+  parser.add_argument('--cflags', default=CFLAGS, help='Compiler flags.')
+  parser.add_argument('--warmup', type=int, default=WARMUP, help='Untimed '
+    'calls of each kernel before measuring.')
+  parser.add_argument('--repeat', type=int, default=REPEAT, help='Timed calls '
+    'of each kernel.')
+  parser.add_argument('--no_build', action='store_true', help='Use the '
+    'existing executables.')
+  parser.add_argument('--no_verify', action='store_true', help='Do not '
+    'check output.data against check.data.')
+  parser.add_argument('--threads', help='Comma-separated numbers of threads, '
+    'e.g. 1,2,4,8, to also time the OpenMP variant of each benchmark that has '
+    'one with.')
+  parser.add_argument('--output', help='Write the results to this JSON file.')
+  parser.add_argument('--baseline', help='JSON results of an earlier run.')
+  parser.add_argument('--alpha', type=float, default=ALPHA, help='Significance '
+    'level of the regression test.')
+  parser.add_argument('--threshold', type=float, default=THRESHOLD,
+    help='Smallest relative increase of the median time that counts as a '
+    'regression.')
+  args = parser.parse_args()
+  if args.repeat<1:
+    parser.error('--repeat must be at least 1')
+  threads = ()
+  if args.threads:
+    try:
+      threads = [int(t) for t in args.threads.split(',')]
+    except ValueError:
+      threads = [0]
+    if min(threads)<1:
+      parser.error('--threads must be positive integers, e.g. 1,2,4,8')
+
+  benchmarks = args.benchmarks or suite_benchmarks()
+  try:
+    results = run_suite(benchmarks, args.cflags, args.warmup, args.repeat,
+                        not args.no_verify, not args.no_build, threads=threads)
+  except (subprocess.CalledProcessError, RuntimeError, LayoutError) as e:
+    sys.exit('Error: %s' % e)
+  report = {'cflags': args.cflags, 'compiler': compiler_version(),
+            'host': platform.node(), 'machine': platform.machine(),
+            'threads': list(threads),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'), 'results': results}
+  if args.output:
+    with open(args.output, 'w') as f:
+      json.dump(report, f, indent=2, sort_keys=True)
+  else:
+    json.dump(report, sys.stdout, indent=2, sort_keys=True)
+    sys.stdout.write('\n')
+
+  status = 0
+  if not all(r.get('verified', True) for r in results.values()):
+    status = 1
+  if args.baseline:
+    with open(args.baseline) as f:
+      baseline = json.load(f)
+    sys.stderr.write('Compared with %s (%s):\n' %
+                     (args.baseline, baseline.get('cflags')))
+    for (name, change, p, regressed) in compare(results, baseline['results'],
+                                                args.alpha, args.threshold):
+      sys.stderr.write('%-20s %+7.1f%%  p=%.3g%s\n' %
+                       (name, 100*change, p, '  REGRESSION' if regressed else ''))
+      if regressed:
+        status = 1
+  sys.exit(status)
+
+if __name__ == '__main__':
+  main()
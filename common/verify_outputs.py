@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+
+# Compares benchmark outputs against check.data field by field, with absolute
+# and relative tolerances for floating-point fields. harness.c can only check
+# results byte for byte, which rejects floating-point kernels whose compiler
+# reorders a reduction; this accepts such results and reports where the ones
+# that are really wrong first differ.
+#
+# Files are memory-mapped through bench_layout and compared in fixed-size
+# chunks, so large generated inputs and many outputs are cheap to verify.
+#
+# Usage:
+#   python common/verify_outputs.py md/knn fft/strided
+#   python common/verify_outputs.py gemm/ncubed --outputs runs/*/output.data
+
+import argparse
+import glob
+import os
+import sys
+import numpy as np
+
+from bench_layout import Layout, LayoutError, find_header, open_data
+
+CHUNK_SIZE = 1<<20 # elements compared at a time
+MAX_REPORT = 5     # mismatching indices reported per field
+
+# (absolute, relative) tolerances of floating-point fields. Integer fields and
+# benchmarks not listed here must match exactly.
+TOLERANCES = {
+  'backprop/backprop': (1e-6, 1e-4),
+  'fft/strided': (1e-9, 1e-6),
+  'fft/transpose': (1e-9, 1e-6),
+  'gemm/blocked': (1e-12, 1e-9),
+  'gemm/ncubed': (1e-12, 1e-9),
+  'md/grid': (1e-9, 1e-6),
+  'md/knn': (1e-9, 1e-6),
+  'spmv/crs': (1e-12, 1e-9),
+  'spmv/ellpack': (1e-12, 1e-9),
+  'viterbi/viterbi': (1e-6, 1e-5),
+}
+
+def bench_name(bench_dir):
+  """ The name of a benchmark directory, e.g. md/knn. """
+  parts = os.path.abspath(bench_dir).split(os.sep)
+  return '/'.join(parts[-2:])
+
+def leaf_fields(dtype, prefix=''):
+  """ (dotted name, field path) of every scalar or array member of a dtype. """
+  for name in dtype.names:
+    base = dtype.fields[name][0].base
+    if base.names:
+      # Structs and arrays of structs are compared one member at a time.
+      for leaf in leaf_fields(base, prefix+name+'.'):
+        yield (leaf[0], (name,)+leaf[1])
+    else:
+      yield (prefix+name, (name,))
+
+def _field(record, path):
+  for name in path:
+    record = record[name]
+  return record
+
+class FieldResult(object):
+  """ The outcome of comparing one field of one record. """
+  def __init__(self, name, shape, size):
+    self.name = name
+    self.shape = shape
+    self.size = size
+    self.mismatches = 0
+    self.first = [] # (index, output value, expected value)
+    self.max_error = 0.0
+
+  def describe(self, record=None):
+    where = self.name if record is None else '[%d].%s' % (record, self.name)
+    lines = ['  %s: %d of %d elements differ' %
+             (where, self.mismatches, self.size)]
+    if self.max_error:
+      lines[0] += ', max abs error %g' % self.max_error
+    for (index, got, expected) in self.first:
+      lines.append('    %s: got %r, expected %r' % (list(index), got, expected))
+    return '\n'.join(lines)
+
+def compare_field(name, output, check, tolerance, max_report=MAX_REPORT,
+                  chunk_size=CHUNK_SIZE):
+  """ Compare two views of a field in chunks.
+
+  Floating-point elements x of output match y of check if
+  |x - y| <= atol + rtol*|y|, or if both are NaN; other elements must be equal.
+  """
+  result = FieldResult(name, output.shape, output.size)
+  flat_output = output.reshape(-1)
+  flat_check = check.reshape(-1)
+  is_float = np.issubdtype(output.dtype, np.floating)
+  (atol, rtol) = tolerance
+  for start in range(0, result.size, chunk_size):
+    got = flat_output[start:start+chunk_size]
+    expected = flat_check[start:start+chunk_size]
+    if is_float:
+      ok = np.isclose(got, expected, rtol=rtol, atol=atol, equal_nan=True)
+    else:
+      ok = got==expected
+    if ok.all():
+      continue
+    bad = np.flatnonzero(~ok)
+    result.mismatches += len(bad)
+    if is_float:
+      finite = np.isfinite(got[bad]) & np.isfinite(expected[bad])
+      if finite.any():
+        error = np.abs(got[bad][finite].astype(np.float64) -
+                       expected[bad][finite])
+        result.max_error = max(result.max_error, float(error.max()))
+    for i in bad[:max_report-len(result.first)]:
+      index = np.unravel_index(start+i, output.shape) if output.shape else ()
+      result.first.append((tuple(int(x) for x in index), got[i].item(),
+                           expected[i].item()))
+  return result
+
+def verify(output_path, check_path, layout, tolerance, max_report=MAX_REPORT):
+  """ Compare every record of an output file against a check file.
+
+  Returns:
+    A list of (record number, FieldResult) for the fields that differ.
+  """
+  outputs = open_data(output_path, layout)
+  checks = open_data(check_path, layout)
+  if len(outputs) > len(checks):
+    raise LayoutError('%s holds %d records, but %s only %d' %
+                      (output_path, len(outputs), check_path, len(checks)))
+  failures = []
+  for r in range(len(outputs)):
+    for (name, path) in leaf_fields(layout.dtype):
+      result = compare_field(name, _field(outputs[r], path),
+                             _field(checks[r], path), tolerance, max_report)
+      if result.mismatches:
+        failures.append((r, result))
+  return failures
+
+def main():
+  parser = argparse.ArgumentParser(description='Verify benchmark outputs '
+    'against check.data with per-field tolerances.')
+  parser.add_argument('bench_dirs', nargs='+', help='Benchmark directories, '
+    'e.g. md/knn.')
+  parser.add_argument('--outputs', nargs='+', help='Output files or glob '
+    'patterns to verify. Defaults to output.data in each benchmark directory; '
+    'only one benchmark may be given with this option.')
+  parser.add_argument('--benchmark', help='Benchmark whose tolerances apply, '
+    'e.g. md/knn, for copies of a benchmark directory. Defaults to the last '
+    'two components of the directory.')
+  parser.add_argument('--check', help='Reference file. Defaults to check.data '
+    'in the benchmark directory.')
+  parser.add_argument('--define', action='append', default=[],
+    metavar='NAME=VALUE', help='Override a #define of the benchmark header, '
+    'for outputs of inputs generated at another size.')
+  parser.add_argument('--atol', type=float, help='Absolute tolerance of '
+    'floating-point fields, instead of the benchmark\'s default.')
+  parser.add_argument('--rtol', type=float, help='Relative tolerance of '
+    'floating-point fields, instead of the benchmark\'s default.')
+  parser.add_argument('--max_report', type=int, default=MAX_REPORT,
+    help='Mismatching indices reported per field.')
+  args = parser.parse_args()
+  if (args.outputs or args.benchmark) and len(args.bench_dirs)>1:
+    parser.error('--outputs and --benchmark need a single benchmark directory')
+  overrides = dict(d.split('=', 1) for d in args.define)
+
+  failed = 0
+  checked = 0
+  for bench_dir in args.bench_dirs:
+    name = args.benchmark or bench_name(bench_dir)
+    (atol, rtol) = TOLERANCES.get(name, (0.0, 0.0))
+    tolerance = (atol if args.atol is None else args.atol,
+                 rtol if args.rtol is None else args.rtol)
+    check_path = args.check or os.path.join(bench_dir, 'check.data')
+    if args.outputs:
+      paths = []
+      for pattern in args.outputs:
+        paths.extend(sorted(glob.glob(pattern)) or [pattern])
+    else:
+      paths = [os.path.join(bench_dir, 'output.data')]
+    try:
+      layout = Layout(find_header(bench_dir), overrides)
+    except LayoutError as e:
+      print('ERROR %s: %s' % (name, e))
+      failed += len(paths)
+      continue
+    for path in paths:
+      checked += 1
+      try:
+        failures = verify(path, check_path, layout, tolerance, args.max_report)
+      except (LayoutError, IOError, OSError, ValueError) as e:
+        print('ERROR %s: %s' % (path, e))
+        failed += 1
+        continue
+      if failures:
+        failed += 1
+        print('FAIL %s' % path)
+        multi = len(set(r for (r, _) in failures))>1 or failures[0][0]>0
+        for (r, result) in failures:
+          print(result.describe(r if multi else None))
+      else:
+        print('PASS %s' % path)
+  if checked>1:
+    print('%d of %d outputs passed' % (checked-failed, checked))
+  sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+  main()
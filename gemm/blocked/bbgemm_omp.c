@@ -0,0 +1,57 @@
+/*
+Copyright (c) 2014, the President and Fellows of Harvard College.
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+* Redistributions of source code must retain the above copyright notice, this
+  list of conditions and the following disclaimer.
+
+* Redistributions in binary form must reproduce the above copyright notice,
+  this list of conditions and the following disclaimer in the documentation
+  and/or other materials provided with the distribution.
+
+* Neither the name of Harvard University nor the names of its contributors may
+  be used to endorse or promote products derived from this software without
+  specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+OpenMP variant of bbgemm.c, a multicore CPU baseline. Each thread computes
+whole rows of prod with the same blocking, so every element is accumulated in
+the same order as in bbgemm.c. Build with -fopenmp; OMP_NUM_THREADS sets the
+number of threads.
+*/
+
+#include "bbgemm.h"
+
+void bbgemm(TYPE m1[N], TYPE m2[N], TYPE prod[N]){
+    int i;
+
+    #pragma omp parallel for schedule(static)
+    for (i = 0; i < row_size; ++i){
+        int i_row = i * row_size;
+        int j, k, jj, kk;
+        for (jj = 0; jj < row_size; jj += block_size){
+            for (kk = 0; kk < row_size; kk += block_size){
+                for (k = 0; k < block_size; ++k){
+                    int k_row = (k  + kk) * row_size;
+                    int temp_x = m1[i_row + k + kk];
+                    for (j = 0; j < block_size; ++j){
+                        prod[i_row + j + jj] += temp_x * m2[k_row + j + jj];
+                    }
+                }
+            }
+        }
+    }
+}
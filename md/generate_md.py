@@ -0,0 +1,362 @@
+#!/usr/bin/env python
+
+# Generates molecular dynamics inputs of any size for md/knn and md/grid, as
+# input.data and check.data files in the layout of their md.h.
+#
+# Atoms are placed uniformly at random in a cube, at least van der Waals
+# distance apart, at the density of the bundled inputs. Spatial queries use a
+# cell list: atoms are sorted into cubic cells, and only the cells around an
+# atom's own are searched. That makes both the k-nearest-neighbor lists of
+# md/knn and the blocks of md/grid O(N) to build, where generate.c compares all
+# pairs. Candidate pairs are flat arrays, a cache-sized chunk at a time.
+# check.data holds the forces the kernel computes, summed in the kernel's order
+# so that they match bit for bit.
+#
+# Usage:
+#   generate_md.py knn --atoms 1000000 [--neighbors 16] [--update_header]
+#   generate_md.py grid --atoms 1000000 [--update_header]
+
+import argparse
+import os
+import shutil
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'common'))
+from bench_layout import (Layout, LayoutError, create_data, evaluate,
+                          header_defines, update_defines)
+
+# From generate.c: 256 atoms in a 20x20x20 box, at least 1.049 apart.
+DENSITY = 256 / 20.0**3
+VAN_DER_WAALS = 1.049
+# Roughly the block edge of the bundled md/grid input (20/4).
+BLOCK_EDGE = 5.0
+# Candidate pairs processed at a time: few enough that the temporaries of a
+# chunk stay in cache.
+CHUNK_PAIRS = 1<<16
+
+class CellList(object):
+  """ Atoms sorted into cubic cells of a box [0, edge)^3.
+
+  Atoms are numbered by their slot in cell order, so that the atoms of nearby
+  cells are close in memory too: the atoms of cell c are in slots start[c] to
+  start[c+1], and order[slot] is the atom in a slot. A stable sort keeps the
+  atoms of a cell in index order.
+  """
+  def __init__(self, points, edge, side):
+    self.side = side
+    self.width = edge/float(side)
+    cells = (points / self.width).astype(np.int64)
+    np.minimum(cells, side-1, out=cells)
+    ids = self.cell_id(cells)
+    self.order = np.argsort(ids, kind='mergesort')
+    # The cell and coordinates of each slot.
+    self.cells = cells[self.order]
+    self.coords = [points[self.order,a] for a in range(3)]
+    self.start = np.zeros(side**3+1, dtype=np.int64)
+    np.cumsum(np.bincount(ids, minlength=side**3), out=self.start[1:])
+
+  def cell_id(self, cells):
+    return (cells[:,0]*self.side + cells[:,1])*self.side + cells[:,2]
+
+  def occupancy(self):
+    return np.diff(self.start)
+
+  def slots(self, atoms):
+    """ The slots of the given atoms, in slot order. """
+    slot = np.empty(len(self.order), dtype=np.int64)
+    slot[self.order] = np.arange(len(self.order))
+    return np.sort(slot[atoms])
+
+  def around(self, reach):
+    """ The number of atoms in the cells within reach of each cell. """
+    side = self.side
+    around = self.occupancy().reshape(side, side, side)
+    i = np.arange(side)
+    for axis in range(3):
+      total = np.cumsum(around, axis)
+      total = np.concatenate((np.zeros_like(total.take([0], axis)), total),
+                             axis)
+      around = (total.take(np.minimum(i+reach+1, side), axis) -
+                total.take(np.maximum(i-reach, 0), axis))
+    return around.reshape(-1)
+
+  def pair_chunks(self, slots, reach=1):
+    """ Candidate pairs of the atoms in the given slots with the atoms in the
+    cells within reach of theirs, a chunk of about CHUNK_PAIRS pairs at a
+    time.
+
+    Yields:
+      Tuples (slots, counts, J) of a chunk of slots and its pairs in CSR
+      form: the candidates of slots[i] are the slots in the next counts[i]
+      entries of J, itself included. They are in md/grid's order: cells in
+      lexicographic order of their offsets, and the atoms of a cell in index
+      order.
+    """
+    counts = self.around(reach)[self.cell_id(self.cells[slots])]
+    ends = np.cumsum(counts)
+    bounds = np.unique(np.concatenate((
+      [0], np.searchsorted(ends, np.arange(0, ends[-1], CHUNK_PAIRS)[1:]),
+      [len(slots)]))) if len(slots) else [0]
+    side = self.side
+    # The cells within reach are columns along z, whose cells are consecutive
+    # in cell order.
+    offsets = np.arange(-reach, reach+1)
+    (dx, dy) = [a.ravel() for a in np.meshgrid(offsets, offsets,
+                                               indexing='ij')]
+    for (lo, hi) in zip(bounds[:-1], bounds[1:]):
+      chunk = slots[lo:hi]
+      (x, y, z) = [c[:,None] for c in self.cells[chunk].T]
+      (x, y) = (x + dx, y + dy)
+      inside = (x >= 0) & (x < side) & (y >= 0) & (y < side)
+      # The atoms of each column are a range of slots.
+      column = np.where(inside, (x*side + y)*side, 0)
+      first = self.start[column + np.maximum(z-reach, 0)].ravel()
+      count = np.where(inside, self.start[column + np.minimum(z+reach+1, side)],
+                       0).ravel() - np.where(inside.ravel(), first, 0)
+      shift = np.repeat(first - (np.cumsum(count) - count), count)
+      yield (chunk, counts[lo:hi], np.arange(counts[lo:hi].sum()) + shift)
+
+def atom_chunks(n_atoms, pairs_per_atom):
+  step = max(1, int(CHUNK_PAIRS // max(1, pairs_per_atom)))
+  for start in range(0, n_atoms, step):
+    yield np.arange(start, min(n_atoms, start+step))
+
+class Scratch(object):
+  """ Buffers reused from chunk to chunk, so that temporaries stay in cache
+  rather than being allocated and faulted in afresh. """
+  def __init__(self):
+    self.buffers = {}
+
+  def get(self, name, n):
+    buf = self.buffers.get(name)
+    if buf is None or len(buf) < n:
+      buf = self.buffers[name] = np.empty(max(n, CHUNK_PAIRS))
+    return buf[:n]
+
+def dist_sq(coords, I, J, scratch):
+  """ Squared distances between atoms I[i] and J[i]. The result lives in
+  scratch, until the next call. """
+  (d, p, q) = [scratch.get(name, len(I)) for name in ('d', 'p', 'q')]
+  for (a, c) in enumerate(coords):
+    np.take(c, I, out=p)
+    np.take(c, J, out=q)
+    np.subtract(p, q, out=p)
+    if a == 0:
+      np.multiply(p, p, out=d)
+    else:
+      np.multiply(p, p, out=p)
+      np.add(d, p, out=d)
+  return d
+
+def random_positions(n_atoms, edge, rng):
+  """ n_atoms uniformly random points in [0, edge)^3, pairwise at least
+  VAN_DER_WAALS apart. """
+  # Cells at least VAN_DER_WAALS wide, and about as many as atoms.
+  side = max(1, int(min(edge // VAN_DER_WAALS, n_atoms ** (1/3.0))))
+  points = rng.uniform(0, edge, size=(n_atoms, 3))
+  redraw = np.arange(n_atoms)
+  scratch = Scratch()
+  while len(redraw):
+    cells = CellList(points, edge, side)
+    new = np.zeros(n_atoms, dtype=bool)
+    new[redraw] = True
+    too_close = []
+    for (slots, counts, J) in cells.pair_chunks(cells.slots(redraw)):
+      I = np.repeat(slots, counts)
+      close = np.flatnonzero(dist_sq(cells.coords, I, J, scratch) <
+                             VAN_DER_WAALS**2)
+      (I, J) = (cells.order[I[close]], cells.order[J[close]])
+      # Of two new atoms that are too close, the later one is redrawn, and
+      # so is a new atom too close to one already placed.
+      too_close.append(I[(J < I) | ~new[J]])
+    redraw = np.unique(np.concatenate(too_close))
+    points[redraw] = rng.uniform(0, edge, size=(len(redraw), 3))
+  return points
+
+def nearest_neighbors(points, edge, k):
+  """ The k nearest neighbors of every atom, nearest first. """
+  n_atoms = len(points)
+  if k >= n_atoms:
+    sys.exit('Need more than %d atoms for %d neighbors' % (k, k))
+  # Most atoms have k neighbors closer than radius, which the cells within
+  # reach of theirs are sure to contain. Cells half that wide, searched
+  # within 2, hold fewer candidates than cells that wide within 1.
+  density = n_atoms / edge**3
+  radius = (1.5*k / (4.0/3*np.pi*density)) ** (1/3.0)
+  side = max(1, int(2*edge // radius))
+  cells = CellList(points, edge, side)
+  NL = np.empty((n_atoms, k), dtype=np.int32)
+  todo = np.arange(n_atoms)
+  reach = 2
+  scratch = Scratch()
+  while len(todo):
+    missed = []
+    for (slots, counts, J) in cells.pair_chunks(todo, reach):
+      I = np.repeat(slots, counts)
+      d = dist_sq(cells.coords, I, J, scratch)
+      d[J == I] = np.inf
+      # Each atom's candidates as a row, padded with inf, to select from.
+      first = np.cumsum(counts) - counts
+      width = max(k, counts.max())
+      dense = scratch.get('dense', len(slots)*width).reshape(-1, width)
+      dense.fill(np.inf)
+      dense.put(np.arange(len(J)) +
+                np.repeat(np.arange(len(slots))*width - first, counts), d)
+      nearest = np.argpartition(dense, k-1, axis=1)[:,:k]
+      r = np.arange(len(slots))[:,None]
+      nearest = nearest[r, np.argsort(dense[r, nearest], axis=1,
+                                      kind='mergesort')]
+      kth = dense[r[:,0], nearest[:,-1]]
+      if reach < side-1:
+        sure = kth <= (reach*cells.width)**2
+      else:
+        sure = np.isfinite(kth)
+      NL[cells.order[slots[sure]]] = \
+        cells.order[J[first[sure][:,None] + nearest[sure]]]
+      missed.append(slots[~sure])
+    # Atoms in sparse corners need a wider search.
+    todo = np.concatenate(missed)
+    reach += 1
+  return NL
+
+def lj_forces(coords, atoms, counts, J, lj):
+  """ Lennard-Jones forces on atoms from their pairs, in the CSR form of
+  CellList.pair_chunks.
+
+  Each atom's force is summed over its pairs in order, as the kernels do, so
+  that the result matches theirs bit for bit; bincount adds its weights one
+  at a time, starting from 0. Pairs of an atom with itself are skipped. lj
+  holds the coefficients lj1 and lj2.
+  """
+  (lj1, lj2) = lj
+  rows = np.repeat(np.arange(len(atoms)), counts)
+  I = atoms[rows]
+  keep = np.flatnonzero(J != I)
+  (rows, I, J) = (rows[keep], I[keep], J[keep])
+  delta = [c[I] - c[J] for c in coords]
+  r2inv = 1.0 / (delta[0]*delta[0] + delta[1]*delta[1] + delta[2]*delta[2])
+  r6inv = r2inv*r2inv*r2inv
+  potential = r6inv*(lj1*r6inv - lj2)
+  f = r2inv*potential
+  return np.array([np.bincount(rows, delta[a]*f, minlength=len(atoms))
+                   for a in range(3)]).T
+
+def lj_coefficients(header):
+  defines = header_defines(header)
+  return (evaluate('lj1', defines), evaluate('lj2', defines))
+
+def write_knn(points, edge, k, header, output_dir, defines):
+  n_atoms = len(points)
+  coords = [points[:,a].copy() for a in range(3)]
+  NL = nearest_neighbors(points, edge, k)
+  force = np.zeros((n_atoms, 3))
+  lj = lj_coefficients(header)
+  for atoms in atom_chunks(n_atoms, k):
+    force[atoms] = lj_forces(coords, atoms, np.full(len(atoms), k),
+                             NL[atoms].reshape(-1), lj)
+  defines.update({'nAtoms': n_atoms, 'maxNeighbors': k})
+  layout = Layout(header, defines)
+  write_pair(layout, output_dir,
+             dict(('position_'+c, coords[a]) for (a, c) in enumerate('xyz')),
+             dict(('d_force_'+c, force[:,a]) for (a, c) in enumerate('xyz')),
+             {'NL': NL.reshape(-1)})
+
+def write_grid(points, edge, side, header, output_dir, defines):
+  n_atoms = len(points)
+  cells = CellList(points, edge, side)
+  occupancy = cells.occupancy()
+  # generate.c asserts that a block holds fewer than densityFactor atoms.
+  density_factor = evaluate('densityFactor', header_defines(header))
+  if occupancy.max() >= density_factor:
+    defines['densityFactor'] = density_factor = int(occupancy.max()) + 1
+  # The kernel skips the pairs of an atom with itself and with any atom at
+  # the same position, of which there are none. Forces are computed by slot,
+  # which keeps the atoms of a block in index order, as the kernel has them.
+  force = np.zeros((n_atoms, 3))
+  lj = lj_coefficients(header)
+  for (slots, counts, J) in cells.pair_chunks(np.arange(n_atoms)):
+    force[slots] = lj_forces(cells.coords, slots, counts, J, lj)
+  defines.update({'nAtoms': n_atoms, 'domainEdge': float(edge),
+                  'blockSide': side})
+  layout = Layout(header, defines)
+  # An atom's place in its block is its rank in the block.
+  (bx, by, bz) = cells.cells.T
+  rank = np.arange(n_atoms) - cells.start[cells.cell_id(cells.cells)]
+  def vectors(values):
+    out = np.zeros((side, side, side, density_factor),
+                   dtype=layout.dtype['position'].base)
+    for (a, c) in enumerate('xyz'):
+      out[c][bx, by, bz, rank] = values[a]
+    return out
+  write_pair(layout, output_dir,
+             {'n_points': occupancy.reshape(side, side, side),
+              'position': vectors(cells.coords)},
+             {'d_force': vectors(force.T)}, {})
+
+def write_pair(layout, output_dir, inputs, outputs, large):
+  """ Write input.data with the inputs and check.data with the outputs too.
+  """
+  data = create_data(os.path.join(output_dir, 'input.data'), layout)
+  for (name, value) in list(inputs.items()) + list(large.items()):
+    data[name][0] = value
+  data.flush()
+  del data
+  shutil.copyfile(os.path.join(output_dir, 'input.data'),
+                  os.path.join(output_dir, 'check.data'))
+  check = np.memmap(os.path.join(output_dir, 'check.data'), dtype=layout.dtype,
+                    mode='r+', shape=(1,))
+  for (name, value) in outputs.items():
+    check[name][0] = value
+  check.flush()
+  del check
+
+def main():
+  here = os.path.dirname(os.path.abspath(__file__))
+  parser = argparse.ArgumentParser(description='Generate md/knn or md/grid '
+    'input.data and check.data files with any number of atoms.')
+  parser.add_argument('format', choices=['knn', 'grid'])
+  parser.add_argument('--atoms', type=int, required=True)
+  parser.add_argument('--neighbors', type=int, default=16, help='Neighbors '
+    'per atom of md/knn.')
+  parser.add_argument('--domain_edge', type=float, help='Edge of the cube. '
+    'Defaults to the density of the bundled inputs.')
+  parser.add_argument('--block_side', type=int, help='Blocks per side of the '
+    'md/grid domain. Defaults to blocks about %g wide.' % BLOCK_EDGE)
+  parser.add_argument('--seed', type=int, default=1)
+  parser.add_argument('--output_dir', help='Where to write input.data and '
+    'check.data. Defaults to the directory of the chosen format.')
+  parser.add_argument('--update_header', action='store_true', help='Rewrite '
+    'the size #defines in md.h to match the generated input.')
+  args = parser.parse_args()
+
+  # Rounded, so that md.h can define it exactly.
+  edge = args.domain_edge or float('%.6g' % (args.atoms / DENSITY) ** (1/3.0))
+  if args.atoms * (4/3.0*np.pi*(VAN_DER_WAALS/2)**3) > 0.3 * edge**3:
+    parser.error('Too many atoms to fit in the domain')
+  rng = np.random.RandomState(args.seed)
+  points = random_positions(args.atoms, edge, rng)
+
+  header = os.path.join(here, args.format, 'md.h')
+  output_dir = args.output_dir or os.path.join(here, args.format)
+  defines = {}
+  try:
+    if args.format=='knn':
+      write_knn(points, edge, args.neighbors, header, output_dir, defines)
+    else:
+      side = args.block_side or max(1, int(round(edge / BLOCK_EDGE)))
+      write_grid(points, edge, side, header, output_dir, defines)
+    if args.update_header:
+      update_defines(header, defines)
+  except LayoutError as e:
+    sys.exit(str(e))
+
+  print('%d atoms in a %gx%gx%g box' % (args.atoms, edge, edge, edge))
+  print('%s %s:' % ('Updated' if args.update_header else 'Must define in',
+                    header))
+  for (name, value) in sorted(defines.items()):
+    print('#define %s %s' % (name, value))
+
+if __name__ == '__main__':
+  main()
@@ -1,27 +1,151 @@
 #!/usr/bin/env python
 
+# Statistics of the pairwise distances between atoms: mean, variance, and the
+# closest and farthest pairs. Positions are read either as "x y z" lines from
+# stdin or from a binary input.data laid out as struct bench_args_t in md.h.
+#
+# Distances are computed in square blocks of the upper triangle, so memory use
+# is bounded by the block size rather than by the number of atoms.
+
+import argparse
+import os
+import re
 import sys
 import numpy as np
 
-points = np.array( [(float(x),float(y),float(z)) for (x,y,z) in map(lambda L: L.strip().split(), sys.stdin.readlines())] )
+DOMAIN_EDGE = 20.0 # from generate.c
+
+def header_defines(path):
+  defines = {}
+  with open(path) as f:
+    for line in f:
+      m = re.match(r'\s*#define\s+(\w+)\s+(\d+)\s*$', line)
+      if m:
+        defines[m.group(1)] = int(m.group(2))
+  return defines
+
+def read_input_data(path, header):
+  # struct bench_args_t holds d_force_{x,y,z}, position_{x,y,z} and NL, all
+  # doubles; the first five have nAtoms entries, NL nAtoms*maxNeighbors.
+  defines = header_defines(header)
+  size = os.path.getsize(path)
+  per_atom = 8 * (6 + defines['maxNeighbors'])
+  if size % per_atom:
+    sys.exit('%s is not a whole number of atoms (%d bytes each)' %
+             (path, per_atom))
+  N = size // per_atom
+  if N != defines['nAtoms']:
+    sys.stderr.write('%s holds %d atoms, %s defines nAtoms=%d\n' %
+                     (path, N, header, defines['nAtoms']))
+  data = np.memmap(path, dtype='<f8', mode='r')
+  return np.column_stack([data[(3+k)*N:(4+k)*N] for k in range(3)])
 
-N = points.shape[0]
+def read_text(f):
+  return np.loadtxt(f, dtype=np.float64, ndmin=2)
 
-dists = np.zeros((N,N))
-for (i,A) in enumerate(points):
-  for (j,B) in enumerate(points):
-    if i!=j:
-      dists[i,j] = np.linalg.norm(A-B)
+def block_distances(A, B, out, tmp):
+  # Writes the distances between the atoms of A and B into out, using tmp as
+  # scratch space; both are (len(A), len(B)) arrays.
+  np.subtract.outer(A[:,0], B[:,0], out=out)
+  np.multiply(out, out, out=out)
+  for k in (1, 2):
+    np.subtract.outer(A[:,k], B[:,k], out=tmp)
+    np.multiply(tmp, tmp, out=tmp)
+    out += tmp
+  return np.sqrt(out, out=out)
+
+class PairStats(object):
+  def __init__(self):
+    self.count = 0
+    self.mean = 0.0
+    self.m2 = 0.0 # sum of squared deviations from the mean
+    self.min = (np.inf, None)
+    self.max = (-np.inf, None)
+
+  def add(self, d, i0, j0, tmp, mask=None):
+    # d is the distance block between atoms i0.. and j0..; mask selects the
+    # entries that are distinct pairs. tmp is scratch space shaped like d.
+    if mask is not None:
+      values = d[mask]
+      tmp = np.empty_like(values)
     else:
-      dists[i,j] = 13;
-
-print np.mean(dists)
-print np.var(dists)
-minpair = np.unravel_index(np.argmin(dists), (N,N))
-print minpair, np.min(dists)
-print points[minpair[0]]
-print points[minpair[1]]
-maxpair = np.unravel_index(np.argmax(dists), (N,N))
-print maxpair, np.max(dists), 20.0*np.sqrt(3.)
-print points[maxpair[0]]
-print points[maxpair[1]]
+      values = d.reshape(-1)
+      tmp = tmp.reshape(-1)
+    n = values.size
+    if n==0:
+      return
+    mean = values.mean()
+    np.subtract(values, mean, out=tmp)
+    m2 = np.dot(tmp, tmp)
+    # Chan et al.'s parallel update of the running mean and variance.
+    total = self.count + n
+    delta = mean - self.mean
+    self.mean += delta * n / total
+    self.m2 += m2 + delta*delta * self.count * n / total
+    self.count = total
+    if mask is not None:
+      d = np.where(mask, d, np.nan)
+    lo = np.unravel_index(np.nanargmin(d), d.shape)
+    if d[lo] < self.min[0]:
+      self.min = (d[lo], (int(i0+lo[0]), int(j0+lo[1])))
+    hi = np.unravel_index(np.nanargmax(d), d.shape)
+    if d[hi] > self.max[0]:
+      self.max = (d[hi], (int(i0+hi[0]), int(j0+hi[1])))
+
+  def variance(self):
+    return self.m2 / self.count
+
+def pair_stats(points, block=1024):
+  N = points.shape[0]
+  stats = PairStats()
+  # Scratch space is allocated once and reused by every block.
+  out_buf = np.empty(block*block)
+  tmp_buf = np.empty(block*block)
+  for i0 in range(0, N, block):
+    A = np.ascontiguousarray(points[i0:i0+block])
+    for j0 in range(i0, N, block):
+      B = A if j0==i0 else np.ascontiguousarray(points[j0:j0+block])
+      shape = (len(A), len(B))
+      out = out_buf[:shape[0]*shape[1]].reshape(shape)
+      tmp = tmp_buf[:shape[0]*shape[1]].reshape(shape)
+      d = block_distances(A, B, out, tmp)
+      if j0==i0:
+        # Diagonal block: only pairs with i<j.
+        stats.add(d, i0, j0, tmp, np.triu(np.ones(shape, dtype=bool), 1))
+      else:
+        stats.add(d, i0, j0, tmp)
+  return stats
+
+def main():
+  parser = argparse.ArgumentParser(description='Pairwise distance statistics '
+    'of md/knn atom positions.')
+  parser.add_argument('input', nargs='?', help='Binary input.data file. If '
+    'omitted, "x y z" lines are read from stdin.')
+  parser.add_argument('--header', default=os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'md.h'), help='md.h describing '
+    'the layout of input.data.')
+  parser.add_argument('--block', type=int, default=1024, help='Atoms per side '
+    'of a block of distances; memory use grows with its square.')
+  args = parser.parse_args()
+
+  if args.input:
+    points = read_input_data(args.input, args.header)
+  else:
+    points = read_text(sys.stdin)
+  if points.shape[0] < 2:
+    sys.exit('Need at least two atoms')
+
+  stats = pair_stats(points, args.block)
+  print(stats.mean)
+  print(stats.variance())
+  (dmin, minpair) = stats.min
+  print('%s %s' % (minpair, dmin))
+  print(points[minpair[0]])
+  print(points[minpair[1]])
+  (dmax, maxpair) = stats.max
+  print('%s %s %s' % (maxpair, dmax, DOMAIN_EDGE*np.sqrt(3.)))
+  print(points[maxpair[0]])
+  print(points[maxpair[1]])
+
+if __name__ == '__main__':
+  main()
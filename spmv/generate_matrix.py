@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+# Generates random sparse matrices of any size as spmv input.data and
+# check.data files, in the layout of crs.h or ellpack.h, for inputs larger than
+# the bundled 494_bus matrix. See mtx2data.py for the file format details.
+#
+# Usage:
+#   generate_matrix.py random --n 100000 --nnz 1000000 [--format ellpack]
+#   generate_matrix.py banded --n 100000 --bandwidth 8 [--update_header]
+
+import argparse
+import sys
+import numpy as np
+
+from mtx2data import write_benchmark
+
+def random_matrix(N, NNZ, rng):
+  """ NNZ distinct entries at uniformly random positions of an NxN matrix. """
+  if NNZ > N*N:
+    sys.exit('An %dx%d matrix has fewer than %d entries' % (N, N, NNZ))
+  keys = np.empty(0, dtype=np.int64)
+  while len(keys) < NNZ:
+    # Draw a little more than is missing; duplicates are dropped.
+    missing = NNZ - len(keys)
+    draw = rng.randint(0, N*N, size=missing + missing//8 + 16, dtype=np.int64)
+    keys = np.union1d(keys, draw)
+  keys = rng.permutation(keys)[:NNZ]
+  keys.sort()
+  return (keys // N, keys % N)
+
+def banded_matrix(N, bandwidth, fill, rng):
+  """ Entries within bandwidth of the diagonal, each kept with probability
+  fill. """
+  offsets = np.arange(-bandwidth, bandwidth+1)
+  rows = np.repeat(np.arange(N, dtype=np.int64), len(offsets))
+  cols = rows + np.tile(offsets, N)
+  keep = (cols >= 0) & (cols < N)
+  if fill < 1:
+    keep &= rng.random_sample(len(rows)) < fill
+  return (rows[keep], cols[keep])
+
+def main():
+  parser = argparse.ArgumentParser(description='Generate a random sparse '
+    'matrix as spmv input.data and check.data files.')
+  parser.add_argument('kind', choices=['random', 'banded'], help='Uniformly '
+    'random positions, or a band around the diagonal.')
+  parser.add_argument('--n', type=int, required=True, help='Matrix dimension.')
+  parser.add_argument('--nnz', type=int, help='Number of nonzeros of a random '
+    'matrix. Defaults to 10 per row.')
+  parser.add_argument('--bandwidth', type=int, default=4, help='Half width of '
+    'the band of a banded matrix.')
+  parser.add_argument('--fill', type=float, default=1.0, help='Fraction of '
+    'the band of a banded matrix that is nonzero.')
+  parser.add_argument('--seed', type=int, default=1)
+  parser.add_argument('--format', choices=['crs', 'ellpack'], default='crs')
+  parser.add_argument('--output_dir', help='Where to write input.data and '
+    'check.data. Defaults to the directory of the chosen format.')
+  parser.add_argument('--update_header', action='store_true', help='Rewrite '
+    'the size #defines in crs.h or ellpack.h to match the matrix.')
+  args = parser.parse_args()
+  if args.n < 1:
+    parser.error('--n must be positive')
+
+  rng = np.random.RandomState(args.seed)
+  if args.kind=='random':
+    (rows, cols) = random_matrix(args.n, args.nnz or 10*args.n, rng)
+  else:
+    (rows, cols) = banded_matrix(args.n, args.bandwidth, args.fill, rng)
+  vals = rng.uniform(-1.0, 1.0, size=len(rows))
+  write_benchmark(args.format, rows.astype(np.int32), cols.astype(np.int32),
+                  vals, args.n, args.output_dir, args.update_header)
+
+if __name__ == '__main__':
+  main()
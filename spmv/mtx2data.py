@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+
+# Converts a MatrixMarket coordinate file into the input.data and check.data
+# files of the spmv benchmarks, in the struct bench_args_t layout of crs.h or
+# ellpack.h. The matrix is read in chunks, so only the entries themselves are
+# held in memory, and check.data is computed with the same order of
+# floating-point operations as the kernels so that it matches bit for bit.
+#
+# Usage: mtx2data.py crs/494_bus.mtx [--format crs|ellpack] [--update_header]
+
+import argparse
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'common'))
+from bench_layout import LayoutError, update_defines
+
+CHUNK_SIZE = 1<<24
+
+def parse_banner(line):
+  fields = line.strip().lower().split()
+  if len(fields)!=5 or fields[0]!='%%matrixmarket' or fields[1]!='matrix':
+    sys.exit('Not a MatrixMarket matrix file')
+  (fmt, field, symmetry) = fields[2:]
+  if fmt!='coordinate':
+    sys.exit('Only coordinate (sparse) matrices are supported, not '+fmt)
+  if field not in ('real', 'integer', 'pattern'):
+    sys.exit('Unsupported field type '+field)
+  if symmetry not in ('general', 'symmetric', 'skew-symmetric'):
+    sys.exit('Unsupported symmetry '+symmetry)
+  return (field, symmetry)
+
+def read_mtx(path):
+  # Returns (rows, cols, vals, N) with 0-based indices, as stored in the file.
+  with open(path, 'rb') as f:
+    (field, symmetry) = parse_banner(f.readline().decode('ascii'))
+    line = f.readline()
+    while line.startswith(b'%') or not line.strip():
+      line = f.readline()
+    (nrows, ncols, nnz) = [int(x) for x in line.split()]
+    if nrows!=ncols:
+      sys.exit('spmv needs a square matrix, not %dx%d' % (nrows, ncols))
+    width = 2 if field=='pattern' else 3
+    entries = np.empty((nnz, width))
+    n = 0
+    partial = b''
+    while True:
+      chunk = f.read(CHUNK_SIZE)
+      if not chunk:
+        break
+      lines = (partial + chunk).rsplit(b'\n', 1)
+      partial = lines[1] if len(lines)>1 else lines[0]
+      if len(lines)>1:
+        n = parse_entries(lines[0], entries, n)
+    n = parse_entries(partial, entries, n)
+  if n!=nnz:
+    sys.exit('%s: expected %d entries, found %d' % (path, nnz, n))
+  rows = entries[:,0].astype(np.int32) - 1
+  cols = entries[:,1].astype(np.int32) - 1
+  vals = entries[:,2] if width==3 else np.ones(nnz)
+  if symmetry!='general':
+    # Only one triangle is stored; mirror the off-diagonal entries.
+    off = rows!=cols
+    mirrored = -vals[off] if symmetry=='skew-symmetric' else vals[off]
+    (rows, cols) = (np.concatenate((rows, cols[off])),
+                    np.concatenate((cols, rows[off])))
+    vals = np.concatenate((vals, mirrored))
+  order = np.lexsort((cols, rows))
+  return (rows[order], cols[order], vals[order], nrows)
+
+def parse_entries(text, entries, n):
+  values = np.array(text.split(), dtype=np.float64)
+  count = values.size // entries.shape[1]
+  if count*entries.shape[1] != values.size or n+count > entries.shape[0]:
+    sys.exit('Malformed or too many matrix entries')
+  entries[n:n+count] = values.reshape(count, entries.shape[1])
+  return n+count
+
+def struct_dtype(fields):
+  # fields: list of (name, numpy type, count), laid out as a C compiler would.
+  (names, formats, offsets) = ([], [], [])
+  offset = 0
+  align = 1
+  for (name, typ, count) in fields:
+    size = np.dtype(typ).itemsize
+    offset = (offset + size-1) // size * size
+    names.append(name)
+    formats.append((typ, (count,)))
+    offsets.append(offset)
+    offset += size*count
+    align = max(align, size)
+  itemsize = (offset + align-1) // align * align
+  return np.dtype({'names':names, 'formats':formats, 'offsets':offsets,
+                   'itemsize':itemsize})
+
+def crs_data(rows, cols, vals, N):
+  NNZ = len(vals)
+  record = np.zeros(1, dtype=struct_dtype([
+    ('val', '<f8', NNZ), ('cols', '<i4', NNZ), ('rowDelimiters', '<i4', N+1),
+    ('vec', '<f8', N), ('out', '<f8', N)]))
+  data = record[0]
+  data['val'] = vals
+  data['cols'] = cols
+  data['rowDelimiters'][1:] = np.cumsum(np.bincount(rows, minlength=N))
+  data['vec'] = 1.0
+  # The kernel sums each row left to right. Process rows by decreasing length
+  # so that the rows still active at step k are a prefix.
+  starts = data['rowDelimiters'][:-1]
+  lengths = np.diff(data['rowDelimiters'])
+  by_length = np.argsort(-lengths, kind='mergesort')
+  sorted_lengths = lengths[by_length]
+  # Copying a record only copies its fields; start from zeros so that the
+  # padding between them matches input.data.
+  check_record = np.zeros(record.shape, dtype=record.dtype)
+  check_record[:] = record
+  check = check_record[0]
+  out = np.zeros(N)
+  for k in range(sorted_lengths[0] if N else 0):
+    active = by_length[:np.searchsorted(-sorted_lengths, -k, side='left')]
+    j = starts[active] + k
+    out[active] += vals[j] * data['vec'][cols[j]]
+  check['out'] = out
+  return (record, check_record, {'NNZ':NNZ, 'N':N})
+
+def ellpack_data(rows, cols, vals, N):
+  lengths = np.bincount(rows, minlength=N)
+  L = int(lengths.max()) if N else 0
+  record = np.zeros(1, dtype=struct_dtype([
+    ('nzval', '<f8', N*L), ('cols', '<i4', N*L), ('vec', '<f8', N),
+    ('out', '<f8', N)]))
+  data = record[0]
+  # Entries are sorted by row; each one goes to the next free slot of its row.
+  starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+  slots = rows*L + np.arange(len(rows)) - starts[rows]
+  data['nzval'][slots] = vals
+  data['cols'][slots] = cols
+  data['vec'] = 1.0
+  # The kernel adds all L slots of a row, padding included, in order.
+  check_record = np.zeros(record.shape, dtype=record.dtype)
+  check_record[:] = record
+  check = check_record[0]
+  nzval = data['nzval'].reshape(N, L)
+  ecols = data['cols'].reshape(N, L)
+  out = np.zeros(N)
+  for j in range(L):
+    out += nzval[:,j] * data['vec'][ecols[:,j]]
+  check['out'] = out
+  return (record, check_record, {'NNZ':len(vals), 'N':N, 'L':L})
+
+def write_benchmark(fmt, rows, cols, vals, N, output_dir=None,
+                    update_header=False):
+  """ Write the input.data and check.data of a matrix in crs or ellpack form.
+
+  rows, cols and vals are 0-based entries sorted by row and then column.
+  """
+  here = os.path.dirname(os.path.abspath(__file__))
+  if fmt=='crs':
+    (record, check_record, defines) = crs_data(rows, cols, vals, N)
+  else:
+    (record, check_record, defines) = ellpack_data(rows, cols, vals, N)
+  output_dir = output_dir or os.path.join(here, fmt)
+  record.tofile(os.path.join(output_dir, 'input.data'))
+  check_record.tofile(os.path.join(output_dir, 'check.data'))
+
+  header = os.path.join(here, fmt, fmt+'.h')
+  if update_header:
+    try:
+      update_defines(header, defines)
+    except LayoutError as e:
+      sys.exit(str(e))
+    print('Updated %s' % header)
+  else:
+    print('%s must define:' % header)
+  for (name, value) in sorted(defines.items()):
+    print('#define %s %d' % (name, value))
+
+def main():
+  parser = argparse.ArgumentParser(description='Convert a MatrixMarket file '
+    'to spmv input.data and check.data files.')
+  parser.add_argument('matrix', help='MatrixMarket coordinate file.')
+  parser.add_argument('--format', choices=['crs', 'ellpack'], default='crs')
+  parser.add_argument('--output_dir', help='Where to write input.data and '
+    'check.data. Defaults to the directory of the chosen format.')
+  parser.add_argument('--update_header', action='store_true', help='Rewrite '
+    'the size #defines in crs.h or ellpack.h to match the matrix.')
+  args = parser.parse_args()
+
+  (rows, cols, vals, N) = read_mtx(args.matrix)
+  write_benchmark(args.format, rows, cols, vals, N, args.output_dir,
+                  args.update_header)
+
+if __name__ == '__main__':
+  main()
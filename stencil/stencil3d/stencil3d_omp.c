@@ -0,0 +1,58 @@
+/*
+Copyright (c) 2014, the President and Fellows of Harvard College.
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+* Redistributions of source code must retain the above copyright notice, this
+  list of conditions and the following disclaimer.
+
+* Redistributions in binary form must reproduce the above copyright notice,
+  this list of conditions and the following disclaimer in the documentation
+  and/or other materials provided with the distribution.
+
+* Neither the name of Harvard University nor the names of its contributors may
+  be used to endorse or promote products derived from this software without
+  specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+OpenMP variant of stencil3d.c, a multicore CPU baseline. Threads compute
+disjoint k planes of sol; the loop over k moves outermost, which changes
+nothing since every point is computed from orig alone. Build with -fopenmp;
+OMP_NUM_THREADS sets the number of threads.
+*/
+
+#include "stencil3d.h"
+
+void stencil3d(TYPE C0, TYPE C1, TYPE orig[size], TYPE sol[size]) {
+    int k;
+
+    #pragma omp parallel for schedule(static)
+    for(k = 1; k < row_size - 1; k++){
+        int i, j;
+        for(i = 1; i < height_size - 1; i++){
+            for(j = 1; j < col_size - 1; j++){
+                TYPE sum1 = orig[indx(row_size, col_size, i, j, k + 1)] +
+                            orig[indx (row_size, col_size, i, j, k - 1)] +
+                            orig[indx (row_size, col_size, i, j + 1, k)] +
+                            orig[indx (row_size, col_size, i, j - 1, k)] +
+                            orig[indx (row_size, col_size, i + 1, j, k)] +
+                            orig[indx (row_size, col_size, i - 1, j, k)];
+                TYPE sum2 = orig[indx (row_size, col_size, i, j, k)];
+
+                sol[indx(row_size, col_size, i, j, k)] = sum1 * C1 - sum2 * C0;
+            }
+        }
+    }
+}
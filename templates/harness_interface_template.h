@@ -1,5 +1,10 @@
 ////////////////////////////////////////////////////////////////////////////////
 // Test harness interface code.
+//
+// The harness calls run_benchmark() once per bench_args_t record: repeatedly
+// when timing (-r), and on each record of a stream of concatenated records in
+// batch mode (-b). Kernels must therefore keep no state between calls; all of
+// their inputs and outputs belong in struct bench_args_t.
 
 struct bench_args_t {
   int a[N];